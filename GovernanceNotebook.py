@@ -10,16 +10,118 @@
 # --------------------------------------------
 LAKEHOUSE_SCHEMA = "dbo"          # <-- =Schema name in your attached Lakehouse - "dbo" is the typical default.
 WORKSPACE_NAMES = ["All"]         # <-- ["All"] to scan and loop through all workspaces, or ["Workspace1", "Workspace2"] for specific workspaces (max 10)
+SQL_ENDPOINTS_TO_REFRESH = []     # <-- [] refreshes only the attached lakehouse's SQL endpoint, ["All"] every SQL endpoint in its workspace, or ["Endpoint1", "Endpoint2"]
 
 # -----------------------------------
 # PERFORMANCE SETTINGS
 # -----------------------------------
-# MAX_PARALLEL_WORKERS: Number of parallel API calls (1-10)
+# MAX_PARALLEL_WORKERS: Number of parallel API calls to start with
 #     - Higher values = faster extraction but more API load
 #     - Lower values = slower but gentler on API rate limits
 #     - Recommended: 3-5 for most environments
+#
+# ADAPTIVE_CONCURRENCY: Adjust the number of parallel calls while running, per API
+#     family (Power BI REST, Fabric REST, XMLA/TOM): +1 while latency and errors stay
+#     healthy, halved on throttling (429/503) or timeouts. False = always use
+#     MAX_PARALLEL_WORKERS.
+# MAX_CONCURRENCY_LIMIT: Upper bound for adaptive concurrency
 
 MAX_PARALLEL_WORKERS = 5
+ADAPTIVE_CONCURRENCY = True
+MAX_CONCURRENCY_LIMIT = 32
+
+# EXTRACTION_MODE: Where Cell 1 fetches dataset/dataflow details (datasources,
+#     refresh history, refresh schedules) - the bulk of its REST calls
+#     - "driver" (default): thread pool on the notebook driver
+#     - "spark": Spark tasks on the executors of the attached Spark pool (up to
+#       MAX_CONCURRENCY_LIMIT at once), written straight to Delta
+EXTRACTION_MODE = "driver"
+
+# REFRESH_HISTORY_MODE: "incremental" (default) = per dataset/dataflow, request
+#     only the newest REFRESH_HISTORY_PAGE_SIZE refreshes ($top, more only while
+#     all of them are new) and stop at the refreshes already in
+#     DatasetRefreshHistory/DataflowRefreshHistory, then add the new ones to those
+#     tables (which keep history beyond the API's window); "full" = fetch the
+#     whole history and overwrite the tables every run
+REFRESH_HISTORY_MODE = "incremental"
+REFRESH_HISTORY_PAGE_SIZE = 10
+
+# SQL_ENDPOINT_REFRESH_TIMEOUT_SECONDS: How long Cell 5 waits for SQL endpoint
+#     metadata refreshes to complete before reporting them as timed out
+SQL_ENDPOINT_REFRESH_TIMEOUT_SECONDS = 300
+
+# REST_MAX_RETRIES: How many times a throttled (429) or unavailable (503) REST
+#     call is retried, waiting for the service's Retry-After between attempts
+REST_MAX_RETRIES = 3
+
+# -----------------------------------
+# RUN SETTINGS
+# -----------------------------------
+# RUN_ID: Identifier stamped on run-level outputs such as the RunMetrics table.
+#     Leave blank to generate one; pipelines may pass their own. Set it to the ID
+#     of an interrupted run to resume it (finished units are skipped).
+# RUN_STATE_PATH: Folder (in the attached Lakehouse Files area) where run
+#     progress snapshots are kept for the Fabric Workload UI.
+# REST_RECORD_PATH: Folder to capture every REST/sempy response into compressed
+#     fixture files (replayable off-tenant with fabric_replay.py). Blank = off.
+# CHECKPOINT_ENABLED: Save each finished workspace/model/report (and its rows)
+#     under RUN_STATE_PATH so an interrupted run can be resumed. A run's
+#     checkpoints are deleted once it completes (partial runs keep them).
+# CHECKPOINT_RETENTION_DAYS: Days the checkpoints of interrupted or partial runs
+#     are kept for resuming (0 = keep until the run completes)
+RUN_ID = ""
+RUN_STATE_PATH = "/lakehouse/default/Files/ImpactIQ"
+REST_RECORD_PATH = ""
+CHECKPOINT_ENABLED = True
+CHECKPOINT_RETENTION_DAYS = 7
+
+# RUN_TIME_BUDGET_MINUTES: Wall-clock budget for the whole run (0 = unlimited).
+#     Once the budget minus RUN_TIME_RESERVE_MINUTES is used, no new workspace,
+#     model or report is started: finished work is written and the remaining
+#     units are recorded in the DeferredUnits table for the next run.
+# RUN_TIME_RESERVE_MINUTES: Part of the budget kept for writing tables and
+#     refreshing SQL endpoints
+# PRIORITY_WORKSPACES: Workspace names processed first, in this order
+# WORKSPACE_PRIORITY: Order of the remaining workspaces (after those deferred
+#     by the previous run): "recent_activity" (latest refreshes first) or "name"
+RUN_TIME_BUDGET_MINUTES = 0
+RUN_TIME_RESERVE_MINUTES = 10
+PRIORITY_WORKSPACES = []
+WORKSPACE_PRIORITY = "recent_activity"
+
+# SHARD_COUNT / SHARD_INDEX: Split the workspaces across SHARD_COUNT notebook runs
+#     (e.g. a pipeline ForEach passing SHARD_INDEX 0..SHARD_COUNT-1 and the same
+#     RUN_ID to every run). Each shard writes <Table>_Shard<index> tables and the
+#     last shard to finish merges them into the regular tables. 1 = no sharding.
+SHARD_COUNT = 1
+SHARD_INDEX = 0
+
+# WRITE_MODE: "overwrite" keeps only the latest extraction in each table;
+#     "snapshot" also writes every table into a <Table>_Snapshots table partitioned
+#     by its ReportDate/ModelAsOfDate (re-running on the same day replaces that
+#     day's partition). The regular tables keep holding the latest snapshot.
+# SNAPSHOT_RETENTION_DAYS: Days of history kept in snapshot mode (0 = keep all)
+WRITE_MODE = "overwrite"
+SNAPSHOT_RETENTION_DAYS = 90
+
+# DELTA_MAINTENANCE: After writing, compact the large output tables (OPTIMIZE
+#     ... ZORDER BY their common filter columns) and VACUUM old files. "auto" =
+#     only tables with at least MAINTENANCE_MIN_FILES files or last maintained
+#     more than MAINTENANCE_INTERVAL_DAYS ago; "always" = every run; "off" = never.
+#     File counts before/after are appended to the TableMaintenance table.
+# VACUUM_RETENTION_HOURS: Age of unreferenced files VACUUM removes (Delta
+#     requires at least 168 hours)
+DELTA_MAINTENANCE = "auto"
+MAINTENANCE_MIN_FILES = 32
+MAINTENANCE_INTERVAL_DAYS = 7
+VACUUM_RETENTION_HOURS = 168
+
+# EXPRESSION_STORAGE: "inline" writes DAX/M text into ModelDetail.Expression,
+#     DataflowDetail.Query and ReportLevelMeasures.Expression; "hashed" stores each
+#     distinct text once in the Expressions table and writes only its
+#     ExpressionHash to those tables (smaller tables and driver memory when models,
+#     reports and dataflows are copied; the Power BI template expects "inline")
+EXPRESSION_STORAGE = "inline"
 
 # In[0]:
 
@@ -53,44 +155,2905 @@ def install(package):
     
     get_ipython().run_line_magic("pip", f"install {package}")
 
-install("semantic-link-labs")
+install("semantic-link-labs")
+
+import json
+import re
+
+# Validate concurrency settings
+if not isinstance(MAX_CONCURRENCY_LIMIT, int) or MAX_CONCURRENCY_LIMIT < 1 or MAX_CONCURRENCY_LIMIT > 64:
+    raise ValueError("MAX_CONCURRENCY_LIMIT must be an integer between 1 and 64.")
+
+if not isinstance(MAX_PARALLEL_WORKERS, int) or MAX_PARALLEL_WORKERS < 1 or MAX_PARALLEL_WORKERS > MAX_CONCURRENCY_LIMIT:
+    raise ValueError(f"MAX_PARALLEL_WORKERS must be an integer between 1 and MAX_CONCURRENCY_LIMIT ({MAX_CONCURRENCY_LIMIT}).")
+
+if not isinstance(ADAPTIVE_CONCURRENCY, bool):
+    raise ValueError("ADAPTIVE_CONCURRENCY must be True or False.")
+
+if EXTRACTION_MODE not in ("driver", "spark"):
+    raise ValueError("EXTRACTION_MODE must be 'driver' or 'spark'.")
+
+if REFRESH_HISTORY_MODE not in ("incremental", "full"):
+    raise ValueError("REFRESH_HISTORY_MODE must be 'incremental' or 'full'.")
+
+if not isinstance(REFRESH_HISTORY_PAGE_SIZE, int) or REFRESH_HISTORY_PAGE_SIZE < 1:
+    raise ValueError("REFRESH_HISTORY_PAGE_SIZE must be a positive integer.")
+
+# -----------------------------------
+# CONFIGURATION VALIDATION
+# -----------------------------------
+# Validate lakehouse schema name
+if not LAKEHOUSE_SCHEMA:
+    raise ValueError("LAKEHOUSE_SCHEMA must be set! Please provide a valid schema name (alphanumeric and underscores only).")
+    
+if not re.match(r'^[a-zA-Z0-9_]+$', LAKEHOUSE_SCHEMA):
+    raise ValueError(f"Invalid lakehouse schema name: '{LAKEHOUSE_SCHEMA}'. Must contain only alphanumeric characters and underscores.")
+
+# Validate workspace names (pipelines and notebook.run pass them as a JSON or comma-separated string)
+if isinstance(WORKSPACE_NAMES, str):
+    WORKSPACE_NAMES = json.loads(WORKSPACE_NAMES) if WORKSPACE_NAMES.strip().startswith("[") else [
+        name.strip() for name in WORKSPACE_NAMES.split(",") if name.strip()]
+
+if not isinstance(WORKSPACE_NAMES, list):
+    raise ValueError("WORKSPACE_NAMES must be a list. Use ['All'] to scan all workspaces, or ['Workspace1', 'Workspace2'] for specific workspaces.")
+
+if len(WORKSPACE_NAMES) == 0:
+    raise ValueError("WORKSPACE_NAMES cannot be empty. Use ['All'] to scan all workspaces.")
+
+if len(WORKSPACE_NAMES) > 10:
+    raise ValueError("WORKSPACE_NAMES can contain at most 10 workspace names. Use ['All'] to scan all workspaces.")
+
+# Validate SQL endpoint refresh settings
+if not isinstance(SQL_ENDPOINTS_TO_REFRESH, list):
+    raise ValueError("SQL_ENDPOINTS_TO_REFRESH must be a list. Use [] for the attached lakehouse's SQL endpoint, or ['All'] for every SQL endpoint in its workspace.")
+
+if not isinstance(SQL_ENDPOINT_REFRESH_TIMEOUT_SECONDS, int) or SQL_ENDPOINT_REFRESH_TIMEOUT_SECONDS < 1:
+    raise ValueError("SQL_ENDPOINT_REFRESH_TIMEOUT_SECONDS must be a positive integer.")
+
+if not isinstance(REST_MAX_RETRIES, int) or REST_MAX_RETRIES < 0:
+    raise ValueError("REST_MAX_RETRIES must be a non-negative integer.")
+
+if not RUN_STATE_PATH:
+    raise ValueError("RUN_STATE_PATH must be set to a folder in the attached Lakehouse (e.g. /lakehouse/default/Files/ImpactIQ).")
+
+if not isinstance(CHECKPOINT_ENABLED, bool):
+    raise ValueError("CHECKPOINT_ENABLED must be True or False.")
+
+if not isinstance(CHECKPOINT_RETENTION_DAYS, int) or CHECKPOINT_RETENTION_DAYS < 0:
+    raise ValueError("CHECKPOINT_RETENTION_DAYS must be a non-negative integer (0 = keep until the run completes).")
+
+if not isinstance(RUN_TIME_BUDGET_MINUTES, (int, float)) or RUN_TIME_BUDGET_MINUTES < 0:
+    raise ValueError("RUN_TIME_BUDGET_MINUTES must be a non-negative number (0 = unlimited).")
+
+if not isinstance(RUN_TIME_RESERVE_MINUTES, (int, float)) or RUN_TIME_RESERVE_MINUTES < 0:
+    raise ValueError("RUN_TIME_RESERVE_MINUTES must be a non-negative number.")
+
+if RUN_TIME_BUDGET_MINUTES and RUN_TIME_RESERVE_MINUTES >= RUN_TIME_BUDGET_MINUTES:
+    raise ValueError("RUN_TIME_RESERVE_MINUTES must be smaller than RUN_TIME_BUDGET_MINUTES.")
+
+if not isinstance(PRIORITY_WORKSPACES, list):
+    raise ValueError("PRIORITY_WORKSPACES must be a list of workspace names.")
+
+if WORKSPACE_PRIORITY not in ("recent_activity", "name"):
+    raise ValueError("WORKSPACE_PRIORITY must be 'recent_activity' or 'name'.")
+
+if not isinstance(SHARD_COUNT, int) or SHARD_COUNT < 1 or SHARD_COUNT > 64:
+    raise ValueError("SHARD_COUNT must be an integer between 1 and 64.")
+
+if not isinstance(SHARD_INDEX, int) or SHARD_INDEX < 0 or SHARD_INDEX >= SHARD_COUNT:
+    raise ValueError(f"SHARD_INDEX must be an integer between 0 and SHARD_COUNT - 1 ({SHARD_COUNT - 1}).")
+
+if SHARD_COUNT > 1 and not RUN_ID:
+    raise ValueError("RUN_ID must be set (to the same value for every shard) when SHARD_COUNT > 1.")
+
+if WRITE_MODE not in ("overwrite", "snapshot"):
+    raise ValueError("WRITE_MODE must be 'overwrite' or 'snapshot'.")
+
+if not isinstance(SNAPSHOT_RETENTION_DAYS, int) or SNAPSHOT_RETENTION_DAYS < 0:
+    raise ValueError("SNAPSHOT_RETENTION_DAYS must be a non-negative integer (0 = keep all history).")
+
+if DELTA_MAINTENANCE not in ("auto", "always", "off"):
+    raise ValueError("DELTA_MAINTENANCE must be 'auto', 'always' or 'off'.")
+
+if not isinstance(MAINTENANCE_MIN_FILES, int) or MAINTENANCE_MIN_FILES < 1:
+    raise ValueError("MAINTENANCE_MIN_FILES must be a positive integer.")
+
+if not isinstance(MAINTENANCE_INTERVAL_DAYS, (int, float)) or MAINTENANCE_INTERVAL_DAYS <= 0:
+    raise ValueError("MAINTENANCE_INTERVAL_DAYS must be a positive number.")
+
+if not isinstance(VACUUM_RETENTION_HOURS, int) or VACUUM_RETENTION_HOURS < 168:
+    raise ValueError("VACUUM_RETENTION_HOURS must be an integer of at least 168 (Delta's minimum retention).")
+
+if EXPRESSION_STORAGE not in ("inline", "hashed"):
+    raise ValueError("EXPRESSION_STORAGE must be 'inline' or 'hashed'.")
+
+# Check if scanning all workspaces (case-insensitive check for "All")
+SCAN_ALL_WORKSPACES = (len(WORKSPACE_NAMES) == 1 and WORKSPACE_NAMES[0].lower() == "all")
+
+print(f"Configuration loaded:")
+print(f"  Lakehouse Schema: {LAKEHOUSE_SCHEMA}")
+if SCAN_ALL_WORKSPACES:
+    print(f"  Workspaces: All (scanning all accessible workspaces)")
+else:
+    print(f"  Workspaces: {WORKSPACE_NAMES}")
+if ADAPTIVE_CONCURRENCY:
+    print(f"  Parallel Workers: {MAX_PARALLEL_WORKERS} (adaptive, up to {MAX_CONCURRENCY_LIMIT})")
+else:
+    print(f"  Parallel Workers: {MAX_PARALLEL_WORKERS}")
+if EXTRACTION_MODE == "spark":
+    print(f"  Extraction Mode: spark (dataset/dataflow details on executors)")
+if REFRESH_HISTORY_MODE == "full":
+    print(f"  Refresh History: full (refetched every run)")
+if SHARD_COUNT > 1:
+    print(f"  Shard: {SHARD_INDEX} of {SHARD_COUNT} (0-based)")
+if WRITE_MODE == "snapshot":
+    print(f"  Write Mode: snapshot (history kept {f'{SNAPSHOT_RETENTION_DAYS} days' if SNAPSHOT_RETENTION_DAYS else 'indefinitely'})")
+if EXPRESSION_STORAGE == "hashed":
+    print(f"  Expression Storage: hashed (text in the Expressions table)")
+if RUN_TIME_BUDGET_MINUTES:
+    print(f"  Time Budget: {RUN_TIME_BUDGET_MINUTES} min ({RUN_TIME_RESERVE_MINUTES} min reserved for writing)")
+
+# ==============================================================
+# SHARED HELPERS: LONG-RUNNING OPERATIONS (LRO)
+# ==============================================================
+# Fabric item APIs such as getDefinition may answer 202 Accepted with a
+# Location / x-ms-operation-id header instead of returning the payload.
+# LongRunningOperationTracker keeps many of those operations pending at once,
+# polls them all on one shared schedule (honouring Retry-After) and yields
+# each result as soon as it is available.
+
+import time
+from urllib.parse import urlparse
+
+def to_relative_rest_path(url):
+    """Convert an absolute Fabric API URL (e.g. a Location header) to a client-relative path"""
+    if not url.lower().startswith("http"):
+        return url.lstrip("/")
+    parsed = urlparse(url)
+    path = parsed.path.lstrip("/")
+    return f"{path}?{parsed.query}" if parsed.query else path
+
+def get_retry_after(response, default):
+    """Read the Retry-After header (seconds) from a response, falling back to default"""
+    try:
+        return max(1, int(float(response.headers.get("Retry-After", default))))
+    except (TypeError, ValueError):
+        return default
+
+class LongRunningOperationTracker:
+    """
+    Track pending Fabric long-running operations and poll them on one shared schedule.
+
+    Usage:
+        tracker = LongRunningOperationTracker(client)
+        for item_id in item_ids:
+            tracker.post(item_id, f"v1/workspaces/{ws_id}/dataflows/{item_id}/getDefinition")
+        for item_id, result, error in tracker.as_completed():
+            ...
+    """
+
+    TERMINAL_FAILURE_STATES = ("Failed", "Cancelled", "Undefined")
+
+    def __init__(self, client, default_retry_after=5, max_retry_after=60, max_wait_seconds=600):
+        """
+        Args:
+            client: FabricRestClient instance used for submitting and polling
+            default_retry_after: Poll interval (seconds) when the service sends no Retry-After
+            max_retry_after: Upper bound (seconds) applied to any Retry-After value
+            max_wait_seconds: Per-operation deadline before it is reported as timed out
+        """
+        self.client = client
+        self.default_retry_after = default_retry_after
+        self.max_retry_after = max_retry_after
+        self.max_wait_seconds = max_wait_seconds
+        self._pending = {}
+        self._completed = []
+        self._submitted_at = {}
+        self.durations = {}
+
+    def __len__(self):
+        return len(self._pending) + len(self._completed)
+
+    @property
+    def pending_count(self):
+        """Number of operations still waiting on the service (202 Accepted)"""
+        return len(self._pending)
+
+    def post(self, key, endpoint, json=None):
+        """Submit a POST that may start a long-running operation and track it under key"""
+        submitted_at = time.time()
+        try:
+            response = self.client.post(endpoint, json=json if json is not None else {})
+        except Exception as e:
+            self._submitted_at[key] = submitted_at
+            self._complete(key, None, str(e))
+            return
+        self.track(key, response, submitted_at)
+
+    def track(self, key, response, submitted_at=None):
+        """Track the response of an already-submitted request (200 = done, 202 = pending)"""
+        self._submitted_at[key] = submitted_at if submitted_at is not None else time.time()
+
+        if response.status_code == 200:
+            self._complete(key, self._json_or_none(response), None)
+            return
+
+        if response.status_code != 202:
+            self._complete(key, None, f"status {response.status_code}")
+            return
+
+        location = response.headers.get("Location", "")
+        operation_id = response.headers.get("x-ms-operation-id", "")
+        if location:
+            operation_path = to_relative_rest_path(location)
+        elif operation_id:
+            operation_path = f"v1/operations/{operation_id}"
+        else:
+            self._complete(key, None, "202 Accepted without Location or operation header")
+            return
+
+        self._pending[key] = {"operation_path": operation_path, "started_at": time.time()}
+        self._schedule(self._pending[key], get_retry_after(response, self.default_retry_after))
+
+    def as_completed(self):
+        """
+        Yield (key, result, error) tuples as operations finish.
+
+        Immediate (200) responses are yielded first; pending operations are then polled
+        together, sleeping only until the earliest Retry-After among them. The seconds
+        from submission to completion are kept per key in `durations`.
+        """
+        while self._completed or self._pending:
+            while self._completed:
+                yield self._completed.pop(0)
+
+            if not self._pending:
+                break
+
+            now = time.time()
+            due = [key for key, op in self._pending.items() if op["next_poll_at"] <= now]
+            if not due:
+                next_poll_at = min(op["next_poll_at"] for op in self._pending.values())
+                time.sleep(max(0.0, next_poll_at - now))
+                continue
+
+            for key in due:
+                self._poll(key)
+
+    def _schedule(self, op, retry_after):
+        """Set the next poll after retry_after seconds, but no later than the operation's deadline"""
+        deadline = op["started_at"] + self.max_wait_seconds
+        op["next_poll_at"] = min(time.time() + min(retry_after, self.max_retry_after), deadline)
+
+    def _complete(self, key, result, error):
+        """Queue a finished operation, timing it now rather than when the caller gets to it"""
+        self.durations[key] = time.time() - self._submitted_at.get(key, time.time())
+        self._completed.append((key, result, error))
+
+    def _poll(self, key):
+        op = self._pending[key]
+        if time.time() - op["started_at"] > self.max_wait_seconds:
+            del self._pending[key]
+            self._complete(key, None, f"operation timed out after {self.max_wait_seconds}s")
+            return
+
+        try:
+            response = self.client.get(op["operation_path"])
+        except Exception as e:
+            del self._pending[key]
+            self._complete(key, None, f"polling failed: {e}")
+            return
+
+        retry_after = get_retry_after(response, self.default_retry_after)
+
+        # Throttled or still accepted: keep waiting on the shared schedule
+        if response.status_code in (202, 429):
+            self._schedule(op, retry_after)
+            return
+
+        if response.status_code != 200:
+            del self._pending[key]
+            self._complete(key, None, f"polling returned status {response.status_code}")
+            return
+
+        state = self._json_or_none(response) or {}
+        status = state.get("status", "")
+
+        if status == "Succeeded":
+            del self._pending[key]
+            self._complete(*self._fetch_result(key, op, response))
+        elif status in self.TERMINAL_FAILURE_STATES:
+            del self._pending[key]
+            error = state.get("error") or {}
+            message = error.get("message", "") if isinstance(error, dict) else str(error)
+            self._complete(key, None, f"operation {status.lower()}" + (f": {message}" if message else ""))
+        else:
+            self._schedule(op, retry_after)
+
+    def _fetch_result(self, key, op, poll_response):
+        location = poll_response.headers.get("Location", "")
+        result_path = to_relative_rest_path(location) if location else f"{op['operation_path'].split('?')[0]}/result"
+        try:
+            response = self.client.get(result_path)
+        except Exception as e:
+            return (key, None, f"fetching result failed: {e}")
+        if response.status_code != 200:
+            return (key, None, f"fetching result returned status {response.status_code}")
+        return (key, self._json_or_none(response), None)
+
+    @staticmethod
+    def _json_or_none(response):
+        try:
+            return response.json()
+        except Exception:
+            return None
+
+# ==============================================================
+# SHARED HELPERS: RUN METRICS
+# ==============================================================
+# Every REST and sempy call made by the extractor cells goes through
+# InstrumentedRestClient / instrument() / timed_call(), which record call
+# count, latency, bytes received, status codes and retries per endpoint
+# template (e.g. "groups/{ws}/datasets/{ds}/refreshes"). Each cell appends
+# its aggregated rows to the RunMetrics Delta table via write_run_metrics().
+
+import json
+import math
+import uuid
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+if not RUN_ID:
+    RUN_ID = f"{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+print(f"  Run ID: {RUN_ID}")
+
+# Placeholder used in endpoint templates for the ID following each collection segment
+ENDPOINT_ID_PLACEHOLDERS = {
+    "groups": "{ws}",
+    "workspaces": "{ws}",
+    "datasets": "{ds}",
+    "semanticModels": "{ds}",
+    "dataflows": "{df}",
+    "reports": "{rpt}",
+    "apps": "{app}",
+    "items": "{item}",
+    "sqlEndpoints": "{ep}",
+    "lakehouses": "{lh}",
+    "operations": "{op}",
+    "pages": "{page}"
+}
+
+GUID_PATTERN = re.compile(r'^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$')
+
+def get_api_family(path):
+    """Classify a REST path as the Power BI (v1.0/myorg) or Fabric (v1) API"""
+    path = to_relative_rest_path(path)
+    return "powerbi" if path.startswith("v1.0/") else "fabric"
+
+def get_endpoint_template(path):
+    """
+    Reduce a REST path to its endpoint template by replacing IDs with placeholders.
+    
+    Example:
+        v1.0/myorg/groups/<guid>/datasets/<guid>/refreshes -> groups/{ws}/datasets/{ds}/refreshes
+    """
+    segments = to_relative_rest_path(path).split("?")[0].strip("/").split("/")
+    if segments[:2] == ["v1.0", "myorg"]:
+        segments = segments[2:]
+    elif segments[:1] in (["v1"], ["v1.0"]):
+        segments = segments[1:]
+
+    template = []
+    for i, segment in enumerate(segments):
+        previous = segments[i - 1] if i > 0 else ""
+        if previous in ENDPOINT_ID_PLACEHOLDERS:
+            template.append(ENDPOINT_ID_PLACEHOLDERS[previous])
+        elif GUID_PATTERN.match(segment):
+            template.append("{id}")
+        else:
+            template.append(segment)
+    return "/".join(template)
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+class RunMetrics:
+    """Thread-safe per-endpoint call statistics for one notebook run"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._stats = defaultdict(lambda: {
+                "latencies": [],
+                "bytes": 0,
+                "retries": 0,
+                "errors": 0,
+                "status_codes": defaultdict(int)
+            })
+
+    def record(self, api_family, endpoint, latency_seconds, status="200", bytes_received=0, retried_statuses=()):
+        """Record one logical call; statuses of retried attempts count towards the histogram and RetryCount"""
+        with self._lock:
+            stats = self._stats[(api_family, endpoint)]
+            stats["latencies"].append(latency_seconds)
+            stats["bytes"] += bytes_received
+            stats["retries"] += len(retried_statuses)
+            for retried_status in retried_statuses:
+                stats["status_codes"][str(retried_status)] += 1
+            stats["status_codes"][str(status)] += 1
+            if not str(status).startswith("2"):
+                stats["errors"] += 1
+
+    def rows(self, phase):
+        """Aggregate recorded calls into RunMetrics table rows"""
+        recorded_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        rows = []
+        with self._lock:
+            for (api_family, endpoint), stats in self._stats.items():
+                latencies_ms = sorted(l * 1000.0 for l in stats["latencies"])
+                rows.append({
+                    "RunId": RUN_ID,
+                    "Phase": phase,
+                    "ApiFamily": api_family,
+                    "Endpoint": endpoint,
+                    "CallCount": len(latencies_ms),
+                    "ErrorCount": stats["errors"],
+                    "RetryCount": stats["retries"],
+                    "P50Ms": round(percentile(latencies_ms, 50), 1),
+                    "P95Ms": round(percentile(latencies_ms, 95), 1),
+                    "P99Ms": round(percentile(latencies_ms, 99), 1),
+                    "MaxMs": round(latencies_ms[-1], 1) if latencies_ms else 0.0,
+                    "TotalSeconds": round(sum(latencies_ms) / 1000.0, 3),
+                    "BytesReceived": stats["bytes"],
+                    "StatusCodes": json.dumps(dict(stats["status_codes"]), sort_keys=True),
+                    "RecordedAt": recorded_at
+                })
+        return sorted(rows, key=lambda r: r["TotalSeconds"], reverse=True)
+
+RUN_METRICS = RunMetrics()
+
+class InstrumentedRestClient:
+    """
+    Drop-in wrapper for FabricRestClient.
+    
+    Records per-endpoint metrics for every call and retries throttled (429) or
+    unavailable (503) responses up to REST_MAX_RETRIES times, honouring Retry-After.
+    """
+
+    RETRYABLE_STATUS_CODES = (429, 503)
+
+    def __init__(self, client, metrics=None, max_retries=None):
+        self.client = client
+        self.metrics = metrics if metrics is not None else RUN_METRICS
+        self.max_retries = REST_MAX_RETRIES if max_retries is None else max_retries
+
+    def get(self, path, **kwargs):
+        return self._request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self._request("POST", path, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def _request(self, http_method, path, **kwargs):
+        method = getattr(self.client, http_method.lower())
+        endpoint = get_endpoint_template(path)
+        api_family = get_api_family(path)
+        limiter = CONCURRENCY.get(api_family)
+        retried_statuses = []
+        t0 = time.time()
+        while True:
+            try:
+                with limiter.slot():
+                    attempt_t0 = time.time()
+                    response = method(path, **kwargs)
+            except Exception as e:
+                limiter.on_error(e)
+                self.metrics.record(api_family, endpoint, time.time() - t0, "error", 0, retried_statuses)
+                raise
+            limiter.on_response(response.status_code, time.time() - attempt_t0)
+            if response.status_code in self.RETRYABLE_STATUS_CODES and len(retried_statuses) < self.max_retries:
+                retried_statuses.append(response.status_code)
+                time.sleep(get_retry_after(response, 2 ** len(retried_statuses)))
+                continue
+            try:
+                bytes_received = len(response.content or b"")
+            except Exception:
+                bytes_received = 0
+            self.metrics.record(api_family, endpoint, time.time() - t0, response.status_code, bytes_received, retried_statuses)
+            FIXTURE_RECORDER.record_rest(http_method, path, kwargs.get("json"), response)
+            return response
+
+def timed_call(endpoint, fn, *args, **kwargs):
+    """Call fn and record its latency in RUN_METRICS under the given endpoint name"""
+    return _timed_call(endpoint, fn, args, kwargs)
+
+def _timed_call(endpoint, fn, args, kwargs, context=None):
+    limiter = CONCURRENCY.get(SEMPY_CALL_FAMILIES.get(endpoint))
+    t0 = time.time()
+    try:
+        with limiter.slot():
+            result = fn(*args, **kwargs)
+    except Exception as e:
+        limiter.on_error(e)
+        RUN_METRICS.record("sempy", endpoint, time.time() - t0, "error")
+        FIXTURE_RECORDER.record_call(endpoint, args, kwargs, context, error=e)
+        raise
+    limiter.on_response(200, time.time() - t0)
+    RUN_METRICS.record("sempy", endpoint, time.time() - t0)
+    return FIXTURE_RECORDER.record_call(endpoint, args, kwargs, context, result=result)
+
+class instrument:
+    """
+    Proxy an object (e.g. the sempy.fabric module or a ReportWrapper) so every method
+    call is recorded via timed_call as "<prefix>.<method>". Attributes pass through.
+    The optional context (e.g. report and workspace) identifies the object in fixtures.
+    """
+
+    def __init__(self, target, prefix, context=None):
+        self._target = target
+        self._prefix = prefix
+        self._context = context
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr) or isinstance(attr, type):
+            return attr
+        endpoint = f"{self._prefix}.{name}"
+        return lambda *args, **kwargs: _timed_call(endpoint, attr, args, kwargs, self._context)
+
+RUN_METRICS_TEMPLATE = {
+    "RunId": "", "Phase": "", "ApiFamily": "", "Endpoint": "", "CallCount": 0, "ErrorCount": 0,
+    "RetryCount": 0, "P50Ms": 0.0, "P95Ms": 0.0, "P99Ms": 0.0, "MaxMs": 0.0, "TotalSeconds": 0.0,
+    "BytesReceived": 0, "StatusCodes": "", "RecordedAt": "", "TenantId": "", "SemanticLinkLabsVersion": ""
+}
+
+def get_run_context():
+    """Tenant and library version stamped on RunMetrics rows for cross-tenant/release trending"""
+    context = {"TenantId": "", "SemanticLinkLabsVersion": ""}
+    try:
+        context["TenantId"] = spark.conf.get("trident.tenant.id", "")
+    except Exception:
+        pass
+    try:
+        from importlib.metadata import version
+        context["SemanticLinkLabsVersion"] = version("semantic-link-labs")
+    except Exception:
+        pass
+    return context
+
+def write_run_metrics(phase, top_n=5):
+    """
+    Append this phase's per-endpoint metrics to the RunMetrics Delta table,
+    print the endpoints that dominated runtime and reset the collector.
+    """
+    import pandas as pd
+
+    context = get_run_context()
+    rows = [{**row, **context} for row in RUN_METRICS.rows(phase)]
+    full_name = f"{spark.sql('SELECT current_catalog()').first()[0]}.{LAKEHOUSE_SCHEMA}.RunMetrics"
+
+    print(f"\nTop endpoints by total time ({phase}):", flush=True)
+    for row in rows[:top_n]:
+        print(f"  {row['Endpoint']}: {row['CallCount']} calls, {row['TotalSeconds']:.1f} sec total, "
+              f"p95 {row['P95Ms']:.0f} ms, retries {row['RetryCount']}", flush=True)
+    print(f"Concurrency: {CONCURRENCY.describe()}", flush=True)
+
+    df = spark.createDataFrame(pd.DataFrame(rows if rows else [RUN_METRICS_TEMPLATE]))
+    if not rows:
+        df = df.filter("1=0")
+    df.write.mode("append").option("mergeSchema", "true").format("delta").saveAsTable(full_name)
+    print(f"✓ Appended {len(rows)} endpoint metric rows → {full_name}", flush=True)
+
+    RUN_METRICS.reset()
+
+
+# ==============================================================
+# SHARED HELPERS: ADAPTIVE CONCURRENCY (AIMD)
+# ==============================================================
+# Every REST request and sempy call takes a slot from the limiter of its API
+# family before it runs. Each limiter starts at MAX_PARALLEL_WORKERS and adapts:
+#   - additive increase: +1 after a full window (limit) of healthy calls, only
+#     while the limit is actually reached (a serial loop never raises it)
+#   - hold: no increase while smoothed latency exceeds the tolerance over the
+#     fastest latency seen (the service is queueing our calls)
+#   - multiplicative decrease: halve on 429/503 or timeouts, at most once per
+#     latency window so one burst of throttling halves the limit only once
+# Thread pools are sized to the ceiling; the limiters decide how many of their
+# threads actually call the service at once.
+
+from contextlib import contextmanager, nullcontext
+
+CONCURRENCY_LATENCY_TOLERANCE = 2.0
+CONCURRENCY_DECREASE_FACTOR = 0.5
+CONGESTION_STATUS_CODES = (429, 503)
+CONGESTION_ERROR_PATTERNS = ("429", "throttl", "too many requests", "timed out", "timeout", "503")
+
+# sempy / semantic-link-labs calls by the API family they load
+SEMPY_CALL_FAMILIES = {
+    "fabric.list_workspaces": "powerbi",
+    "fabric.list_datasets": "powerbi",
+    "fabric.list_reports": "powerbi",
+    "resolve_dataset_from_report": "powerbi",
+    "ReportWrapper": "fabric",
+    "TOMWrapper": "xmla",
+    "get_model_calc_dependencies": "xmla"
+}
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD concurrency limit for one API family"""
+
+    def __init__(self, name, initial, minimum=1, maximum=32, adaptive=True,
+                 latency_tolerance=CONCURRENCY_LATENCY_TOLERANCE, decrease_factor=CONCURRENCY_DECREASE_FACTOR):
+        self.name = name
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.adaptive = adaptive
+        self.latency_tolerance = latency_tolerance
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.smoothed_latency = None
+        self.baseline_latency = None
+        self.increases = 0
+        self.decreases = 0
+        self._healthy_calls = 0
+        self._saturated = False
+        self._last_decrease_at = 0.0
+        self._condition = threading.Condition()
+
+    @property
+    def current_limit(self):
+        return int(self.limit)
+
+    @contextmanager
+    def slot(self):
+        """Block until a call slot is free, hold it for the duration of the call"""
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            if self.in_flight >= int(self.limit):
+                self._saturated = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.in_flight -= 1
+                self._condition.notify()
+
+    def on_response(self, status_code, latency_seconds):
+        """Feed back one completed call"""
+        if status_code in CONGESTION_STATUS_CODES:
+            self._decrease(f"status {status_code}")
+        elif isinstance(status_code, int) and status_code < 500:
+            self._on_healthy(latency_seconds)
+
+    def on_error(self, error):
+        """Feed back a failed call; only throttling/timeouts count as congestion"""
+        message = str(error).lower()
+        if any(pattern in message for pattern in CONGESTION_ERROR_PATTERNS):
+            self._decrease(type(error).__name__)
+
+    def _on_healthy(self, latency_seconds):
+        if not self.adaptive:
+            return
+        with self._condition:
+            if self.smoothed_latency is None:
+                self.smoothed_latency = latency_seconds
+            else:
+                self.smoothed_latency = 0.8 * self.smoothed_latency + 0.2 * latency_seconds
+            if self.baseline_latency is None or self.smoothed_latency < self.baseline_latency:
+                self.baseline_latency = self.smoothed_latency
+
+            if self.smoothed_latency > self.baseline_latency * self.latency_tolerance:
+                self._healthy_calls = 0
+                return
+
+            self._healthy_calls += 1
+            if self._healthy_calls >= int(self.limit) and self._saturated and self.limit < self.maximum:
+                self._healthy_calls = 0
+                self._saturated = False
+                self.limit = min(self.maximum, self.limit + 1)
+                self.increases += 1
+                self._condition.notify_all()
+
+    def _decrease(self, reason):
+        if not self.adaptive:
+            return
+        with self._condition:
+            now = time.time()
+            if now - self._last_decrease_at < max(1.0, self.smoothed_latency or 0.0):
+                return
+            previous = int(self.limit)
+            self.limit = max(float(self.minimum), self.limit * self.decrease_factor)
+            self._last_decrease_at = now
+            self._healthy_calls = 0
+            self.decreases += 1
+        if int(self.limit) != previous:
+            print(f"  Concurrency [{self.name}]: {previous} → {int(self.limit)} ({reason})", flush=True)
+
+    def describe(self):
+        return (f"{self.name} limit {int(self.limit)} (peak in flight {self.peak_in_flight}, "
+                f"+{self.increases}/-{self.decreases})")
+
+class ConcurrencyController:
+    """One AdaptiveConcurrencyLimiter per API family, created on first use"""
+
+    def __init__(self, initial, maximum, adaptive=True):
+        self.initial = initial
+        self.maximum = maximum
+        self.adaptive = adaptive
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def get(self, family):
+        """Limiter for an API family ("powerbi", "fabric", "xmla"); None = unlimited"""
+        if family is None:
+            return UNLIMITED
+        with self._lock:
+            if family not in self._limiters:
+                self._limiters[family] = AdaptiveConcurrencyLimiter(
+                    family, self.initial, maximum=self.maximum if self.adaptive else self.initial, adaptive=self.adaptive
+                )
+            return self._limiters[family]
+
+    def describe(self):
+        with self._lock:
+            limiters = list(self._limiters.values())
+        return "; ".join(limiter.describe() for limiter in limiters) or "no calls yet"
+
+class _UnlimitedLimiter:
+    """Limiter for calls that do not reach a service (e.g. parsing an already-loaded report)"""
+
+    def slot(self):
+        return nullcontext()
+
+    def on_response(self, status_code, latency_seconds):
+        pass
+
+    def on_error(self, error):
+        pass
+
+UNLIMITED = _UnlimitedLimiter()
+CONCURRENCY = ConcurrencyController(MAX_PARALLEL_WORKERS, MAX_CONCURRENCY_LIMIT, adaptive=ADAPTIVE_CONCURRENCY)
+
+# Thread pools are sized to the ceiling; CONCURRENCY bounds the calls in flight
+CONCURRENCY_POOL_SIZE = MAX_CONCURRENCY_LIMIT if ADAPTIVE_CONCURRENCY else MAX_PARALLEL_WORKERS
+
+
+# ==============================================================
+# SHARED HELPERS: PROGRESS TRACKING
+# ==============================================================
+# PROGRESS is fed by the workspace, dataset, report and dataflow loops of each
+# cell. Per phase it keeps completed/total counters per unit, a rolling
+# throughput (items/min) and an ETA. A shared heartbeat thread prints the
+# state every PROGRESS_INTERVAL_SECONDS and writes it to
+# {RUN_STATE_PATH}/runs/{RUN_ID}/progress.json, which
+# WorkloadIntegration.get_analysis_status reads to show real progress. When the
+# run ends, {RUN_STATE_PATH}/latest_run.json is rewritten; WorkloadIntegration
+# drops its cached results when the run ID in it changes. A cell that raises (or
+# is cancelled) ends the run as "failed" through an IPython exception hook, so
+# progress.json does not say "running" for a run that has stopped.
+
+import os
+from collections import deque
+
+PIPELINE_PHASES = ["Environment", "Models", "Reports", "Dataflows", "SqlEndpointRefresh"]
+PROGRESS_INTERVAL_SECONDS = 10
+PROGRESS_THROUGHPUT_WINDOW_SECONDS = 300
+LATEST_RUN_FILE = "latest_run.json"
+
+def get_run_state_dir(run_id=None):
+    """Folder holding state files (progress, checkpoints) for a run; one subfolder per shard when sharded"""
+    path = os.path.join(RUN_STATE_PATH, "runs", run_id or RUN_ID)
+    return os.path.join(path, "shards", str(SHARD_INDEX)) if SHARD_COUNT > 1 else path
+
+def write_json_atomic(path, data):
+    """Write JSON via a temporary file so readers never see a partial document"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2, default=str)
+    os.replace(tmp_path, path)
+
+class ProgressTracker:
+    """Thread-safe per-phase progress with rolling throughput and ETA"""
+
+    def __init__(self, run_id):
+        self.run_id = run_id
+        self.started_at = time.time()
+        self.status = "running"
+        self.error = None
+        self.current_phase = None
+        self._phases = {}
+        self._lock = threading.Lock()
+        self._heartbeat_started = False
+        self._write_warning_shown = False
+
+    # ----- updates (called from the extraction loops) -----
+
+    def start_phase(self, phase, unit, total=None):
+        """Start a phase whose primary unit (e.g. workspaces) drives its ETA"""
+        with self._lock:
+            self._phases[phase] = {
+                "status": "running",
+                "started_at": time.time(),
+                "finished_at": None,
+                "primary_unit": unit,
+                "counters": {}
+            }
+            self.current_phase = phase
+            self._counter(phase, unit)["total"] = total
+        self.start_heartbeat()
+        self.save()
+
+    def add_total(self, phase, unit, count):
+        """Grow a unit's total as work is discovered (e.g. datasets listed per workspace)"""
+        with self._lock:
+            counter = self._counter(phase, unit)
+            counter["total"] = (counter["total"] or 0) + count
+
+    def advance(self, phase, unit, count=1):
+        with self._lock:
+            counter = self._counter(phase, unit)
+            counter["completed"] += count
+            counter["samples"].append((time.time(), counter["completed"]))
+
+    def finish_phase(self, phase):
+        with self._lock:
+            if phase in self._phases:
+                self._phases[phase]["status"] = "completed"
+                self._phases[phase]["finished_at"] = time.time()
+            if self.current_phase == phase:
+                self.current_phase = None
+        self.save()
+
+    def complete_run(self, status="completed", error=None):
+        with self._lock:
+            self.status = status
+            self.error = error
+            if self.current_phase:
+                self._phases[self.current_phase]["status"] = status
+                self.current_phase = None
+        self.save()
+        try:
+            write_json_atomic(os.path.join(RUN_STATE_PATH, LATEST_RUN_FILE), {
+                "run_id": self.run_id,
+                "shard": SHARD_INDEX if SHARD_COUNT > 1 else None,
+                "status": status,
+                "completed_at": datetime.now().isoformat()
+            })
+        except Exception as e:
+            print(f"[Progress] Warning: could not write {LATEST_RUN_FILE}: {e}", flush=True)
+
+    # ----- reporting -----
+
+    def snapshot(self):
+        """Serializable progress state (the document read by the Workload UI)"""
+        with self._lock:
+            now = time.time()
+            phases = {}
+            for phase, state in self._phases.items():
+                counters = {unit: self._counter_state(counter, now) for unit, counter in state["counters"].items()}
+                primary = counters.get(state["primary_unit"], {})
+                phases[phase] = {
+                    "status": state["status"],
+                    "started_at": datetime.fromtimestamp(state["started_at"]).isoformat(),
+                    "finished_at": datetime.fromtimestamp(state["finished_at"]).isoformat() if state["finished_at"] else None,
+                    "elapsed_minutes": round(((state["finished_at"] or now) - state["started_at"]) / 60, 2),
+                    "primary_unit": state["primary_unit"],
+                    "percent_complete": 100.0 if state["status"] == "completed" else primary.get("percent_complete"),
+                    "eta_minutes": 0.0 if state["status"] == "completed" else primary.get("eta_minutes"),
+                    "counters": counters
+                }
+
+            finished = sum(1 for p in PIPELINE_PHASES if phases.get(p, {}).get("status") == "completed")
+            current_fraction = (phases.get(self.current_phase, {}).get("percent_complete") or 0.0) / 100.0
+            overall = 100.0 if self.status == "completed" else round(100.0 * (finished + current_fraction) / len(PIPELINE_PHASES), 1)
+
+            return {
+                "run_id": self.run_id,
+                "status": self.status,
+                "error": self.error,
+                "current_phase": self.current_phase,
+                "percent_complete": overall,
+                "started_at": datetime.fromtimestamp(self.started_at).isoformat(),
+                "updated_at": datetime.fromtimestamp(now).isoformat(),
+                "elapsed_minutes": round((now - self.started_at) / 60, 2),
+                "phases": phases
+            }
+
+    def describe(self):
+        """One-line summary of the current phase for the heartbeat log"""
+        snapshot = self.snapshot()
+        phase = snapshot["current_phase"]
+        if not phase:
+            return f"[Progress] elapsed {snapshot['elapsed_minutes']:.2f} min"
+        state = snapshot["phases"][phase]
+        parts = []
+        for unit, counter in state["counters"].items():
+            total = f"/{counter['total']}" if counter["total"] is not None else ""
+            parts.append(f"{unit} {counter['completed']}{total} ({counter['items_per_minute']:.1f}/min)")
+        eta = f"{state['eta_minutes']:.1f} min" if state["eta_minutes"] is not None else "unknown"
+        return (f"[Progress] {phase}: " + ", ".join(parts) +
+                f" | ETA {eta} | elapsed {state['elapsed_minutes']:.2f} min")
+
+    def save(self):
+        """Persist the snapshot; failures never interrupt extraction"""
+        try:
+            write_json_atomic(os.path.join(get_run_state_dir(self.run_id), "progress.json"), self.snapshot())
+        except Exception as e:
+            if not self._write_warning_shown:
+                self._write_warning_shown = True
+                print(f"[Progress] Warning: could not persist progress to {RUN_STATE_PATH}: {e}", flush=True)
+
+    def start_heartbeat(self):
+        with self._lock:
+            if self._heartbeat_started:
+                return
+            self._heartbeat_started = True
+        threading.Thread(target=self._heartbeat, daemon=True).start()
+
+    # ----- internals -----
+
+    def _heartbeat(self):
+        while self.status == "running":
+            time.sleep(PROGRESS_INTERVAL_SECONDS)
+            if self.current_phase:
+                print(self.describe(), flush=True)
+            # Also between phases: WorkloadIntegration takes a progress.json gone stale for a dead run
+            self.save()
+
+    def _counter(self, phase, unit):
+        counters = self._phases[phase]["counters"]
+        if unit not in counters:
+            # Seed with a zero sample so throughput is measured from when counting started
+            counters[unit] = {"completed": 0, "total": None, "samples": deque([(time.time(), 0)])}
+        return counters[unit]
+
+    def _counter_state(self, counter, now):
+        samples = counter["samples"]
+        while len(samples) > 2 and now - samples[0][0] > PROGRESS_THROUGHPUT_WINDOW_SECONDS:
+            samples.popleft()
+
+        # Rolling throughput over the last PROGRESS_THROUGHPUT_WINDOW_SECONDS
+        window_minutes = max((now - samples[0][0]) / 60, 1 / 60)
+        rate = (samples[-1][1] - samples[0][1]) / window_minutes
+
+        total = counter["total"]
+        remaining = max(total - counter["completed"], 0) if total is not None else None
+        return {
+            "completed": counter["completed"],
+            "total": total,
+            "remaining": remaining,
+            "items_per_minute": round(rate, 2),
+            "percent_complete": round(100.0 * counter["completed"] / total, 1) if total else None,
+            "eta_minutes": round(remaining / rate, 1) if remaining is not None and rate > 0 else None
+        }
+
+PROGRESS = ProgressTracker(RUN_ID)
+
+def fail_run_on_error(shell, etype, value, tb, tb_offset=None):
+    """IPython custom exception handler: a failed or cancelled cell ends the run as failed"""
+    if PROGRESS.status == "running":
+        PROGRESS.complete_run("failed", f"{etype.__name__}: {value}" if str(value) else etype.__name__)
+        print(f"Run {RUN_ID} marked as failed", flush=True)
+    # Keep what was recorded up to the failure (Cell 0 may fail before the recorder exists)
+    if "FIXTURE_RECORDER" in globals():
+        FIXTURE_RECORDER.close()
+    return shell.showtraceback((etype, value, tb), tb_offset=tb_offset)
+
+try:
+    get_ipython().set_custom_exc((Exception, KeyboardInterrupt), fail_run_on_error)
+except (NameError, AttributeError):
+    print("Not running in an IPython kernel: a failing cell will not mark the run as failed", flush=True)
+
+
+# ==============================================================
+# SHARED HELPERS: FIXTURE RECORDING
+# ==============================================================
+# When REST_RECORD_PATH is set, every REST response and sempy / semantic-link-labs
+# result seen by the instrumentation above is appended to gzip-compressed JSON
+# Lines files under {REST_RECORD_PATH}/{RUN_ID}/:
+#   rest.jsonl.gz  - method, path, body, status, headers and content of REST calls
+#   sempy.jsonl.gz - call name, args, context and DataFrame/JSON result or error
+#   tom.jsonl.gz   - TOMWrapper model snapshots and depends_on results
+# fabric_replay.py serves these files through local stand-ins so the extractor
+# cells can be run and benchmarked without a tenant. Entries are buffered and
+# appended as a complete gzip member after each workspace (or every
+# FIXTURE_FLUSH_BYTES), and no file is left open in between, so an interrupted
+# run leaves readable files holding every finished workspace.
+
+import gzip
+
+RECORDED_HEADERS = ("Location", "Retry-After", "x-ms-operation-id", "Content-Type")
+FIXTURE_FLUSH_BYTES = 8 * 1024 * 1024
+
+# TOM properties read by Cell 2, per collection (dotted paths are nested objects)
+TOM_SNAPSHOT_FIELDS = {
+    "tables": ["Name", "IsHidden"],
+    "calculation_groups": ["Name", "Description", "IsHidden"],
+    "calculation_items": ["Name", "Description", "Expression", "Parent.Name"],
+    "columns": ["Table.Name", "Name", "FormatString", "DisplayFolder", "Description", "IsHidden"],
+    "calculated_columns": ["Table.Name", "Name", "FormatString", "DisplayFolder", "Description", "IsHidden", "Expression"],
+    "measures": ["Table.Name", "Name", "FormatString", "DisplayFolder", "Description", "IsHidden", "Expression"],
+    "hierarchies": ["Table.Name", "Name", "DisplayFolder", "Description", "IsHidden"],
+    "levels": ["Hierarchy.Table.Name", "Hierarchy.Name", "Name", "Description"],
+    "partitions": ["Table.Name", "Name", "Description", "Mode", "Source.Expression"],
+    "relationships": ["Name", "FromTable.Name", "FromColumn.Name", "ToTable.Name", "ToColumn.Name", "IsActive",
+                      "FromCardinality", "ToCardinality", "CrossFilteringBehavior"]
+}
+
+def read_tom_path(obj, path):
+    """Read a dotted attribute path from a TOM object as a JSON-friendly value"""
+    for attr in path.split("."):
+        obj = getattr(obj, attr, None) if obj is not None else None
+    if obj is None or isinstance(obj, (str, bool, int, float)):
+        return obj
+    return obj.ToString() if hasattr(obj, "ToString") else str(obj)
+
+def get_tom_object_key(obj):
+    """Identify a TOM object as ObjectType|Table|Name (matches fabric_replay.py)"""
+    table = read_tom_path(obj, "Table.Name") if hasattr(obj, "Table") else ""
+    return f"{obj.ObjectType}|{table or ''}|{obj.Name}"
+
+def snapshot_tom_model(tom):
+    """Capture the TOM properties read by Cell 2 as plain JSON"""
+    sources = {
+        "tables": lambda: tom.model.Tables,
+        "calculation_groups": tom.all_calculation_groups,
+        "calculation_items": tom.all_calculation_items,
+        "columns": tom.all_columns,
+        "calculated_columns": tom.all_calculated_columns,
+        "measures": tom.all_measures,
+        "hierarchies": tom.all_hierarchies,
+        "levels": tom.all_levels,
+        "partitions": tom.all_partitions,
+        "relationships": lambda: tom.model.Relationships
+    }
+    snapshot = {}
+    for collection, source in sources.items():
+        try:
+            snapshot[collection] = [
+                {field: read_tom_path(obj, field) for field in TOM_SNAPSHOT_FIELDS[collection]}
+                for obj in source()
+            ]
+        except Exception as e:
+            snapshot[collection] = {"error": str(e)}
+    return snapshot
+
+class RecordingTOMWrapper:
+    """Pass-through TOMWrapper proxy that records depends_on results for replay"""
+
+    def __init__(self, tom, recorder, dataset, workspace):
+        self._tom = tom
+        self._recorder = recorder
+        self._dataset = dataset
+        self._workspace = workspace
+
+    def __getattr__(self, name):
+        return getattr(self._tom, name)
+
+    def depends_on(self, object, dependencies):
+        result = list(self._tom.depends_on(object=object, dependencies=dependencies))
+        self._recorder.write("tom", {
+            "type": "depends_on",
+            "dataset": self._dataset,
+            "workspace": self._workspace,
+            "object": get_tom_object_key(object),
+            "result": [{
+                "ObjectType": str(dep.ObjectType),
+                "Name": dep.Name,
+                "Parent.Name": read_tom_path(dep, "Parent.Name") if str(dep.ObjectType) in ("Measure", "Column") else ""
+            } for dep in result]
+        })
+        return result
+
+class FixtureRecorder:
+    """Thread-safe writer of REST/sempy fixtures (no-op unless REST_RECORD_PATH is set)"""
+
+    def __init__(self, path):
+        self.path = path
+        self.enabled = bool(path)
+        self._pending = defaultdict(list)
+        self._pending_bytes = 0
+        self._lock = threading.Lock()
+        if self.enabled:
+            os.makedirs(path, exist_ok=True)
+            print(f"  Recording REST/sempy fixtures to: {path}")
+
+    def write(self, kind, entry):
+        line = (json.dumps(entry, default=str) + "\n").encode("utf-8")
+        with self._lock:
+            self._pending[kind].append(line)
+            self._pending_bytes += len(line)
+            if self._pending_bytes >= FIXTURE_FLUSH_BYTES:
+                self._write_pending()
+
+    def flush(self):
+        """Append the buffered entries to the fixture files (one gzip member per file)"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._write_pending()
+
+    def close(self):
+        self.flush()
+
+    def _write_pending(self):
+        for kind, lines in self._pending.items():
+            with gzip.open(os.path.join(self.path, f"{kind}.jsonl.gz"), "ab") as f:
+                f.write(b"".join(lines))
+        self._pending.clear()
+        self._pending_bytes = 0
+
+    def record_rest(self, http_method, path, body, response):
+        if not self.enabled:
+            return
+        try:
+            content = response.text
+        except Exception:
+            content = ""
+        self.write("rest", {
+            "method": http_method,
+            "path": to_relative_rest_path(path),
+            "body": body,
+            "status": response.status_code,
+            "headers": {h: response.headers[h] for h in RECORDED_HEADERS if h in response.headers},
+            "content": content
+        })
+
+    def record_call(self, endpoint, args, kwargs, context, result=None, error=None):
+        """Record a sempy call; returns the result (wrapped for recording when it is a TOMWrapper)"""
+        if not self.enabled:
+            return result
+
+        entry = {"call": endpoint, "args": list(args), "kwargs": kwargs, "context": context or {}}
+        if error is not None:
+            entry["result"] = {"type": "error", "error_type": type(error).__name__, "message": str(error)}
+            self.write("sempy", entry)
+            return result
+
+        if endpoint == "TOMWrapper":
+            dataset, workspace = kwargs.get("dataset", ""), kwargs.get("workspace", "")
+            self.write("tom", {"type": "model", "dataset": dataset, "workspace": workspace, "model": snapshot_tom_model(result)})
+            return RecordingTOMWrapper(result, self, dataset, workspace)
+
+        if hasattr(result, "to_json") and hasattr(result, "columns"):
+            entry["result"] = {"type": "dataframe", "data": result.to_json(orient="split", date_format="iso")}
+        elif endpoint == "ReportWrapper":
+            entry["result"] = {"type": "object"}
+        else:
+            entry["result"] = {"type": "json", "value": result}
+        self.write("sempy", entry)
+        return result
+
+FIXTURE_RECORDER = FixtureRecorder(
+    os.path.join(REST_RECORD_PATH, RUN_ID if SHARD_COUNT == 1 else f"{RUN_ID}-shard{SHARD_INDEX}") if REST_RECORD_PATH else ""
+)
+
+# ==============================================================
+# SHARED HELPERS: CHECKPOINT / RESUME
+# ==============================================================
+# Each finished unit of work (workspace, model or report) is saved together with
+# the rows it produced under {RUN_STATE_PATH}/runs/{RUN_ID}/checkpoints/{phase}/.
+# Running the notebook again with the same RUN_ID restores those rows and skips
+# the finished units, so recovery time is proportional to the work left. The
+# checkpoints are deleted when the run completes; those of runs that were never
+# resumed are deleted after CHECKPOINT_RETENTION_DAYS.
+
+import hashlib
+import shutil
+
+def to_json_value(value):
+    """json default= handler: unwrap numpy/pandas scalars, ISO-format dates, stringify the rest"""
+    if hasattr(value, "item"):
+        try:
+            return value.item()
+        except (TypeError, ValueError):
+            pass
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+class CheckpointUnit:
+    """Tracks the rows appended to a set of collections while one unit is processed"""
+
+    def __init__(self, store, phase, key, collections):
+        self.store = store
+        self.phase = phase
+        self.key = key
+        self.collections = collections
+        self._start = {name: len(rows) for name, rows in collections.items()}
+
+    def commit(self):
+        """Mark the unit finished and persist the rows it added"""
+        self.store.save(self.phase, self.key, {
+            name: rows[self._start[name]:] for name, rows in self.collections.items()
+        })
+
+class CheckpointStore:
+    """Per-unit completion checkpoints (with extracted rows) for one run"""
+
+    def __init__(self, run_id, enabled=True):
+        self.enabled = enabled
+        self.path = os.path.join(get_run_state_dir(run_id), "checkpoints")
+        self._warned = False
+
+    def _unit_path(self, phase, key):
+        digest = hashlib.sha1(str(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.path, phase, f"{digest}.json.gz")
+
+    def begin(self, phase, key, collections):
+        """
+        Start a unit of work.
+
+        Args:
+            phase: Pipeline phase (e.g. "Models")
+            key: Unit identifier, unique within the phase (e.g. "<workspace>|<model id>")
+            collections: Dictionary of name -> list the unit appends rows to
+
+        Returns:
+            CheckpointUnit; call commit() once the unit has finished
+        """
+        return CheckpointUnit(self, phase, key, collections)
+
+    def save(self, phase, key, rows):
+        """Persist a finished unit and its rows (dictionary of collection name -> rows)"""
+        if not self.enabled:
+            return
+        path = self._unit_path(phase, key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+                json.dump({"unit": key, "completed_at": datetime.now().isoformat(), "rows": rows,
+                           "expressions": EXPRESSIONS.referenced(rows)}, f, default=to_json_value)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            if not self._warned:
+                print(f"Warning: could not write checkpoint to {self.path} ({e}); this run cannot be resumed", flush=True)
+                self._warned = True
+
+    def restore(self, phase, collections):
+        """
+        Append the rows of every finished unit of a phase to collections.
+
+        Args:
+            phase: Pipeline phase
+            collections: Dictionary of name -> list (same names as used with begin/save)
+
+        Returns:
+            Set of finished unit keys (to skip)
+        """
+        completed = set()
+        folder = os.path.join(self.path, phase)
+        if not self.enabled or not os.path.isdir(folder):
+            return completed
+
+        for file_name in sorted(os.listdir(folder)):
+            if not file_name.endswith(".json.gz"):
+                continue
+            try:
+                with gzip.open(os.path.join(folder, file_name), "rt", encoding="utf-8") as f:
+                    checkpoint = json.load(f)
+            except Exception as e:
+                print(f"Warning: ignoring unreadable checkpoint {file_name}: {e}", flush=True)
+                continue
+            for name, rows in checkpoint.get("rows", {}).items():
+                if name in collections:
+                    collections[name].extend(rows)
+            EXPRESSIONS.add(checkpoint.get("expressions") or {})
+            completed.add(checkpoint["unit"])
+
+        if completed:
+            print(f"Resuming {phase}: {len(completed)} finished unit(s) restored from checkpoints", flush=True)
+        return completed
+
+    def clear(self):
+        """Delete this run's checkpoints (once it has completed and cannot be resumed)"""
+        if os.path.isdir(self.path):
+            shutil.rmtree(self.path, ignore_errors=True)
+
+    def prune(self, retention_days):
+        """
+        Delete the checkpoints of other runs not written to for retention_days.
+
+        Returns:
+            Number of checkpoint folders deleted
+        """
+        if not retention_days:
+            return 0
+        cutoff = time.time() - retention_days * 86400
+        pattern = os.path.join(RUN_STATE_PATH, "runs", "*")
+        deleted = 0
+        for folder in glob.glob(os.path.join(pattern, "checkpoints")) + glob.glob(os.path.join(pattern, "shards", "*", "checkpoints")):
+            if os.path.abspath(folder) == os.path.abspath(self.path):
+                continue
+            # Adding a checkpoint file touches its phase folder
+            folders = [folder] + [entry.path for entry in os.scandir(folder) if entry.is_dir()]
+            if max(os.path.getmtime(path) for path in folders) < cutoff:
+                shutil.rmtree(folder, ignore_errors=True)
+                deleted += 1
+        if deleted:
+            print(f"Deleted the checkpoints of {deleted} run(s) older than {retention_days} days", flush=True)
+        return deleted
+
+CHECKPOINTS = CheckpointStore(RUN_ID, enabled=CHECKPOINT_ENABLED)
+
+# ==============================================================
+# SHARED HELPERS: WORKSPACE SHARDING
+# ==============================================================
+# With SHARD_COUNT > 1, every shard computes the same workspace → shard
+# assignment: workspaces are placed heaviest first on the least-loaded shard,
+# weighted by their item count in the previous run's FabricItems table, with
+# ties broken by a hash of the workspace ID. The first shard to compute it saves
+# it under {RUN_STATE_PATH}/runs/{RUN_ID}/shards/ and the others (and resumed
+# shards) reuse it. Each shard writes <Table>_Shard<index> tables; the shard that
+# finishes last merges them into the regular tables (complete_shard in Cell 5).
+
+import glob
+from functools import reduce
+
+SHARD_TABLE_SUFFIX = "_Shard"
+SHARD_OUTPUT_TABLES = set()
+
+def get_shards_dir():
+    return os.path.join(RUN_STATE_PATH, "runs", RUN_ID, "shards")
+
+# Set once the shard tables are merged; later reads and writes use the regular tables
+SHARDS_MERGED = False
+
+def get_output_table_name(name):
+    """Table a cell writes `name` to: the shard's own table when SHARD_COUNT > 1"""
+    if SHARD_COUNT == 1 or SHARDS_MERGED:
+        return name
+    SHARD_OUTPUT_TABLES.add(name)
+    return f"{name}{SHARD_TABLE_SUFFIX}{SHARD_INDEX}"
+
+def get_workspace_hash(ws_id):
+    return hashlib.sha1(str(ws_id).encode("utf-8")).hexdigest()
+
+def assign_shards(workspace_ids, shard_count, weights=None):
+    """
+    Partition workspaces into shards of similar total weight.
+
+    The result depends only on the inputs (not on their order), so separate
+    notebook runs agree on it.
+
+    Args:
+        workspace_ids: Workspace IDs to partition
+        shard_count: Number of shards
+        weights: Optional dictionary of workspace ID -> weight (default 1)
+
+    Returns:
+        Dictionary of workspace ID -> shard index
+    """
+    weights = weights or {}
+    loads = [0] * shard_count
+    assignment = {}
+    for ws_id in sorted(set(workspace_ids), key=lambda w: (-weights.get(w, 1), get_workspace_hash(w))):
+        shard = min(range(shard_count), key=lambda i: (loads[i], i))
+        assignment[ws_id] = shard
+        loads[shard] += weights.get(ws_id, 1)
+    return assignment
+
+def load_workspace_item_counts():
+    """Item count (+1 for the workspace itself) per workspace ID, from the previous run's FabricItems table"""
+    try:
+        catalog = spark.sql("SELECT current_catalog()").first()[0]
+        rows = spark.sql(f"""
+            SELECT WorkspaceId, COUNT(*) AS ItemCount
+            FROM {catalog}.{LAKEHOUSE_SCHEMA}.FabricItems
+            GROUP BY WorkspaceId
+        """).collect()
+        return {row[0]: int(row[1]) + 1 for row in rows}
+    except Exception:
+        return {}
+
+_shard_assignment = None
+
+def select_shard_workspaces(workspaces_df):
+    """
+    Keep the workspaces assigned to this shard (all of them when SHARD_COUNT is 1).
+
+    Args:
+        workspaces_df: DataFrame from fabric.list_workspaces() (with an Id column)
+
+    Returns:
+        Filtered DataFrame
+    """
+    global _shard_assignment
+    if SHARD_COUNT == 1:
+        return workspaces_df
+
+    if _shard_assignment is None:
+        assignment_path = os.path.join(get_shards_dir(), "assignment.json")
+        try:
+            with open(assignment_path) as f:
+                _shard_assignment = json.load(f)["workspaces"]
+        except (OSError, ValueError, KeyError):
+            weights = load_workspace_item_counts()
+            _shard_assignment = assign_shards(workspaces_df["Id"].tolist(), SHARD_COUNT, weights)
+            try:
+                write_json_atomic(assignment_path, {"shard_count": SHARD_COUNT, "weighted": bool(weights),
+                                                    "workspaces": _shard_assignment})
+            except OSError as e:
+                print(f"Warning: could not save the shard assignment: {e}", flush=True)
+        mine = sum(1 for shard in _shard_assignment.values() if shard == SHARD_INDEX)
+        print(f"Shard {SHARD_INDEX}: {mine} of {len(_shard_assignment)} workspaces assigned", flush=True)
+
+    # Workspaces created after the assignment was saved are placed by hash
+    shards = workspaces_df["Id"].map(lambda ws_id: _shard_assignment.get(ws_id, int(get_workspace_hash(ws_id), 16) % SHARD_COUNT))
+    return workspaces_df[shards == SHARD_INDEX]
+
+def merge_shard_tables(tables, shard_count=None, drop=True):
+    """
+    Union the per-shard tables of a sharded run into the regular tables.
+
+    Args:
+        tables: Table names (without shard suffix) to merge
+        shard_count: Number of shards (default SHARD_COUNT)
+        drop: Drop the shard tables once merged
+    """
+    shard_count = shard_count or SHARD_COUNT
+    catalog = spark.sql("SELECT current_catalog()").first()[0]
+    deferred_units = load_run_deferred_units()
+    for name in sorted(tables):
+        shard_names = [f"{catalog}.{LAKEHOUSE_SCHEMA}.{name}{SHARD_TABLE_SUFFIX}{i}" for i in range(shard_count)]
+        parts = []
+        for shard_name in shard_names:
+            try:
+                parts.append(spark.table(shard_name))
+            except Exception:
+                pass
+        if not parts:
+            continue
+        full_name = f"{catalog}.{LAKEHOUSE_SCHEMA}.{name}"
+        merged = reduce(lambda a, b: a.unionByName(b, allowMissingColumns=True), parts)
+        if REFRESH_HISTORY_MODE == "incremental" and name in REFRESH_HISTORY_TABLES:
+            # Shards wrote only their new refreshes
+            upsert_refresh_history(merged, name)
+        else:
+            overwrite_output_table(merged, full_name, OUTPUT_TABLE_PHASES.get(name), deferred_units)
+        print(f"✓ Merged {len(parts)} shard table(s) → {full_name}", flush=True)
+        if drop:
+            for shard_name in shard_names:
+                spark.sql(f"DROP TABLE IF EXISTS {shard_name}")
+
+def complete_shard():
+    """
+    Mark this shard finished. The shard that completes the set merges the shard
+    tables; the others return immediately.
+
+    Returns:
+        True when this shard merged the tables
+    """
+    if SHARD_COUNT == 1:
+        return False
+
+    write_json_atomic(os.path.join(get_run_state_dir(), "completed.json"),
+                      {"shard": SHARD_INDEX, "completed_at": datetime.now().isoformat(),
+                       "tables": sorted(SHARD_OUTPUT_TABLES)})
+
+    markers = [os.path.join(get_shards_dir(), str(i), "completed.json") for i in range(SHARD_COUNT)]
+    pending = [i for i, marker in enumerate(markers) if not os.path.exists(marker)]
+    if pending:
+        print(f"Shard {SHARD_INDEX} finished; waiting for shard(s) {pending} before merging", flush=True)
+        return False
+
+    # Only one of the shards finishing together takes the merge
+    try:
+        os.close(os.open(os.path.join(get_shards_dir(), "merge.lock"), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        return False
+
+    tables = set()
+    for marker in markers:
+        with open(marker) as f:
+            tables.update(json.load(f).get("tables", []))
+    print(f"All {SHARD_COUNT} shards finished; merging {len(tables)} table(s)", flush=True)
+    merge_shard_tables(tables)
+    if "GovernanceSummary" in tables:
+        # Each shard wrote its own Overall row; rebuild one for the merged workspaces
+        update_governance_summary({}, table="GovernanceSummary")
+
+    # Reports may use models of workspaces in other shards: analyze the merged tables
+    global SHARDS_MERGED
+    SHARDS_MERGED = True
+    if EXPRESSIONS_TABLE in tables:
+        # Shards extracting copies of the same text each stored it
+        write_expressions()
+    if WRITE_MODE == "snapshot":
+        catalog = spark.sql("SELECT current_catalog()").first()[0]
+        for name in sorted(tables):
+            append_snapshot(spark.table(f"{catalog}.{LAKEHOUSE_SCHEMA}.{name}"), name)
+    run_analysis_stages()
+    return True
+
+# ==============================================================
+# SHARED HELPERS: SNAPSHOTS
+# ==============================================================
+# With WRITE_MODE = "snapshot", every output table is also written to
+# <Table>_Snapshots, partitioned by the table's date column (ReportDate or
+# ModelAsOfDate; tables without one get a SnapshotDate column). Rows are
+# stamped with the run's SNAPSHOT_DATE and each write replaces only that
+# partition, so re-runs on the same day are idempotent, and trend queries
+# filtering on the date column read just the partitions they need. Partitions older than SNAPSHOT_RETENTION_DAYS are
+# deleted after each write. Sharded runs write history once, after the merge.
+
+SNAPSHOT_TABLE_SUFFIX = "_Snapshots"
+SNAPSHOT_DATE_COLUMNS = ["ReportDate", "ModelAsOfDate"]
+# Date of this run's snapshots (fixed when Cell 0 runs, also for resumed runs)
+SNAPSHOT_DATE = datetime.now().strftime("%Y-%m-%d")
+SNAPSHOT_EXCLUDED_TABLES = {"RunMetrics", "DeferredUnits", "ImpactIndex", "ObjectHashes"}
+
+def append_snapshot(df, name):
+    """
+    Write a table's rows into its dated <name>_Snapshots table (snapshot mode only).
+
+    Args:
+        df: Spark DataFrame just written to the regular table
+        name: Table name (without shard suffix)
+    """
+    if WRITE_MODE != "snapshot" or name in SNAPSHOT_EXCLUDED_TABLES or (SHARD_COUNT > 1 and not SHARDS_MERGED):
+        return
+    if REFRESH_HISTORY_MODE == "incremental" and name in REFRESH_HISTORY_TABLES:
+        # Already a history: rows are only added or updated
+        return
+
+    # Every row is stamped with the run's date: rows restored from checkpoints of an
+    # interrupted run keep their original date, which must not replace that day's snapshot
+    date_column = next((c for c in SNAPSHOT_DATE_COLUMNS if c in df.columns), "SnapshotDate")
+    stamp = f"'{SNAPSHOT_DATE}' AS {date_column}"
+    df = df.selectExpr(*(stamp if c == date_column else f"`{c}`" for c in df.columns),
+                       *([] if date_column in df.columns else [stamp]))
+
+    catalog = spark.sql("SELECT current_catalog()").first()[0]
+    history_name = f"{catalog}.{LAKEHOUSE_SCHEMA}.{name}{SNAPSHOT_TABLE_SUFFIX}"
+    try:
+        spark.table(history_name)
+        history_exists = True
+    except Exception:
+        history_exists = False
+
+    writer = df.write.format("delta").partitionBy(date_column).mode("overwrite")
+    if history_exists:
+        writer = writer.option("replaceWhere", f"{date_column} IN ('{SNAPSHOT_DATE}')").option("mergeSchema", "true")
+    writer.saveAsTable(history_name)
+
+    if SNAPSHOT_RETENTION_DAYS:
+        cutoff = (datetime.now() - timedelta(days=SNAPSHOT_RETENTION_DAYS)).strftime("%Y-%m-%d")
+        spark.sql(f"DELETE FROM {history_name} WHERE {date_column} < '{cutoff}'")
+    print(f"✓ Snapshot {SNAPSHOT_DATE} → {history_name}", flush=True)
+
+# ==============================================================
+# SHARED HELPERS: INCREMENTAL REFRESH HISTORY
+# ==============================================================
+# With REFRESH_HISTORY_MODE = "incremental", the refresh history tables are the
+# watermark store: load_refresh_watermarks() (start of Cell 1) reads, per
+# dataset/dataflow, the start time of its newest finished refresh and of its
+# oldest refresh still in progress. The REST history is returned newest first,
+# so Cell 1 keeps entries until the first one at or before the watermark and
+# skips the rest (see fetch_refresh_history). upsert_refresh_history() then
+# MERGEs the new entries on (item, refresh keys), updating refreshes that were
+# in progress last time. Sharded runs upsert once, when merging.
+
+# Table -> item column, refresh key columns, start time and status columns
+REFRESH_HISTORY_TABLES = {
+    "DatasetRefreshHistory": {"item": "DatasetId", "keys": ["DatasetRefreshId", "DatasetRefreshRequestId"],
+                              "start": "DatasetRefreshStartTime", "status": "DatasetRefreshStatus"},
+    "DataflowRefreshHistory": {"item": "DataflowId", "keys": ["DataflowRefreshId", "DataflowRefreshRequestId"],
+                               "start": "DataflowRefreshStartTime", "status": "DataflowRefreshStatus"}
+}
+# Statuses of refreshes that have not finished (fetched again until they have)
+PENDING_REFRESH_STATUSES = {"Unknown", "NotStarted", "InProgress", "Running"}
+
+# Item ID -> (start of newest finished refresh, start of oldest pending refresh or None)
+REFRESH_WATERMARKS = {}
+
+def upserts_refresh_history(name):
+    """True when a write of `name` goes through upsert_refresh_history()"""
+    return REFRESH_HISTORY_MODE == "incremental" and name in REFRESH_HISTORY_TABLES and (SHARD_COUNT == 1 or SHARDS_MERGED)
+
+def load_refresh_watermarks():
+    """
+    Read the per-item watermarks from the refresh history tables of the previous run.
+
+    Returns:
+        Dictionary of item ID -> (newest finished start time, oldest pending start time or None)
+    """
+    if REFRESH_HISTORY_MODE != "incremental":
+        return {}
+
+    catalog = spark.sql("SELECT current_catalog()").first()[0]
+    in_list = ", ".join(f"'{status}'" for status in sorted(PENDING_REFRESH_STATUSES))
+    watermarks = {}
+    for name, spec in REFRESH_HISTORY_TABLES.items():
+        try:
+            history = spark.table(f"{catalog}.{LAKEHOUSE_SCHEMA}.{name}")
+        except Exception:
+            continue
+        # Aggregated by Spark: only one row per item reaches the driver
+        latest = {row[0]: row[1] or "" for row in history.filter(f"{spec['status']} NOT IN ({in_list})")
+                  .groupBy(spec["item"]).agg({spec["start"]: "max"}).collect()}
+        oldest_pending = {row[0]: row[1] for row in history.filter(f"{spec['status']} IN ({in_list})")
+                          .groupBy(spec["item"]).agg({spec["start"]: "min"}).collect()}
+        for item_id in latest.keys() | oldest_pending.keys():
+            watermarks[item_id] = (latest.get(item_id, ""), oldest_pending.get(item_id))
+    return watermarks
+
+def is_new_refresh(start_time, watermark):
+    """True for a refresh newer than the item's watermark (or not finished when last seen)"""
+    latest, oldest_pending = watermark
+    return start_time > latest or (oldest_pending is not None and start_time >= oldest_pending)
+
+def upsert_refresh_history(df, name):
+    """
+    MERGE newly fetched refreshes into a refresh history table on (item, refresh
+    keys): refreshes seen before (pending last time) are updated, new ones inserted.
+
+    Args:
+        df: Spark DataFrame of new (or updated) refresh rows
+        name: DatasetRefreshHistory or DataflowRefreshHistory
+    """
+    spec = REFRESH_HISTORY_TABLES[name]
+    full_name = f"{spark.sql('SELECT current_catalog()').first()[0]}.{LAKEHOUSE_SCHEMA}.{name}"
+    try:
+        existing = spark.table(full_name)
+    except Exception:
+        existing = None
+    if existing is None:
+        df.write.mode("overwrite").option("overwriteSchema", "true").format("delta").saveAsTable(full_name)
+        print(f"✓ Created {full_name} with {df.count()} refreshes", flush=True)
+        return
+
+    key_columns = [spec["item"], *spec["keys"]]
+    updates = df.dropDuplicates(key_columns)
+    count = updates.count()
+    if not count:
+        print(f"✓ No new refreshes for {name}", flush=True)
+        return
+
+    # Null-safe keys: a refresh has a refresh ID or a request ID, not always both
+    view = f"{name}_Updates"
+    updates.createOrReplaceTempView(view)
+    condition = " AND ".join(f"t.{column} <=> s.{column}" for column in key_columns)
+    spark.sql(f"MERGE INTO {full_name} t USING {view} s ON {condition} "
+              f"WHEN MATCHED THEN UPDATE SET * WHEN NOT MATCHED THEN INSERT *")
+    print(f"✓ Merged {count} new or updated refreshes → {full_name}", flush=True)
+
+# ==============================================================
+# SHARED HELPERS: DELTA MAINTENANCE
+# ==============================================================
+# Overwrites and appends leave the output tables as many small files plus
+# unreferenced old versions. run_delta_maintenance() (Cell 5, before the SQL
+# endpoint refresh) compacts the tables in MAINTENANCE_TABLES with OPTIMIZE,
+# Z-ordering them by the columns the report and SQL endpoint queries filter on,
+# then VACUUMs files older than VACUUM_RETENTION_HOURS. In "auto" mode a table
+# is maintained when it has MAINTENANCE_MIN_FILES files or more, or when its
+# last maintenance (kept in {RUN_STATE_PATH}/maintenance.json) is older than
+# MAINTENANCE_INTERVAL_DAYS. Before/after file counts and sizes are appended to
+# the TableMaintenance table.
+
+MAINTENANCE_STATE_FILE = "maintenance.json"
+
+# Table -> Z-order columns (empty = compaction only)
+MAINTENANCE_TABLES = {
+    "VisualObjects": ["ModelID", "TableName"],
+    "VisualFilters": ["ModelID", "TableName"],
+    "PageFilters": ["ModelID", "TableName"],
+    "ReportFilters": ["ModelID", "TableName"],
+    "Visuals": ["ReportID"],
+    "ReportLevelMeasures": ["ModelID"],
+    "ModelDetail": ["ModelID", "Table"],
+    "ModelDependencies": ["ModelID"],
+    "DatasetRefreshHistory": ["DatasetId"],
+    "DataflowRefreshHistory": ["DataflowId"],
+    "ImpactIndex": ["IndexKey"],
+    "UnusedObjects": ["ModelID"],
+    "BrokenVisuals": ["ModelID"],
+    "Changes": ["SourceTable"],
+    "ObjectHashes": ["SourceTable"],
+    "RunMetrics": [],
+    "TableMaintenance": []
+}
+TABLE_MAINTENANCE_TEMPLATE = {
+    "TableName": "", "Status": "", "Reason": "", "ZOrderBy": "", "FilesBefore": 0, "FilesAfter": 0,
+    "SizeBytesBefore": 0, "SizeBytesAfter": 0, "Seconds": 0.0, "RunId": "", "MaintainedAt": ""
+}
+
+def get_table_file_stats(full_name):
+    """(number of files, size in bytes) of a Delta table; None if it does not exist"""
+    try:
+        detail = spark.sql(f"DESCRIBE DETAIL {full_name}").select("numFiles", "sizeInBytes").first()
+    except Exception:
+        return None
+    return (int(detail[0] or 0), int(detail[1] or 0)) if detail else None
+
+def run_delta_maintenance():
+    """
+    OPTIMIZE/VACUUM the output tables that are due (see DELTA_MAINTENANCE).
+
+    Returns:
+        Number of tables maintained
+    """
+    import pandas as pd
+
+    if DELTA_MAINTENANCE == "off" or (SHARD_COUNT > 1 and not SHARDS_MERGED):
+        return 0
+
+    state_path = os.path.join(RUN_STATE_PATH, MAINTENANCE_STATE_FILE)
+    try:
+        with open(state_path) as f:
+            last_maintained = json.load(f)
+    except (OSError, ValueError):
+        last_maintained = {}
+
+    catalog = spark.sql("SELECT current_catalog()").first()[0]
+    tables = dict(MAINTENANCE_TABLES)
+    if WRITE_MODE == "snapshot":
+        tables.update({f"{name}{SNAPSHOT_TABLE_SUFFIX}": columns for name, columns in MAINTENANCE_TABLES.items()
+                       if name not in SNAPSHOT_EXCLUDED_TABLES})
+
+    rows = []
+    skipped = 0
+    for name, zorder_columns in tables.items():
+        remaining = RUN_DEADLINE.remaining_minutes()
+        if remaining is not None and remaining <= 0:
+            print("⏱ Time budget used up; remaining tables are maintained next run", flush=True)
+            break
+
+        full_name = f"{catalog}.{LAKEHOUSE_SCHEMA}.{name}"
+        before = get_table_file_stats(full_name)
+        if before is None:
+            continue
+
+        last = last_maintained.get(name)
+        overdue = last is None or datetime.now() - datetime.fromisoformat(last) > timedelta(days=MAINTENANCE_INTERVAL_DAYS)
+        if DELTA_MAINTENANCE == "always":
+            reason = "always"
+        elif before[0] >= MAINTENANCE_MIN_FILES:
+            reason = f"{before[0]} files"
+        elif overdue:
+            reason = "interval"
+        else:
+            skipped += 1
+            continue
+
+        t0 = time.time()
+        status = "Success"
+        try:
+            zorder = f" ZORDER BY ({', '.join(zorder_columns)})" if zorder_columns else ""
+            spark.sql(f"OPTIMIZE {full_name}{zorder}")
+            spark.sql(f"VACUUM {full_name} RETAIN {VACUUM_RETENTION_HOURS} HOURS")
+            last_maintained[name] = datetime.now().isoformat()
+        except Exception as e:
+            status = f"Failed: {str(e)[:200]}"
+        after = get_table_file_stats(full_name) or before
+
+        rows.append({
+            "TableName": name, "Status": status, "Reason": reason, "ZOrderBy": ", ".join(zorder_columns),
+            "FilesBefore": before[0], "FilesAfter": after[0], "SizeBytesBefore": before[1], "SizeBytesAfter": after[1],
+            "Seconds": round(time.time() - t0, 2), "RunId": RUN_ID, "MaintainedAt": datetime.now().isoformat()
+        })
+        print(f"  {name}: {before[0]} → {after[0]} files ({reason}, {time.time() - t0:.1f} sec){'' if status == 'Success' else ' ' + status}", flush=True)
+
+    if rows:
+        df = spark.createDataFrame(pd.DataFrame(rows, columns=list(TABLE_MAINTENANCE_TEMPLATE)))
+        df.write.mode("append").option("mergeSchema", "true").format("delta").saveAsTable(f"{catalog}.{LAKEHOUSE_SCHEMA}.TableMaintenance")
+        write_json_atomic(state_path, last_maintained)
+    print(f"✓ Delta maintenance: {len(rows)} table(s) optimized, {skipped} not due", flush=True)
+    return len(rows)
+
+# ==============================================================
+# SHARED HELPERS: GOVERNANCE SUMMARY
+# ==============================================================
+# GovernanceSummary holds the headline counts shown by the Fabric Workload UI:
+# one "Workspace" row per workspace plus an "Overall" row (the sum). Cells
+# update the metrics they own right after writing the underlying tables, so
+# WorkloadIntegration.get_governance_results() reads a handful of rows
+# instead of scanning Reports/Datasets/VisualObjects.
+
+GOVERNANCE_METRICS = ["TotalReports", "TotalModels", "TotalDataflows", "UnusedObjects", "BrokenVisuals"]
+GOVERNANCE_SUMMARY_TEMPLATE = {"Scope": "", "WorkspaceName": "", **dict.fromkeys(GOVERNANCE_METRICS, 0), "RunId": "", "UpdatedAt": ""}
+
+def update_governance_summary(metrics, replace=False, table=None):
+    """
+    Set metric counts in the GovernanceSummary table and recompute the Overall row.
+
+    Args:
+        metrics: Dictionary of metric (see GOVERNANCE_METRICS) -> {workspace name: count}
+        replace: Drop workspace rows not present in metrics (the run's workspace set)
+        table: Table name (default: this run's GovernanceSummary output table)
+    """
+    import pandas as pd
+
+    catalog = spark.sql("SELECT current_catalog()").first()[0]
+    full_name = f"{catalog}.{LAKEHOUSE_SCHEMA}.{table or get_output_table_name('GovernanceSummary')}"
+    try:
+        existing = spark.table(full_name).toPandas().to_dict("records")
+    except Exception:
+        existing = []
+
+    rows = {row["WorkspaceName"]: row for row in existing if row.get("Scope") == "Workspace"}
+    workspaces = set().union(*metrics.values()) if metrics else set()
+    if replace:
+        rows = {name: row for name, row in rows.items() if name in workspaces}
+
+    updated_at = datetime.now().isoformat()
+    for name in workspaces:
+        row = rows.setdefault(name, {**GOVERNANCE_SUMMARY_TEMPLATE, "Scope": "Workspace", "WorkspaceName": name})
+        for metric, counts in metrics.items():
+            row[metric] = int(counts.get(name, 0))
+        row["RunId"] = RUN_ID
+        row["UpdatedAt"] = updated_at
+
+    overall = {**GOVERNANCE_SUMMARY_TEMPLATE, "Scope": "Overall", "RunId": RUN_ID, "UpdatedAt": updated_at,
+               **{metric: int(sum(row.get(metric) or 0 for row in rows.values())) for metric in GOVERNANCE_METRICS}}
+    summary = [overall] + [{**GOVERNANCE_SUMMARY_TEMPLATE, **rows[name]} for name in sorted(rows)]
+
+    df = spark.createDataFrame(pd.DataFrame(summary, columns=list(GOVERNANCE_SUMMARY_TEMPLATE)))
+    df.write.mode("overwrite").option("overwriteSchema", "true").format("delta").saveAsTable(full_name)
+    append_snapshot(df, "GovernanceSummary")
+    print(f"✓ Updated {', '.join(metrics) or 'totals'} for {len(workspaces)} workspace(s) → {full_name}", flush=True)
+
+# ==============================================================
+# SHARED HELPERS: IMPACT INDEX
+# ==============================================================
+# ImpactIndex is an inverted index from model objects (columns, measures,
+# tables) to everything that uses them: visuals, visual/page/report filters,
+# model measures/calculated columns and report-level measures. Uses through
+# measures are followed transitively ('Sales'[Amount] → [Total Sales] → visual)
+# and tagged with the measure they go through ("Via"). One row per model object
+# with counts and JSON lists of compact entries (arrays in IMPACT_INDEX_FIELDS
+# order), so WorkloadIntegration.get_impact_analysis() is a point lookup on
+# IndexKey ("<type>|<object name>", lower case).
+#
+# Only the dependency graph is read to the driver: the closure of each object
+# (everything depending on it, transitively) is computed once per model and a
+# table's closure is the union of its objects'. The visual and filter tables
+# stay in Spark and are joined to the closures.
+
+from collections import defaultdict
+
+DAX_REFERENCE_PATTERN = re.compile(r"(?:'((?:[^']|'')+)'|([A-Za-z_][\w.]*))?\[([^\]]+)\]")
+DAX_OBJECT_NAME_PATTERN = re.compile(r"^'((?:[^']|'')*)'(?:\[(.*)\])?$")
+IMPACT_INDEX_TEMPLATE = {
+    "IndexKey": "", "ObjectType": "", "TableName": "", "ObjectName": "", "ModelID": "", "ModelName": "",
+    "WorkspaceName": "", "ImpactedVisuals": "", "ImpactedFilters": "", "ImpactedMeasures": "", "ImpactedReports": "",
+    "VisualCount": 0, "FilterCount": 0, "MeasureCount": 0, "ReportCount": 0, "RunId": "", "UpdatedAt": ""
+}
+IMPACT_INDEX_FIELDS = {
+    "ImpactedVisuals": ["ReportID", "PageName", "VisualId", "VisualName", "Via"],
+    "ImpactedFilters": ["Level", "ReportID", "PageName", "VisualId", "Via"],
+    "ImpactedMeasures": ["Type", "DependentTable", "DependentName", "ReportID", "Via"],
+    "ImpactedReports": ["ReportID", "ReportName", "WorkspaceName"]
+}
+IMPACT_USE_KEY = ["ModelID", "ObjectType", "TableName", "ObjectName"]
+
+def output_table_frame(name):
+    """Spark DataFrame of a table written by this run (the shard's own table when sharded); None if it does not exist"""
+    catalog = spark.sql("SELECT current_catalog()").first()[0]
+    try:
+        return spark.table(f"{catalog}.{LAKEHOUSE_SCHEMA}.{get_output_table_name(name)}")
+    except Exception:
+        return None
+
+def read_output_frame(name, columns=None):
+    """
+    pandas DataFrame of a table written by this run; None if it does not exist.
+
+    Args:
+        name: Output table name
+        columns: Columns to pull to the driver (default: all)
+    """
+    df = output_table_frame(name)
+    if df is None:
+        return None
+    if columns:
+        hashed = EXPRESSION_TEXT_COLUMNS.get(name) if "ExpressionHash" in df.columns else None
+        df = df.select(*["ExpressionHash" if column == hashed else column for column in columns])
+    pdf = df.toPandas()
+    return resolve_expression_column(pdf.astype(object).where(pdf.notna(), ""), name)
+
+def read_output_table(name):
+    """Rows of a table written by this run (the shard's own table when sharded); [] if it does not exist"""
+    pdf = read_output_frame(name)
+    return [] if pdf is None else pdf.to_dict("records")
+
+def parse_dax_object_name(value, object_type):
+    """Split "'Table'[Object]" / "'Table'" (ModelDependencies.DependsOn) into an impact key"""
+    match = DAX_OBJECT_NAME_PATTERN.match(value or "")
+    if not match:
+        return (object_type, "", value)
+    table = match.group(1).replace("''", "'")
+    if match.group(2) is None:
+        return ("Table", table, table)
+    return ("Column" if object_type == "CalculatedColumn" else object_type, table, match.group(2))
+
+def parse_dax_references(expression, model_measures):
+    """
+    Model objects referenced by a DAX expression.
+
+    Args:
+        expression: DAX expression
+        model_measures: Dictionary of measure name -> home table for the model
+
+    Returns:
+        Set of (type, table, name) impact keys
+    """
+    references = set()
+    for quoted_table, plain_table, name in DAX_REFERENCE_PATTERN.findall(expression or ""):
+        table = quoted_table.replace("''", "'") or plain_table
+        if table:
+            references.add(("Measure" if model_measures.get(name) == table else "Column", table, name))
+        elif name in model_measures:
+            references.add(("Measure", model_measures[name], name))
+    return references
+
+def build_impact_index():
+    """
+    Rebuild the ImpactIndex table from this run's report and model tables.
+
+    Returns:
+        Number of indexed objects
+    """
+    import pandas as pd
+    from pyspark.sql import functions as F
+
+    def frame(rows, columns):
+        """Spark DataFrame of string rows (an empty one keeps its columns)"""
+        df = spark.createDataFrame(pd.DataFrame(rows or [dict.fromkeys(columns, "")], columns=columns))
+        return df if rows else df.filter("1=0")
+
+    def compact(columns):
+        return F.array(*[F.coalesce(F.col(column).cast("string"), F.lit("")) for column in columns])
+
+    models = {}
+    measures = defaultdict(dict)
+    owners = {}
+    model_detail = read_output_frame("ModelDetail", ["ModelID", "ModelName", "WorkspaceName", "Type", "Name", "Table"])
+    for model_id, model_name, workspace_name, object_type, name, table in ([] if model_detail is None else model_detail.itertuples(index=False)):
+        models.setdefault(model_id, (model_name, workspace_name))
+        if object_type == "Measure":
+            measures[model_id].setdefault(name, table)
+        if object_type in ("Measure", "CalculatedColumn", "CalculationItem"):
+            owners[(model_id, object_type, name)] = table
+
+    # Reverse dependency graph: (model, referenced key) -> {dependent key: measure use row}
+    dependents = defaultdict(dict)
+    for row in read_output_table("ModelDependencies"):
+        model_id = row["ModelID"]
+        table = owners.get((model_id, row["ObjectType"], row["ObjectName"]), "")
+        dependent_type = "Column" if row["ObjectType"] == "CalculatedColumn" else row["ObjectType"]
+        referenced = parse_dax_object_name(row["DependsOn"], row["DependsOnType"])
+        dependents[(model_id, referenced)][(dependent_type, table, row["ObjectName"])] = {
+            "Type": row["ObjectType"], "DependentTable": table, "DependentName": row["ObjectName"],
+            "ReportID": "", "ReportName": "", "WorkspaceName": row["WorkspaceName"]
+        }
+    for row in read_output_table("ReportLevelMeasures"):
+        model_id = row["ModelID"]
+        for referenced in parse_dax_references(row["Expression"], measures[model_id]):
+            dependents[(model_id, referenced)][("Measure", row["TableName"], row["ObjectName"])] = {
+                "Type": "ReportLevelMeasure", "DependentTable": row["TableName"], "DependentName": row["ObjectName"],
+                "ReportID": row["ReportID"], "ReportName": row["ReportName"], "WorkspaceName": row["WorkspaceName"]
+            }
+
+    # Direct uses in reports stay in Spark: (model, key) + where it is used
+    visual_columns = ["ReportID", "ReportName", "WorkspaceName", "PageName", "VisualId", "VisualName"]
+    visual_uses = output_table_frame("VisualObjects")
+    if visual_uses is not None:
+        visual_uses = visual_uses.select(*IMPACT_USE_KEY, *visual_columns)
+    filter_uses = None
+    for table, level in (("VisualFilters", "Visual"), ("PageFilters", "Page"), ("ReportFilters", "Report")):
+        df = output_table_frame(table)
+        if df is None:
+            continue
+        df = df.select(*IMPACT_USE_KEY, F.lit(level).alias("Level"), "ReportID", "ReportName", "WorkspaceName",
+                       *[column if column in df.columns else F.lit("").alias(column) for column in ("PageName", "VisualId")])
+        filter_uses = df if filter_uses is None else filter_uses.unionByName(df)
+    measure_uses = frame([{"ModelID": model_id, "ObjectType": key[0], "TableName": key[1], "ObjectName": key[2], **use}
+                          for (model_id, key), uses in dependents.items() for use in uses.values()],
+                         IMPACT_USE_KEY + ["Type", "DependentTable", "DependentName", "ReportID", "ReportName", "WorkspaceName"])
+
+    # Every object used anywhere, plus the tables they belong to
+    objects = defaultdict(set)
+    for model_id, key in dependents:
+        objects[model_id].add(key)
+    for df in (visual_uses, filter_uses):
+        if df is not None:
+            for model_id, object_type, table_name, object_name in df.select(*IMPACT_USE_KEY).distinct().collect():
+                objects[model_id].add((object_type, table_name, object_name))
+
+    def closure(model_id, key):
+        """key and everything depending on it, transitively"""
+        reached = {key}
+        queue = [key]
+        while queue:
+            for dependent in dependents.get((model_id, queue.pop()), {}):
+                if dependent not in reached:
+                    reached.add(dependent)
+                    queue.append(dependent)
+        return reached
+
+    # Closure rows: (index object, object it reaches, measure it goes through); "" for the object itself
+    closure_columns = ["ModelID", "IndexType", "IndexTable", "IndexName"] + IMPACT_USE_KEY[1:] + ["Via"]
+    closure_rows = []
+    updated_at = datetime.now().isoformat()
+    index_rows = []
+    for model_id, keys in objects.items():
+        model_name, workspace_name = models.get(model_id, ("", ""))
+        reached_from = {key: closure(model_id, key) for key in keys}
+        table_members = defaultdict(set)
+        for key in keys:
+            if key[1]:
+                table_members[key[1]].add(key)
+        for table_name, members in table_members.items():
+            # A table is impacted through any of its objects
+            reached_from[("Table", table_name, table_name)] = set().union(*(reached_from[key] for key in members))
+            members.add(("Table", table_name, table_name))
+        for key, reached in reached_from.items():
+            starts = table_members[key[1]] if key[0] == "Table" else {key}
+            closure_rows.extend((model_id, *key, *used, "" if used in starts else used[2]) for used in reached)
+            index_rows.append({
+                "IndexKey": f"{key[0].lower()}|{key[2].lower()}", "IndexType": key[0], "IndexTable": key[1], "IndexName": key[2],
+                "ModelID": model_id, "ModelName": model_name, "WorkspaceName": workspace_name
+            })
+
+    full_name = f"{spark.sql('SELECT current_catalog()').first()[0]}.{LAKEHOUSE_SCHEMA}.{get_output_table_name('ImpactIndex')}"
+    if not index_rows:
+        df = spark.createDataFrame(pd.DataFrame([IMPACT_INDEX_TEMPLATE], columns=list(IMPACT_INDEX_TEMPLATE))).filter("1=0")
+        df.write.mode("overwrite").option("overwriteSchema", "true").format("delta").saveAsTable(full_name)
+        print(f"✓ Indexed 0 model objects → {full_name}", flush=True)
+        return 0
+
+    index_key = ["ModelID", "IndexType", "IndexTable", "IndexName"]
+    closure_df = frame([dict(zip(closure_columns, row)) for row in closure_rows], closure_columns)
+    report_columns = IMPACT_INDEX_FIELDS["ImpactedReports"]
+    lists, reports = {}, None
+    for column, uses in (("ImpactedVisuals", visual_uses), ("ImpactedFilters", filter_uses), ("ImpactedMeasures", measure_uses)):
+        if uses is None:
+            continue
+        impacts = closure_df.join(uses, IMPACT_USE_KEY)
+        lists[column] = impacts.groupBy(*index_key).agg(F.collect_set(compact(IMPACT_INDEX_FIELDS[column])).alias(column))
+        used_in = impacts.filter(F.col("ReportID") != "").select(*index_key, *report_columns)
+        reports = used_in if reports is None else reports.unionByName(used_in)
+    if reports is not None:
+        lists["ImpactedReports"] = reports.groupBy(*index_key).agg(F.collect_set(compact(report_columns)).alias("ImpactedReports"))
+
+    df = frame(index_rows, ["IndexKey"] + index_key + ["ModelName", "WorkspaceName"])
+    for impacts in lists.values():
+        df = df.join(impacts, index_key, "left")
+    counts = {"ImpactedVisuals": "VisualCount", "ImpactedFilters": "FilterCount", "ImpactedMeasures": "MeasureCount", "ImpactedReports": "ReportCount"}
+    df = df.select(
+        "IndexKey",
+        F.col("IndexType").alias("ObjectType"),
+        F.col("IndexTable").alias("TableName"),
+        F.col("IndexName").alias("ObjectName"),
+        "ModelID", "ModelName", "WorkspaceName",
+        *[F.coalesce(F.to_json(F.col(column)), F.lit("[]")).alias(column) if column in lists else F.lit("[]").alias(column) for column in counts],
+        *[F.when(F.col(column).isNull(), F.lit(0)).otherwise(F.size(F.col(column))).alias(count) if column in lists else F.lit(0).alias(count)
+          for column, count in counts.items()],
+        F.lit(RUN_ID).alias("RunId"),
+        F.lit(updated_at).alias("UpdatedAt")
+    )
+    df.write.mode("overwrite").option("overwriteSchema", "true").format("delta").saveAsTable(full_name)
+    print(f"✓ Indexed {len(index_rows)} model objects → {full_name}", flush=True)
+    return len(index_rows)
+
+# ==============================================================
+# SHARED HELPERS: UNUSED OBJECTS
+# ==============================================================
+# A column or measure is used when a visual, filter or report-level measure
+# references it, when a relationship is built on it, when a calculated column
+# or calculation item depends on it, or (transitively, via ModelDependencies)
+# when a used measure depends on it. Everything else in ModelDetail is written
+# to UnusedObjects. Object keys are plain strings, so the used set is a hash
+# set and the anti-join against ModelDetail is a single vectorized isin().
+
+UNUSED_OBJECT_TYPES = ["Column", "CalculatedColumn", "Measure"]
+UNUSED_OBJECTS_TEMPLATE = {
+    "ObjectType": "", "TableName": "", "ObjectName": "", "IsHidden": "", "Reason": "",
+    "ModelID": "", "ModelName": "", "WorkspaceName": "", "RunId": "", "UpdatedAt": ""
+}
+OBJECT_KEY_SEPARATOR = "\x1f"
+
+def object_keys(model_ids, object_types, tables, names):
+    """Vectorized "model|type|table|name" keys (types Column/Measure/Table, names case-insensitive)"""
+    sep = OBJECT_KEY_SEPARATOR
+    return (model_ids.astype(str) + sep + object_types.astype(str) + sep
+            + tables.astype(str).str.lower() + sep + names.astype(str).str.lower())
+
+def normalize_object_types(object_types):
+    """Visuals and DAX reference calculated columns (and hierarchy levels) as columns"""
+    return object_types.where(object_types.isin(["Measure", "Table"]), "Column")
+
+def read_report_references():
+    """Keys of every model object referenced by a visual, filter or report-level measure"""
+    import pandas as pd
+
+    keys = []
+    for name in ("VisualObjects", "VisualFilters", "PageFilters", "ReportFilters"):
+        pdf = read_output_frame(name)
+        if pdf is not None and len(pdf):
+            keys.append(object_keys(pdf["ModelID"], normalize_object_types(pdf["ObjectType"]), pdf["TableName"], pdf["ObjectName"]))
+    return pd.concat(keys, ignore_index=True) if keys else pd.Series([], dtype=object)
+
+def read_dependency_edges(model_detail):
+    """
+    ModelDependencies as (dependent key, referenced key, dependent type) rows.
+
+    Args:
+        model_detail: ModelDetail DataFrame (gives the home table of each dependent object)
+
+    Returns:
+        DataFrame with Source, Target and SourceType columns
+    """
+    import pandas as pd
+
+    deps = read_output_frame("ModelDependencies")
+    if deps is None or not len(deps):
+        return pd.DataFrame(columns=["Source", "Target", "SourceType"])
+
+    owners = model_detail.loc[model_detail["Type"].isin(["Measure", "CalculatedColumn", "CalculationItem"]),
+                              ["ModelID", "Type", "Name", "Table"]].drop_duplicates(["ModelID", "Type", "Name"])
+    deps = deps.merge(owners, how="left", left_on=["ModelID", "ObjectType", "ObjectName"], right_on=["ModelID", "Type", "Name"])
+    deps["Table"] = deps["Table"].fillna("")
+
+    referenced = deps["DependsOn"].astype(str).str.extract(DAX_OBJECT_NAME_PATTERN.pattern)
+    deps["RefTable"] = referenced[0].str.replace("''", "'", regex=False)
+    deps["RefName"] = referenced[1].fillna(deps["RefTable"])
+    deps["RefType"] = (deps["DependsOnType"] == "Measure").map({True: "Measure", False: "Column"})
+    deps.loc[referenced[1].isna(), "RefType"] = "Table"
+    deps = deps[deps["RefTable"].notna()]
+
+    return pd.DataFrame({
+        "Source": object_keys(deps["ModelID"], normalize_object_types(deps["ObjectType"]), deps["Table"], deps["ObjectName"]),
+        "Target": object_keys(deps["ModelID"], deps["RefType"], deps["RefTable"], deps["RefName"]),
+        "SourceType": deps["ObjectType"]
+    })
+
+def build_unused_objects():
+    """
+    Rebuild the UnusedObjects table and the UnusedObjects summary metric.
+
+    Returns:
+        Number of unused objects
+    """
+    import pandas as pd
+
+    model_detail = read_output_frame("ModelDetail")
+    if model_detail is None:
+        print("⚠ ModelDetail not found; skipping unused object detection", flush=True)
+        return 0
+
+    # Seeds: report references, relationship columns, and objects calculated columns/items depend on
+    report_refs = read_report_references()
+    relationships = model_detail[model_detail["Type"] == "Relationship"]
+    relationship_refs = pd.concat([
+        object_keys(relationships["ModelID"], pd.Series("Column", index=relationships.index),
+                    relationships["RelationshipFromTable"], relationships["RelationshipFromColumn"]),
+        object_keys(relationships["ModelID"], pd.Series("Column", index=relationships.index),
+                    relationships["RelationshipToTable"], relationships["RelationshipToColumn"])
+    ], ignore_index=True)
+
+    measures = defaultdict(dict)
+    for row in model_detail.loc[model_detail["Type"] == "Measure", ["ModelID", "Table", "Name"]].itertuples(index=False):
+        measures[row.ModelID].setdefault(row.Name, row.Table)
+    sep = OBJECT_KEY_SEPARATOR
+    report_measure_refs = set()
+    report_measures = read_output_frame("ReportLevelMeasures")
+    if report_measures is not None:
+        for row in report_measures[["ModelID", "Expression"]].itertuples(index=False):
+            for object_type, table, name in parse_dax_references(row.Expression, measures[row.ModelID]):
+                report_measure_refs.add(sep.join((str(row.ModelID), object_type, table.lower(), name.lower())))
+
+    edges = read_dependency_edges(model_detail)
+    structural_refs = edges.loc[edges["SourceType"].isin(["CalculatedColumn", "CalculationItem"]), "Target"]
+
+    used = set(report_refs) | set(relationship_refs) | report_measure_refs | set(structural_refs)
+
+    # Follow dependencies of used objects (measures using measures/columns) to a fixed point
+    frontier = used
+    while frontier:
+        targets = set(edges.loc[edges["Source"].isin(frontier), "Target"])
+        frontier = targets - used
+        used |= frontier
+
+    candidates = model_detail[model_detail["Type"].isin(UNUSED_OBJECT_TYPES)]
+    candidate_keys = object_keys(candidates["ModelID"], normalize_object_types(candidates["Type"]), candidates["Table"], candidates["Name"])
+    unused = candidates[~candidate_keys.isin(used)].copy()
+    referenced = candidate_keys[~candidate_keys.isin(used)].isin(set(edges["Target"]))
+    unused["Reason"] = referenced.map({True: "Used only by unused measures", False: "Not referenced"})
+
+    updated_at = datetime.now().isoformat()
+    result = pd.DataFrame({
+        "ObjectType": unused["Type"], "TableName": unused["Table"], "ObjectName": unused["Name"],
+        "IsHidden": unused["IsHidden"], "Reason": unused["Reason"], "ModelID": unused["ModelID"],
+        "ModelName": unused["ModelName"], "WorkspaceName": unused["WorkspaceName"],
+        "RunId": RUN_ID, "UpdatedAt": updated_at
+    }, columns=list(UNUSED_OBJECTS_TEMPLATE))
+
+    full_name = f"{spark.sql('SELECT current_catalog()').first()[0]}.{LAKEHOUSE_SCHEMA}.{get_output_table_name('UnusedObjects')}"
+    df = spark.createDataFrame(result if len(result) else pd.DataFrame([UNUSED_OBJECTS_TEMPLATE]))
+    if not len(result):
+        df = df.filter("1=0")
+    df.write.mode("overwrite").option("overwriteSchema", "true").format("delta").saveAsTable(full_name)
+    append_snapshot(df, "UnusedObjects")
+    print(f"✓ {len(result)} unused objects of {len(candidates)} columns/measures → {full_name}", flush=True)
+
+    counts = dict.fromkeys(model_detail["WorkspaceName"].unique(), 0)
+    counts.update(result.groupby("WorkspaceName").size().to_dict())
+    update_governance_summary({"UnusedObjects": counts})
+    return len(result)
+
+# ==============================================================
+# SHARED HELPERS: BROKEN VISUALS
+# ==============================================================
+# A visual (or filter) is broken when it references a table/object that no
+# longer exists in its model. Existing objects are a hash set of
+# "model|table|name" keys from ModelDetail plus the report-level measures of
+# each report; every reference in VisualObjects and the visual/page/report
+# filter tables is anti-joined against it with one vectorized isin(), and
+# report-level measure expressions are checked reference by reference.
+# Models that were not extracted (e.g. no permission) are skipped.
+
+BROKEN_VISUALS_TEMPLATE = {
+    "Source": "", "ReportID": "", "ReportName": "", "PageId": "", "PageName": "", "VisualId": "", "VisualName": "",
+    "ObjectType": "", "TableName": "", "ObjectName": "", "ModelID": "", "ModelName": "", "WorkspaceName": "",
+    "RunId": "", "UpdatedAt": ""
+}
+BROKEN_VISUAL_SOURCES = [("VisualObjects", "Visual"), ("VisualFilters", "VisualFilter"),
+                         ("PageFilters", "PageFilter"), ("ReportFilters", "ReportFilter")]
+
+def existence_keys(owner_ids, tables, names):
+    """Vectorized "owner|table|name" keys, case-insensitive like DAX"""
+    sep = OBJECT_KEY_SEPARATOR
+    return owner_ids.astype(str) + sep + tables.astype(str).str.lower() + sep + names.astype(str).str.lower()
+
+def build_broken_visuals():
+    """
+    Rebuild the BrokenVisuals table (one row per missing reference) and the
+    BrokenVisuals summary metric (distinct broken visuals/filters per workspace).
+
+    Returns:
+        Number of broken references
+    """
+    import pandas as pd
+
+    model_detail = read_output_frame("ModelDetail")
+    if model_detail is None:
+        print("⚠ ModelDetail not found; skipping broken visual detection", flush=True)
+        return 0
+
+    objects = model_detail[model_detail["Type"].isin(["Table", "Column", "CalculatedColumn", "Measure", "Hierarchy", "CalculationGroup"])]
+    existing = set(existence_keys(objects["ModelID"], objects["Table"], objects["Name"]))
+    model_names = model_detail.drop_duplicates("ModelID").set_index("ModelID")["ModelName"]
+    model_measures = defaultdict(set)
+    for row in model_detail.loc[model_detail["Type"] == "Measure", ["ModelID", "Name"]].itertuples(index=False):
+        model_measures[row.ModelID].add(row.Name.lower())
+
+    report_measures = read_output_frame("ReportLevelMeasures")
+    if report_measures is None:
+        report_measures = pd.DataFrame(columns=["ReportID", "ReportName", "ModelID", "TableName", "ObjectName", "Expression", "WorkspaceName"])
+    report_existing = set(existence_keys(report_measures["ReportID"], report_measures["TableName"], report_measures["ObjectName"]))
+    report_measure_names = defaultdict(set)
+    for row in report_measures[["ReportID", "ObjectName"]].itertuples(index=False):
+        report_measure_names[row.ReportID].add(str(row.ObjectName).lower())
+
+    broken = []
+    for table, source in BROKEN_VISUAL_SOURCES:
+        refs = read_output_frame(table)
+        if refs is None or not len(refs):
+            continue
+        refs = refs[refs["ModelID"].isin(model_names.index) & (refs["ObjectName"] != "")]
+        missing = (~existence_keys(refs["ModelID"], refs["TableName"], refs["ObjectName"]).isin(existing)
+                   & ~existence_keys(refs["ReportID"], refs["TableName"], refs["ObjectName"]).isin(report_existing))
+        refs = refs[missing]
+        broken.append(pd.DataFrame({
+            "Source": source, "ReportID": refs["ReportID"], "ReportName": refs["ReportName"],
+            "PageId": refs.get("PageId", ""), "PageName": refs.get("PageName", ""),
+            "VisualId": refs.get("VisualId", ""), "VisualName": refs.get("VisualName", ""),
+            "ObjectType": refs["ObjectType"], "TableName": refs["TableName"], "ObjectName": refs["ObjectName"],
+            "ModelID": refs["ModelID"], "ModelName": refs["ModelID"].map(model_names), "WorkspaceName": refs["WorkspaceName"]
+        }))
+
+    # Report-level measure expressions: qualified references must exist in the model; unqualified
+    # ones must be a model measure or a measure of the same report
+    measure_rows = []
+    sep = OBJECT_KEY_SEPARATOR
+    for row in report_measures[report_measures["ModelID"].isin(model_names.index)].itertuples(index=False):
+        for quoted_table, plain_table, name in DAX_REFERENCE_PATTERN.findall(row.Expression or ""):
+            table = quoted_table.replace("''", "'") or plain_table
+            if table:
+                found = (sep.join((str(row.ModelID), table.lower(), name.lower())) in existing
+                         or sep.join((str(row.ReportID), table.lower(), name.lower())) in report_existing)
+            else:
+                found = name.lower() in model_measures[row.ModelID] or name.lower() in report_measure_names[row.ReportID]
+            if not found:
+                measure_rows.append({
+                    "Source": "ReportLevelMeasure", "ReportID": row.ReportID, "ReportName": row.ReportName,
+                    "VisualName": row.ObjectName, "ObjectType": "Column" if table else "Measure", "TableName": table,
+                    "ObjectName": name, "ModelID": row.ModelID, "ModelName": model_names.get(row.ModelID, ""),
+                    "WorkspaceName": row.WorkspaceName
+                })
+    if measure_rows:
+        broken.append(pd.DataFrame(measure_rows))
+
+    result = pd.concat(broken, ignore_index=True) if broken else pd.DataFrame(columns=list(BROKEN_VISUALS_TEMPLATE))
+    result = result.reindex(columns=list(BROKEN_VISUALS_TEMPLATE)).fillna("").drop_duplicates()
+    result["RunId"] = RUN_ID
+    result["UpdatedAt"] = datetime.now().isoformat()
+
+    full_name = f"{spark.sql('SELECT current_catalog()').first()[0]}.{LAKEHOUSE_SCHEMA}.{get_output_table_name('BrokenVisuals')}"
+    df = spark.createDataFrame(result if len(result) else pd.DataFrame([BROKEN_VISUALS_TEMPLATE]))
+    if not len(result):
+        df = df.filter("1=0")
+    df.write.mode("overwrite").option("overwriteSchema", "true").format("delta").saveAsTable(full_name)
+    append_snapshot(df, "BrokenVisuals")
+
+    # A visual or filter counts once however many of its references are missing
+    visuals = result.drop_duplicates(["WorkspaceName", "ReportID", "Source", "PageId", "VisualId", "VisualName"])
+    print(f"✓ {len(result)} missing references in {len(visuals)} visuals/filters → {full_name}", flush=True)
+
+    reports = read_output_frame("Reports")
+    counts = dict.fromkeys(reports["WorkspaceName"].unique() if reports is not None and len(reports) else [], 0)
+    counts.update(visuals.groupby("WorkspaceName").size().to_dict())
+    update_governance_summary({"BrokenVisuals": counts})
+    return len(result)
+
+# ==============================================================
+# SHARED HELPERS: ANALYSIS STAGES
+# ==============================================================
+# Analyses over the extracted tables, run after the report tables are written
+# (end of Cell 3). A failing stage is logged and does not stop the others.
+# Sharded runs analyze once all shards are merged, since reports may use
+# models of workspaces in other shards.
+
+ANALYSIS_STAGES = [
+    ("impact index", build_impact_index),
+    ("unused objects", build_unused_objects),
+    ("broken visuals", build_broken_visuals)
+]
+
+def run_analysis_stages():
+    if SHARD_COUNT > 1 and not SHARDS_MERGED:
+        print("Analysis stages run after all shards are merged", flush=True)
+        return
+    for name, stage in ANALYSIS_STAGES:
+        try:
+            stage()
+        except Exception as e:
+            print(f"ERROR in {name} stage: {e}", flush=True)
+
+# ==============================================================
+# SHARED HELPERS: CHANGE DETECTION
+# ==============================================================
+# Rows of the tables in CHANGE_TRACKED_TABLES carry a RowKey (hash of the
+# columns identifying the object, stable across runs) and a RowHash (hash of
+# the row's content, without dates and the names of the workspace/model/report
+# holding it). detect_changes() (Cell 5) full-outer-joins the previous run's
+# RowKey -> RowHash map from ObjectHashes with this run's in Spark and writes
+# the added, removed and modified rows to the Changes table. Units deferred by
+# RUN_TIME_BUDGET_MINUTES keep their previous rows (see write_output_table), so
+# they are not reported as removed. The first run only records the hashes.
+
+CHANGE_HASHES_TABLE = "ObjectHashes"
+CHANGES_TABLE = "Changes"
+
+# Table -> key columns and the columns describing a row in Changes
+# (parent ID/name, object type column or literal, object name columns)
+CHANGE_TRACKED_TABLES = {
+    "ModelDetail": {"key": ["ModelID", "Type", "Table", "Name"], "parent": ("ModelID", "ModelName"),
+                    "type": "Type", "name": ["Table", "Name"]},
+    "ModelDependencies": {"key": ["ModelID", "ObjectType", "ObjectName", "DependsOn"], "parent": ("ModelID", "ModelName"),
+                          "type": "ObjectType", "name": ["ObjectName", "DependsOn"]},
+    "Visuals": {"key": ["ReportID", "PageId", "Id"], "parent": ("ReportID", "ReportName"),
+                "type": "Type", "name": ["PageName", "Name"]},
+    "VisualObjects": {"key": ["ReportID", "PageId", "VisualId", "TableName", "ObjectName", "ObjectType", "Source"],
+                      "parent": ("ReportID", "ReportName"), "type": "ObjectType",
+                      "name": ["PageName", "VisualName", "TableName", "ObjectName"]},
+    "DataflowDetail": {"key": ["DataflowId", "QueryName"], "parent": ("DataflowId", "DataflowName"),
+                       "type": None, "name": ["QueryName"]}
+}
+CHANGE_HASH_EXCLUDED_COLUMNS = {
+    "RowKey", "RowHash", "ReportDate", "ModelAsOfDate",
+    "WorkspaceName", "ModelName", "ReportName", "DataflowName", "WorkspaceNameDataflowName"
+}
+OBJECT_HASH_COLUMNS = ["SourceTable", "RowKey", "RowHash", "WorkspaceName", "ParentID", "ParentName", "ObjectType", "ObjectName"]
+CHANGES_TEMPLATE = {
+    "SourceTable": "", "ChangeType": "", "RowKey": "", "OldHash": "", "NewHash": "", "WorkspaceName": "",
+    "ParentID": "", "ParentName": "", "ObjectType": "", "ObjectName": "", "RunId": "", "DetectedAt": ""
+}
+
+def short_hash(value):
+    return hashlib.sha1(value.encode("utf-8")).hexdigest()[:16]
+
+def add_change_tracking_columns(pdf, name):
+    """
+    Add RowKey and RowHash to the rows of a tracked table (other tables are returned unchanged).
+
+    Args:
+        pdf: pandas DataFrame about to be written
+        name: Table name (without shard suffix)
+
+    Returns:
+        DataFrame with RowKey and RowHash columns
+    """
+    spec = CHANGE_TRACKED_TABLES.get(name)
+    if spec is None or pdf.empty:
+        return pdf
+
+    text = pdf.astype(object).where(pdf.notna(), "").astype(str)
+    sep = OBJECT_KEY_SEPARATOR
+
+    def joined(columns):
+        return reduce(lambda a, b: a + sep + b, (text[c] if c in text else "" for c in columns))
+
+    keys = joined(spec["key"])
+    # Objects sharing a key (e.g. levels of two hierarchies) are told apart by their position
+    occurrence = keys.groupby(keys).cumcount()
+    keys = keys.where(occurrence == 0, keys + sep + occurrence.astype(str))
+    content = sorted(c for c in pdf.columns if c not in CHANGE_HASH_EXCLUDED_COLUMNS)
+    return pdf.assign(RowKey=keys.map(short_hash), RowHash=joined(content).map(short_hash))
+
+def read_object_hashes(name, spec, catalog):
+    """Spark DataFrame of a tracked table's RowKey/RowHash with the descriptive columns of OBJECT_HASH_COLUMNS; None if unavailable"""
+    from pyspark.sql import functions as F
+
+    try:
+        df = spark.table(f"{catalog}.{LAKEHOUSE_SCHEMA}.{name}")
+    except Exception:
+        return None
+    if "RowKey" not in df.columns:
+        return None
+
+    def text(column):
+        return F.coalesce(F.col(column).cast("string"), F.lit(""))
+
+    parent_id, parent_name = spec["parent"]
+    return df.select(
+        F.lit(name).alias("SourceTable"), "RowKey", "RowHash",
+        text("WorkspaceName").alias("WorkspaceName"),
+        text(parent_id).alias("ParentID"),
+        text(parent_name).alias("ParentName"),
+        (text(spec["type"]) if spec["type"] else F.lit(name.replace("Detail", ""))).alias("ObjectType"),
+        F.concat_ws(" / ", *(text(c) for c in spec["name"])).alias("ObjectName")
+    )
+
+def detect_changes():
+    """
+    Compare this run's row hashes with the previous run's and write the Changes table.
+
+    Returns:
+        Number of changed rows (None when no previous hashes existed)
+    """
+    import pandas as pd
+    from pyspark.sql import functions as F
+
+    if SHARD_COUNT > 1 and not SHARDS_MERGED:
+        return None
+
+    catalog = spark.sql("SELECT current_catalog()").first()[0]
+    hashes_name = f"{catalog}.{LAKEHOUSE_SCHEMA}.{CHANGE_HASHES_TABLE}"
+    try:
+        previous = spark.table(hashes_name)
+        previous_tables = {row[0] for row in previous.select("SourceTable").distinct().collect()}
+    except Exception:
+        previous, previous_tables = None, set()
+
+    described = ["WorkspaceName", "ParentID", "ParentName", "ObjectType", "ObjectName"]
+    detected_at = datetime.now().isoformat()
+    hashes, changes = [], []
+    for name, spec in CHANGE_TRACKED_TABLES.items():
+        old = previous.filter(F.col("SourceTable") == name) if name in previous_tables else None
+        new = read_object_hashes(name, spec, catalog)
+        if new is None:
+            if old is not None:
+                hashes.append(old)
+            continue
+        hashes.append(new)
+        if old is None:
+            continue
+
+        # Full outer join on RowKey, InOld/InNew telling which run(s) a row is in
+        joined = old.select("RowKey", F.lit(True).alias("InOld"),
+                            *(F.col(c).alias(f"{c}Old") for c in ["RowHash", *described])) \
+            .join(new.select("RowKey", F.lit(True).alias("InNew"),
+                             *(F.col(c).alias(f"{c}New") for c in ["RowHash", *described])),
+                  on="RowKey", how="full_outer")
+        in_new = F.col("InNew").isNotNull()
+        change_type = (F.when(F.col("InOld").isNull(), F.lit("Added"))
+                       .when(~in_new, F.lit("Removed"))
+                       .when(F.col("RowHashOld") != F.col("RowHashNew"), F.lit("Modified")))
+        changes.append(joined.select(
+            F.lit(name).alias("SourceTable"), change_type.alias("ChangeType"), "RowKey",
+            F.coalesce(F.col("RowHashOld"), F.lit("")).alias("OldHash"),
+            F.coalesce(F.col("RowHashNew"), F.lit("")).alias("NewHash"),
+            *(F.when(in_new, F.col(f"{c}New")).otherwise(F.col(f"{c}Old")).alias(c) for c in described),
+            F.lit(RUN_ID).alias("RunId"), F.lit(detected_at).alias("DetectedAt")
+        ).filter(F.col("ChangeType").isNotNull()))
+
+    if not hashes:
+        print("⚠ No change-tracked tables found; skipping change detection", flush=True)
+        return None
+
+    changes_name = f"{catalog}.{LAKEHOUSE_SCHEMA}.{CHANGES_TABLE}"
+    if changes:
+        df = reduce(lambda a, b: a.unionByName(b), changes)
+    else:
+        df = spark.createDataFrame(pd.DataFrame([CHANGES_TEMPLATE])).filter("1=0")
+    df.write.mode("overwrite").option("overwriteSchema", "true").format("delta").saveAsTable(changes_name)
+    # Read back, so the snapshot and counts do not recompute the joins against the new hashes
+    written = spark.table(changes_name)
+    append_snapshot(written, CHANGES_TABLE)
+    counts = {row[0]: row[1] for row in written.groupBy("ChangeType").count().collect()}
+
+    reduce(lambda a, b: a.unionByName(b), hashes).select(*OBJECT_HASH_COLUMNS) \
+        .write.mode("overwrite").option("overwriteSchema", "true").format("delta").saveAsTable(hashes_name)
+
+    if previous is None:
+        print(f"✓ Recorded object hashes → {hashes_name} (changes are detected from the next run)", flush=True)
+        return None
+    total = sum(counts.values())
+    print(f"✓ {total} changed rows ({', '.join(f'{k}: {v}' for k, v in sorted(counts.items())) or 'none'}) → {changes_name}", flush=True)
+    return total
+
+# ==============================================================
+# SHARED HELPERS: EXPRESSION STORAGE
+# ==============================================================
+# With EXPRESSION_STORAGE = "hashed", extractors pass DAX/M text through
+# EXPRESSIONS.intern() while collecting rows: each distinct text is kept once
+# (keyed by its SHA-1) and the row holds only the hash, so copies of a model,
+# report or dataflow cost 40 bytes per expression instead of the full text.
+# The text columns are written as ExpressionHash, and write_expressions()
+# writes the texts to the Expressions table after each cell's writes.
+# read_output_frame() puts the text back for the analysis stages. Checkpoints
+# carry the texts their rows reference.
+
+EXPRESSIONS_TABLE = "Expressions"
+
+# Table -> column holding expression text (written as ExpressionHash when hashed)
+EXPRESSION_TEXT_COLUMNS = {"ModelDetail": "Expression", "DataflowDetail": "Query", "ReportLevelMeasures": "Expression"}
+
+class ExpressionStore:
+    """Content-addressed expression texts of a run"""
+
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.texts = {}
+
+    def intern(self, text):
+        """The text's hash when hashed storage is on (the text itself otherwise, or when empty)"""
+        if not self.enabled or not text:
+            return text
+        text = str(text)
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        # setdefault keeps the first copy, so later duplicates can be freed
+        self.texts.setdefault(digest, text)
+        return digest
+
+    def referenced(self, rows):
+        """Texts referenced by checkpointed rows (dictionary of collection name -> rows)"""
+        if not self.enabled:
+            return {}
+        columns = set(EXPRESSION_TEXT_COLUMNS.values())
+        return {row[c]: self.texts[row[c]] for collection in rows.values() for row in collection
+                for c in columns if row.get(c) in self.texts}
+
+    def add(self, texts):
+        if self.enabled:
+            self.texts.update(texts)
+
+EXPRESSIONS = ExpressionStore(EXPRESSION_STORAGE == "hashed")
+
+def hash_expression_column(pdf, name):
+    """Rename a table's (already interned) text column to ExpressionHash when hashed storage is on"""
+    column = EXPRESSION_TEXT_COLUMNS.get(name)
+    if not EXPRESSIONS.enabled or column not in pdf.columns:
+        return pdf
+    return pdf.rename(columns={column: "ExpressionHash"})
+
+def resolve_expression_column(pdf, name):
+    """Put the text back into a table read with hashed storage (inverse of hash_expression_column)"""
+    column = EXPRESSION_TEXT_COLUMNS.get(name)
+    if column is None or "ExpressionHash" not in pdf.columns:
+        return pdf
+    texts = EXPRESSIONS.texts
+    missing = set(pdf["ExpressionHash"]) - texts.keys() - {""}
+    if missing:
+        stored = read_output_frame(EXPRESSIONS_TABLE)
+        if stored is not None:
+            stored = stored[stored["ExpressionHash"].isin(missing)]
+            texts = {**texts, **dict(zip(stored["ExpressionHash"], stored["Expression"]))}
+    return pdf.assign(ExpressionHash=pdf["ExpressionHash"].map(texts).fillna("")).rename(columns={"ExpressionHash": column})
+
+def write_expressions():
+    """
+    Write this run's expression texts, plus stored texts still referenced by
+    tables this run did not rewrite, to the Expressions table (hashed storage only).
+
+    Returns:
+        Number of expressions written
+    """
+    import pandas as pd
+
+    if not EXPRESSIONS.enabled:
+        return 0
+
+    catalog = spark.sql("SELECT current_catalog()").first()[0]
+    referenced = set()
+    for name in EXPRESSION_TEXT_COLUMNS:
+        try:
+            df = spark.table(f"{catalog}.{LAKEHOUSE_SCHEMA}.{get_output_table_name(name)}")
+        except Exception:
+            continue
+        if "ExpressionHash" in df.columns:
+            referenced.update(row[0] for row in df.select("ExpressionHash").distinct().collect())
+
+    result = pd.DataFrame({"ExpressionHash": list(EXPRESSIONS.texts), "Expression": list(EXPRESSIONS.texts.values())})
+    stored = read_output_frame(EXPRESSIONS_TABLE)
+    if stored is not None and len(stored):
+        kept = stored[stored["ExpressionHash"].isin(referenced) & ~stored["ExpressionHash"].isin(EXPRESSIONS.texts.keys())]
+        result = pd.concat([result, kept[["ExpressionHash", "Expression"]]], ignore_index=True).drop_duplicates("ExpressionHash")
+    result["Length"] = result["Expression"].str.len().astype("int64")
+
+    full_name = f"{catalog}.{LAKEHOUSE_SCHEMA}.{get_output_table_name(EXPRESSIONS_TABLE)}"
+    df = spark.createDataFrame(result if len(result) else pd.DataFrame([{"ExpressionHash": "", "Expression": "", "Length": 0}]))
+    if not len(result):
+        df = df.filter("1=0")
+    df.write.mode("overwrite").option("overwriteSchema", "true").format("delta").saveAsTable(full_name)
+    append_snapshot(df, EXPRESSIONS_TABLE)
+    print(f"✓ {len(result)} distinct expressions → {full_name}", flush=True)
+    return len(result)
+
+# ==============================================================
+# SHARED HELPERS: RUN TIME BUDGET & PRIORITY
+# ==============================================================
+# Extractors claim each workspace, model and report through
+# RUN_DEADLINE.start_unit() before starting it. Once RUN_TIME_BUDGET_MINUTES
+# minus RUN_TIME_RESERVE_MINUTES has elapsed, new units are deferred instead:
+# what finished is still written, and the deferred units are recorded in the
+# DeferredUnits table and {RUN_STATE_PATH}/deferred.json. write_output_table()
+# then replaces only the rows of the processed units, so deferred workspaces,
+# models and reports keep their rows from the previous run. Workspaces are ordered
+# by prioritize_workspaces() so the most important work runs before the cutoff
+# and the next run starts with what this one deferred.
+
+RUN_STARTED_AT = time.time()
+DEFERRED_UNITS_FILE = "deferred.json" if SHARD_COUNT == 1 else f"deferred-shard{SHARD_INDEX}.json"
+DEFERRED_UNITS_TEMPLATE = {"RunId": "", "Phase": "", "UnitType": "", "WorkspaceName": "", "UnitId": "", "UnitName": "", "DeferredAt": ""}
+# Deferred unit type -> column identifying its rows in the phase's tables
+DEFERRED_UNIT_COLUMNS = {"workspace": "WorkspaceName", "model": "ModelID", "report": "ReportID"}
+# Table -> phase that wrote it (set by write_output_table, used when merging shards)
+OUTPUT_TABLE_PHASES = {}
+
+class RunDeadline:
+    """Wall-clock budget for a run and the units deferred because of it"""
+
+    def __init__(self, budget_minutes, reserve_minutes, started_at):
+        self.deadline = started_at + (budget_minutes - reserve_minutes) * 60 if budget_minutes else None
+        self.deferred = []
+        self._announced = set()
+        self._lock = threading.Lock()
+
+    def remaining_minutes(self):
+        """Minutes left before new units are deferred (None = unlimited)"""
+        if self.deadline is None:
+            return None
+        return max(0.0, (self.deadline - time.time()) / 60)
+
+    def start_unit(self, phase):
+        """
+        Claim the next unit of work of a phase.
+
+        Returns:
+            True to start the unit, False to defer it (the budget is used up)
+        """
+        if self.deadline is None or time.time() < self.deadline:
+            return True
+        with self._lock:
+            if phase not in self._announced:
+                self._announced.add(phase)
+                print(f"⏱ Time budget reached: deferring the remaining {phase} work", flush=True)
+        return False
+
+    def defer(self, phase, unit_type, workspace_name, unit_id="", unit_name=""):
+        """Record a unit that was not started"""
+        with self._lock:
+            self.deferred.append({
+                "RunId": RUN_ID,
+                "Phase": phase,
+                "UnitType": unit_type,
+                "WorkspaceName": workspace_name,
+                "UnitId": unit_id,
+                "UnitName": unit_name,
+                "DeferredAt": datetime.now().isoformat()
+            })
+
+    def deferred_count(self, phase=None):
+        return sum(1 for unit in self.deferred if phase is None or unit["Phase"] == phase)
+
+    def deferred_ids(self, phase, unit_type):
+        """IDs of the deferred units of one phase and type"""
+        return {unit["UnitId"] for unit in self.deferred if unit["Phase"] == phase and unit["UnitType"] == unit_type}
+
+    def should_write(self, phase, collected):
+        """False when a phase collected nothing because all of its work was deferred"""
+        if collected or not self.deferred_count(phase):
+            return True
+        print(f"⚠ All {phase} work was deferred; keeping the existing {phase} tables", flush=True)
+        return False
+
+    def save(self):
+        """Write the deferred units to the DeferredUnits table and deferred.json (read by the next run)"""
+        import pandas as pd
+
+        full_name = f"{spark.sql('SELECT current_catalog()').first()[0]}.{LAKEHOUSE_SCHEMA}.{get_output_table_name('DeferredUnits')}"
+        df = spark.createDataFrame(pd.DataFrame(self.deferred if self.deferred else [DEFERRED_UNITS_TEMPLATE]))
+        if not self.deferred:
+            df = df.filter("1=0")
+        df.write.mode("overwrite").option("overwriteSchema", "true").format("delta").saveAsTable(full_name)
+
+        try:
+            write_json_atomic(os.path.join(RUN_STATE_PATH, DEFERRED_UNITS_FILE),
+                              {"run_id": RUN_ID, "saved_at": datetime.now().isoformat(), "units": self.deferred})
+        except OSError as e:
+            print(f"Warning: could not write {DEFERRED_UNITS_FILE}: {e}", flush=True)
+
+        if self.deferred:
+            workspaces = len({unit["WorkspaceName"] for unit in self.deferred})
+            print(f"⏱ {len(self.deferred)} unit(s) in {workspaces} workspace(s) deferred → {full_name}", flush=True)
+            print(f"  Run again with RUN_ID = \"{RUN_ID}\" to finish them, or let the next run process them first", flush=True)
+
+def load_run_deferred_units():
+    """Units deferred by every shard of this run (from their deferred*.json files)"""
+    units = []
+    for path in glob.glob(os.path.join(RUN_STATE_PATH, "deferred*.json")):
+        try:
+            with open(path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if state.get("run_id") == RUN_ID:
+            units.extend(state.get("units", []))
+    return units
+
+def deferred_rows_condition(units, phase, columns):
+    """
+    SQL predicate matching the rows of a phase's deferred units.
+
+    Returns:
+        "<column> IN (...) OR ..." or None when none of the units can be told apart in the table
+    """
+    values = defaultdict(set)
+    for unit in units:
+        column = DEFERRED_UNIT_COLUMNS.get(unit["UnitType"])
+        if unit["Phase"] == phase and column in columns:
+            values[column].add(unit["WorkspaceName"] if unit["UnitType"] == "workspace" else unit["UnitId"])
+    clauses = [f"{column} IN ({', '.join(sql_string(value) for value in sorted(ids))})" for column, ids in sorted(values.items())]
+    return " OR ".join(clauses) or None
+
+def sql_string(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+def overwrite_output_table(df, full_name, phase, deferred_units):
+    """
+    Overwrite a table with this run's rows, except the rows of deferred units,
+    which keep their previous version.
+
+    Returns:
+        Spark DataFrame of the table as written
+    """
+    kept = deferred_rows_condition(deferred_units, phase, df.columns) if phase else None
+    if kept is not None:
+        try:
+            spark.table(full_name)
+        except Exception:
+            kept = None  # First write: there are no previous rows to keep
+    if kept is None:
+        df.write.mode("overwrite").option("overwriteSchema", "true").format("delta").saveAsTable(full_name)
+        return df
+
+    replaced = f"NOT ({kept})"
+    df.filter(replaced).write.mode("overwrite").option("replaceWhere", replaced).option("mergeSchema", "true") \
+        .format("delta").saveAsTable(full_name)
+    print(f"  Kept the previous rows of the deferred {phase} units in {full_name}", flush=True)
+    return spark.table(full_name)
+
+def write_output_table(df, name, phase):
+    """
+    Write a phase's output table (see RUN TIME BUDGET): a full overwrite, or on
+    a partial run a replacement of the processed units' rows only.
 
-import re
+    Args:
+        df: Spark DataFrame of this run's rows
+        name: Table name (without shard suffix)
+        phase: Phase that extracted the rows (e.g. "Models")
 
-# Validate MAX_PARALLEL_WORKERS
-if not isinstance(MAX_PARALLEL_WORKERS, int) or MAX_PARALLEL_WORKERS < 1 or MAX_PARALLEL_WORKERS > 10:
-    raise ValueError("MAX_PARALLEL_WORKERS must be an integer between 1 and 10.")
+    Returns:
+        Spark DataFrame of the table as written (for append_snapshot)
+    """
+    OUTPUT_TABLE_PHASES[name] = phase
+    full_name = f"{spark.sql('SELECT current_catalog()').first()[0]}.{LAKEHOUSE_SCHEMA}.{get_output_table_name(name)}"
+    # Shard tables only hold this run's rows: the previous rows are kept when merging
+    sharded = SHARD_COUNT > 1 and not SHARDS_MERGED
+    return overwrite_output_table(df, full_name, phase, [] if sharded else RUN_DEADLINE.deferred)
+
+def load_previously_deferred_workspaces():
+    """Names of the workspaces the previous run (any of its shards) deferred work in"""
+    workspaces = set()
+    for path in glob.glob(os.path.join(RUN_STATE_PATH, "deferred*.json")):
+        try:
+            with open(path) as f:
+                workspaces.update(unit["WorkspaceName"] for unit in json.load(f).get("units", []))
+        except (OSError, ValueError, KeyError):
+            pass
+    return workspaces
+
+def load_workspace_activity():
+    """Latest dataset/dataflow refresh start time per workspace name, from the previous run's tables"""
+    try:
+        catalog = spark.sql("SELECT current_catalog()").first()[0]
+        rows = spark.sql(f"""
+            SELECT WorkspaceName, MAX(StartTime) AS LastActivity FROM (
+                SELECT WorkspaceName, DatasetRefreshStartTime AS StartTime FROM {catalog}.{LAKEHOUSE_SCHEMA}.DatasetRefreshHistory
+                UNION ALL
+                SELECT WorkspaceName, DataflowRefreshStartTime AS StartTime FROM {catalog}.{LAKEHOUSE_SCHEMA}.DataflowRefreshHistory
+            ) GROUP BY WorkspaceName
+        """).collect()
+        return {row[0]: str(row[1] or "") for row in rows}
+    except Exception:
+        return {}
 
-# -----------------------------------
-# CONFIGURATION VALIDATION
-# -----------------------------------
-# Validate lakehouse schema name
-if not LAKEHOUSE_SCHEMA:
-    raise ValueError("LAKEHOUSE_SCHEMA must be set! Please provide a valid schema name (alphanumeric and underscores only).")
-    
-if not re.match(r'^[a-zA-Z0-9_]+$', LAKEHOUSE_SCHEMA):
-    raise ValueError(f"Invalid lakehouse schema name: '{LAKEHOUSE_SCHEMA}'. Must contain only alphanumeric characters and underscores.")
+_workspace_priority = None
 
-# Validate workspace names
-if not isinstance(WORKSPACE_NAMES, list):
-    raise ValueError("WORKSPACE_NAMES must be a list. Use ['All'] to scan all workspaces, or ['Workspace1', 'Workspace2'] for specific workspaces.")
+def prioritize_workspaces(workspaces_df):
+    """
+    Order workspaces for extraction: PRIORITY_WORKSPACES first, then workspaces
+    deferred by the previous run, then by WORKSPACE_PRIORITY.
 
-if len(WORKSPACE_NAMES) == 0:
-    raise ValueError("WORKSPACE_NAMES cannot be empty. Use ['All'] to scan all workspaces.")
+    The order is computed once per run so every cell processes workspaces alike.
 
-if len(WORKSPACE_NAMES) > 10:
-    raise ValueError("WORKSPACE_NAMES can contain at most 10 workspace names. Use ['All'] to scan all workspaces.")
+    Args:
+        workspaces_df: DataFrame from fabric.list_workspaces() (with a Name column)
 
-# Check if scanning all workspaces (case-insensitive check for "All")
-SCAN_ALL_WORKSPACES = (len(WORKSPACE_NAMES) == 1 and WORKSPACE_NAMES[0].lower() == "all")
+    Returns:
+        Reordered DataFrame
+    """
+    global _workspace_priority
+    if _workspace_priority is None:
+        _workspace_priority = (
+            {name: position for position, name in enumerate(PRIORITY_WORKSPACES)},
+            load_previously_deferred_workspaces(),
+            load_workspace_activity() if WORKSPACE_PRIORITY == "recent_activity" else {}
+        )
+    explicit, deferred, activity = _workspace_priority
 
-print(f"Configuration loaded:")
-print(f"  Lakehouse Schema: {LAKEHOUSE_SCHEMA}")
-if SCAN_ALL_WORKSPACES:
-    print(f"  Workspaces: All (scanning all accessible workspaces)")
-else:
-    print(f"  Workspaces: {WORKSPACE_NAMES}")
-print(f"  Parallel Workers: {MAX_PARALLEL_WORKERS}")
+    names = workspaces_df["Name"]
+    return (workspaces_df
+            .assign(_explicit=names.map(explicit).fillna(len(explicit)),
+                    _deferred=~names.isin(deferred),
+                    _activity=names.map(activity).fillna(""))
+            .sort_values(["_explicit", "_deferred", "_activity", "Name"],
+                         ascending=[True, True, False, True], kind="stable")
+            .drop(columns=["_explicit", "_deferred", "_activity"])
+            .reset_index(drop=True))
+
+RUN_DEADLINE = RunDeadline(RUN_TIME_BUDGET_MINUTES, RUN_TIME_RESERVE_MINUTES, RUN_STARTED_AT)
 
 
 # In[1]:
@@ -137,10 +3100,15 @@ import re
 import pandas as pd
 import json
 from datetime import datetime
+from collections import Counter
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import takewhile
 import sempy.fabric as fabric
 from sempy.fabric import FabricRestClient
 
+# Record latency/call counts for sempy calls (RunMetrics, see Cell 0)
+fabric = instrument(fabric, "fabric")
+
 EXTRACTION_TIMESTAMP = datetime.now()
 REPORT_DATE = EXTRACTION_TIMESTAMP.strftime("%Y-%m-%d")
 start_time = time.time()
@@ -154,15 +3122,8 @@ def log(msg):
 def elapsed_min():
     return (time.time() - start_time) / 60
 
-# Heartbeat
-import threading
-heartbeat_running = True
-def heartbeat():
-    while heartbeat_running:
-        time.sleep(10)
-        print(f"[Heartbeat] Still running… elapsed {elapsed_min():.2f} min", flush=True)
-
-threading.Thread(target=heartbeat, daemon=True).start()
+# Progress (items completed/remaining, throughput and ETA) is reported by the
+# shared PROGRESS tracker from Cell 0
 
 # -----------------------------------
 # Start banner
@@ -253,8 +3214,31 @@ def serialize_json(obj):
 # These helpers enable parallel fetching of dataset/dataflow details
 # which significantly reduces total extraction time.
 
-# Use the configured parallel worker setting
-MAX_WORKERS = MAX_PARALLEL_WORKERS
+# Pool size from Cell 0; the adaptive CONCURRENCY limiters decide how many
+# of these workers call the APIs at once
+MAX_WORKERS = CONCURRENCY_POOL_SIZE
+
+def fetch_refresh_history(client, url, item_id):
+    """
+    Refresh history of one dataset/dataflow, newest first. With a watermark
+    (REFRESH_HISTORY_MODE = "incremental"), only the entries after it: $top is
+    raised until an entry at or before the watermark shows up.
+    """
+    watermark = REFRESH_WATERMARKS.get(item_id)
+    if watermark is None:
+        response = client.get(url)
+        return response.json().get('value', []) if response.status_code == 200 else []
+
+    top = REFRESH_HISTORY_PAGE_SIZE
+    while True:
+        response = client.get(f"{url}?$top={top}")
+        if response.status_code != 200:
+            return []
+        entries = response.json().get('value', [])
+        new_entries = list(takewhile(lambda entry: is_new_refresh(entry.get("startTime") or "", watermark), entries))
+        if len(new_entries) < len(entries) or len(entries) < top:
+            return new_entries
+        top *= 4
 
 def fetch_dataset_details(client, ws_id, ws_name, dataset_id, dataset_name):
     """Fetch dataset sources, refresh history, and refresh schedule in parallel"""
@@ -285,21 +3269,19 @@ def fetch_dataset_details(client, ws_id, ws_name, dataset_id, dataset_name):
     # Fetch dataset refresh history
     try:
         refresh_url = f"v1.0/myorg/groups/{ws_id}/datasets/{dataset_id}/refreshes"
-        response = client.get(refresh_url)
-        if response.status_code == 200:
-            for refresh in response.json().get('value', []):
-                refreshes.append({
-                    "WorkspaceId": ws_id,
-                    "WorkspaceName": ws_name,
-                    "DatasetId": dataset_id,
-                    "DatasetName": dataset_name,
-                    "DatasetRefreshRequestId": refresh.get("requestId", ""),
-                    "DatasetRefreshId": refresh.get("id", ""),
-                    "DatasetRefreshStartTime": refresh.get("startTime", ""),
-                    "DatasetRefreshEndTime": refresh.get("endTime", ""),
-                    "DatasetRefreshStatus": refresh.get("status", ""),
-                    "DatasetRefreshType": refresh.get("refreshType", "")
-                })
+        for refresh in fetch_refresh_history(client, refresh_url, dataset_id):
+            refreshes.append({
+                "WorkspaceId": ws_id,
+                "WorkspaceName": ws_name,
+                "DatasetId": dataset_id,
+                "DatasetName": dataset_name,
+                "DatasetRefreshRequestId": refresh.get("requestId", ""),
+                "DatasetRefreshId": refresh.get("id", ""),
+                "DatasetRefreshStartTime": refresh.get("startTime", ""),
+                "DatasetRefreshEndTime": refresh.get("endTime", ""),
+                "DatasetRefreshStatus": refresh.get("status", ""),
+                "DatasetRefreshType": refresh.get("refreshType", "")
+            })
     except Exception as e:
         errors.append(f"refresh history: {e}")
     
@@ -372,26 +3354,173 @@ def fetch_dataflow_details(client, ws_id, ws_name, dataflow_id, dataflow_name):
     # Fetch dataflow refresh history (transactions)
     try:
         refresh_url = f"v1.0/myorg/groups/{ws_id}/dataflows/{dataflow_id}/transactions"
-        response = client.get(refresh_url)
+        for refresh in fetch_refresh_history(client, refresh_url, dataflow_id):
+            refreshes.append({
+                "WorkspaceId": ws_id,
+                "WorkspaceName": ws_name,
+                "DataflowId": dataflow_id,
+                "DataflowName": dataflow_name,
+                "DataflowRefreshRequestId": refresh.get("requestId", ""),
+                "DataflowRefreshId": refresh.get("id", ""),
+                "DataflowRefreshStartTime": refresh.get("startTime", ""),
+                "DataflowRefreshEndTime": refresh.get("endTime", ""),
+                "DataflowRefreshStatus": refresh.get("status", ""),
+                "DataflowRefreshType": refresh.get("refreshType", ""),
+                "DataflowErrorInfo": serialize_json(refresh.get("errorInfo"))
+            })
+    except Exception as e:
+        errors.append(f"refresh history: {e}")
+    
+    return sources, refreshes, errors
+
+def fetch_report_pages(client, ws_id, ws_name, report_id, report_name):
+    """Fetch the pages of a report"""
+    pages = []
+    errors = []
+
+    try:
+        pages_url = f"v1.0/myorg/groups/{ws_id}/reports/{report_id}/pages"
+        response = client.get(pages_url)
         if response.status_code == 200:
-            for refresh in response.json().get('value', []):
-                refreshes.append({
+            for page in response.json().get('value', []):
+                pages.append({
                     "WorkspaceId": ws_id,
                     "WorkspaceName": ws_name,
-                    "DataflowId": dataflow_id,
-                    "DataflowName": dataflow_name,
-                    "DataflowRefreshRequestId": refresh.get("requestId", ""),
-                    "DataflowRefreshId": refresh.get("id", ""),
-                    "DataflowRefreshStartTime": refresh.get("startTime", ""),
-                    "DataflowRefreshEndTime": refresh.get("endTime", ""),
-                    "DataflowRefreshStatus": refresh.get("status", ""),
-                    "DataflowRefreshType": refresh.get("refreshType", ""),
-                    "DataflowErrorInfo": serialize_json(refresh.get("errorInfo"))
+                    "ReportId": report_id,
+                    "ReportName": report_name,
+                    "PageName": page.get("name", ""),
+                    "PageDisplayName": page.get("displayName", ""),
+                    "PageOrder": page.get("order", 0)
                 })
+        else:
+            errors.append(f"pages: HTTP {response.status_code}")
     except Exception as e:
-        errors.append(f"refresh history: {e}")
-    
-    return sources, refreshes, errors
+        errors.append(f"pages: {e}")
+
+    return pages, errors
+
+# ==============================================================  
+# DISTRIBUTED DETAIL EXTRACTION (EXTRACTION_MODE = "spark")
+# ==============================================================
+# The dataset/dataflow detail tasks of all workspaces become one Spark
+# DataFrame. mapInArrow runs fetch_dataset_details/fetch_dataflow_details on the
+# executors (one partition = one sequential stream of calls, at most
+# MAX_CONCURRENCY_LIMIT partitions) and returns the rows as Arrow batches, which
+# are written to Delta without passing through the driver.
+#
+# FabricRestClient only works on the driver, so executors call the REST API with
+# a bearer token read on the driver. The token is shipped in a broadcast variable
+# (never in task rows, Spark conf or logs) and destroyed after the stage; it must
+# outlive the stage (about an hour). Executor calls are not in RunMetrics.
+# REFRESH_WATERMARKS is serialized with the task function, so executors skip
+# refreshes already in the Lakehouse as well.
+
+POWER_BI_API_URL = "https://api.powerbi.com/"
+DETAIL_TABLES = ["DatasetSourcesInfo", "DatasetRefreshHistory", "DatasetRefreshSchedule",
+                 "DataflowSourcesInfo", "DataflowRefreshHistory"]
+DETAIL_COLUMNS = list(dict.fromkeys(column for table in DETAIL_TABLES for column in SAMPLE_ROWS[table]))
+DETAIL_RESULT_COLUMNS = ["TargetTable", "Error"] + DETAIL_COLUMNS
+DETAIL_TASK_SCHEMA = "Kind string, WorkspaceId string, WorkspaceName string, ItemId string, ItemName string"
+
+class ExecutorRestClient:
+    """Minimal Power BI REST client (get only) for Spark executors"""
+
+    def __init__(self, token, base_url=POWER_BI_API_URL, max_retries=REST_MAX_RETRIES):
+        import requests
+        self.session = requests.Session()
+        self.session.headers["Authorization"] = f"Bearer {token}"
+        self.base_url = base_url
+        self.max_retries = max_retries
+
+    def get(self, path):
+        for attempt in range(self.max_retries + 1):
+            response = self.session.get(self.base_url + path, timeout=120)
+            if response.status_code not in (429, 503) or attempt == self.max_retries:
+                return response
+            time.sleep(get_retry_after(response, 10))
+
+def extract_detail_rows(client, task):
+    """
+    Fetch the details of one dataset or dataflow task.
+
+    Returns:
+        List of result rows (DETAIL_RESULT_COLUMNS), including one error row if any call failed
+    """
+    if task["Kind"] == "dataset":
+        sources, refreshes, schedules, errors = fetch_dataset_details(
+            client, task["WorkspaceId"], task["WorkspaceName"], task["ItemId"], task["ItemName"])
+        outputs = [("DatasetSourcesInfo", sources), ("DatasetRefreshHistory", refreshes),
+                   ("DatasetRefreshSchedule", schedules)]
+    else:
+        sources, refreshes, errors = fetch_dataflow_details(
+            client, task["WorkspaceId"], task["WorkspaceName"], task["ItemId"], task["ItemName"])
+        outputs = [("DataflowSourcesInfo", sources), ("DataflowRefreshHistory", refreshes)]
+
+    empty_row = dict.fromkeys(DETAIL_RESULT_COLUMNS)
+    rows = [{**empty_row, **row, "TargetTable": table, "Error": ""} for table, table_rows in outputs for row in table_rows]
+    if errors:
+        rows.append({**empty_row, "TargetTable": "", "WorkspaceName": task["WorkspaceName"],
+                     "Error": f"{task['ItemName']}: {'; '.join(errors)}"})
+    return rows
+
+def extract_details_partition(batches, token_broadcast):
+    """mapInArrow function: task batches in, result batches out (runs on executors)"""
+    import pyarrow as pa
+
+    schema = pa.schema([(column, pa.string()) for column in DETAIL_RESULT_COLUMNS])
+    client = ExecutorRestClient(token_broadcast.value)
+    for batch in batches:
+        rows = []
+        for task in batch.to_pylist():
+            try:
+                rows.extend(extract_detail_rows(client, task))
+            except Exception as e:
+                rows.append({**dict.fromkeys(DETAIL_RESULT_COLUMNS), "TargetTable": "",
+                             "WorkspaceName": task["WorkspaceName"], "Error": f"{task['ItemName']}: {e}"})
+        for row in rows:
+            for column, value in row.items():
+                if value is not None and not isinstance(value, str):
+                    row[column] = str(value)
+        yield pa.RecordBatch.from_pylist(rows, schema=schema)
+
+def write_details_from_executors(tasks):
+    """
+    Run the detail tasks on the Spark executors and write the five detail tables.
+
+    Args:
+        tasks: List of (Kind, WorkspaceId, WorkspaceName, ItemId, ItemName) tuples,
+            Kind being "dataset" or "dataflow"
+    """
+    from notebookutils import mssparkutils
+    from pyspark.sql import functions as F
+
+    partitions = max(1, min(len(tasks), MAX_CONCURRENCY_LIMIT, spark.sparkContext.defaultParallelism))
+    log(f"Fetching {len(tasks)} dataset/dataflow details on Spark executors ({partitions} partitions)...")
+
+    token_broadcast = spark.sparkContext.broadcast(mssparkutils.credentials.getToken("pbi"))
+    result_schema = ", ".join(f"{column} string" for column in DETAIL_RESULT_COLUMNS)
+    results = (spark.createDataFrame(tasks, DETAIL_TASK_SCHEMA)
+               .repartition(partitions)
+               .mapInArrow(lambda batches: extract_details_partition(batches, token_broadcast), result_schema)
+               .persist())
+    try:
+        errors = results.filter(F.col("Error") != "").select("Error").collect()
+        for row in errors[:20]:
+            log(f"    Warning: {row.Error}")
+        if len(errors) > 20:
+            log(f"    ... {len(errors) - 20} more detail warnings")
+
+        for table in DETAIL_TABLES:
+            full_name = f"{CATALOG}.{LAKEHOUSE_SCHEMA}.{get_output_table_name(table)}"
+            table_df = results.filter(F.col("TargetTable") == table).select(*SAMPLE_ROWS[table].keys())
+            if upserts_refresh_history(table):
+                upsert_refresh_history(table_df, table)
+                continue
+            append_snapshot(write_output_table(table_df, table, "Environment"), table)
+            log(f"✓ Wrote table: {full_name} (from executors)\n")
+    finally:
+        results.unpersist()
+        token_broadcast.destroy()
 
 # ==============================================================  
 # GET WORKSPACES
@@ -406,7 +3535,9 @@ if not SCAN_ALL_WORKSPACES:
         raise ValueError(f"No workspaces found matching: {WORKSPACE_NAMES}")
     log(f"Filtering to workspaces: {WORKSPACE_NAMES}")
 
+workspaces_df = select_shard_workspaces(workspaces_df)
 log(f"Workspace count: {len(workspaces_df)}")
+workspaces_df = prioritize_workspaces(workspaces_df)
 
 # Build workspaces_info with renamed columns
 for _, ws_row in workspaces_df.iterrows():
@@ -419,18 +3550,52 @@ for _, ws_row in workspaces_df.iterrows():
 
 log(f"✓ Workspaces collected: {len(workspaces_info)}\n")
 
+PROGRESS.start_phase("Environment", "workspaces", total=len(workspaces_info))
+
+# Restore workspaces finished by an interrupted run with the same RUN_ID (see CHECKPOINTS in Cell 0)
+ENVIRONMENT_COLLECTIONS = {
+    "FabricItems": fabric_items_info,
+    "Datasets": datasets_info,
+    "DatasetSourcesInfo": dataset_sources_info,
+    "DatasetRefreshHistory": dataset_refresh_history,
+    "DatasetRefreshSchedule": dataset_refresh_schedule,
+    "Dataflows": dataflows_info,
+    "DataflowSourcesInfo": dataflow_sources_info,
+    "DataflowRefreshHistory": dataflow_refresh_history,
+    "Reports": reports_info,
+    "ReportPages": report_pages_info
+}
+completed_workspaces = CHECKPOINTS.restore("Environment", ENVIRONMENT_COLLECTIONS)
+dataset_name_lookup.update({ds["DatasetId"]: ds["DatasetName"] for ds in datasets_info})
+dataflow_name_lookup.update({df["DataflowId"]: df["DataflowName"] for df in dataflows_info if df["DataflowId"]})
+
+# Refresh history already in the Lakehouse is not fetched again (REFRESH_HISTORY_MODE = "incremental")
+REFRESH_WATERMARKS = load_refresh_watermarks()
+if REFRESH_WATERMARKS:
+    log(f"Refresh history watermarks loaded for {len(REFRESH_WATERMARKS)} datasets/dataflows")
+
 # ==============================================================  
 # EXTRACT ENVIRONMENT METADATA
 # ==============================================================
 
-# Create a single REST client instance to reuse
-client = FabricRestClient()
+# Create a single REST client instance to reuse (instrumented for RunMetrics)
+client = InstrumentedRestClient(FabricRestClient())
 
 for ws_info in workspaces_info:
     ws_name = ws_info["WorkspaceName"]
     ws_id = ws_info["WorkspaceId"]
     
+    if ws_id in completed_workspaces:
+        log(f"\nSkipping workspace (restored from checkpoint): {ws_name}")
+        PROGRESS.advance("Environment", "workspaces")
+        continue
+    
+    if not RUN_DEADLINE.start_unit("Environment"):
+        RUN_DEADLINE.defer("Environment", "workspace", ws_name, ws_id)
+        continue
+    
     log(f"\nProcessing workspace: {ws_name} | Elapsed: {elapsed_min():.2f} min")
+    checkpoint = CHECKPOINTS.begin("Environment", ws_id, ENVIRONMENT_COLLECTIONS)
 
     # -------------------- DATASETS (with parallel detail fetching) --------------------
     try:
@@ -464,26 +3629,33 @@ for ws_info in workspaces_info:
                 
                 dataset_tasks.append((dataset_id, dataset_name))
             
-            # Fetch dataset details in parallel
-            log(f"  Fetching dataset details in parallel (max {MAX_WORKERS} workers)...")
-            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-                futures = {
-                    executor.submit(fetch_dataset_details, client, ws_id, ws_name, ds_id, ds_name): (ds_id, ds_name)
-                    for ds_id, ds_name in dataset_tasks
-                }
-                for future in as_completed(futures):
-                    try:
-                        sources, refreshes, schedules, errors = future.result()
-                        dataset_sources_info.extend(sources)
-                        dataset_refresh_history.extend(refreshes)
-                        dataset_refresh_schedule.extend(schedules)
-                        if errors:
+            # Details are fetched after the workspace loop by Spark tasks in "spark" mode
+            if EXTRACTION_MODE == "spark":
+                log(f"  Dataset details queued for Spark executors")
+            else:
+                PROGRESS.add_total("Environment", "datasets", len(dataset_tasks))
+            
+                # Fetch dataset details in parallel
+                log(f"  Fetching dataset details in parallel ({CONCURRENCY.get('powerbi').current_limit} concurrent calls)...")
+                with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                    futures = {
+                        executor.submit(fetch_dataset_details, client, ws_id, ws_name, ds_id, ds_name): (ds_id, ds_name)
+                        for ds_id, ds_name in dataset_tasks
+                    }
+                    for future in as_completed(futures):
+                        PROGRESS.advance("Environment", "datasets")
+                        try:
+                            sources, refreshes, schedules, errors = future.result()
+                            dataset_sources_info.extend(sources)
+                            dataset_refresh_history.extend(refreshes)
+                            dataset_refresh_schedule.extend(schedules)
+                            if errors:
+                                ds_id, ds_name = futures[future]
+                                for err in errors:
+                                    log(f"    Warning ({ds_name}): {err}")
+                        except Exception as e:
                             ds_id, ds_name = futures[future]
-                            for err in errors:
-                                log(f"    Warning ({ds_name}): {err}")
-                    except Exception as e:
-                        ds_id, ds_name = futures[future]
-                        log(f"    Error fetching details for {ds_name}: {e}")
+                            log(f"    Error fetching details for {ds_name}: {e}")
         else:
             log(f"  No datasets found")
             
@@ -525,26 +3697,33 @@ for ws_info in workspaces_info:
                 
                 dataflow_tasks.append((dataflow_id, dataflow_name))
             
-            # Fetch dataflow details in parallel
-            if dataflow_tasks:
-                log(f"  Fetching dataflow details in parallel (max {MAX_WORKERS} workers)...")
-                with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-                    futures = {
-                        executor.submit(fetch_dataflow_details, client, ws_id, ws_name, df_id, df_name): (df_id, df_name)
-                        for df_id, df_name in dataflow_tasks
-                    }
-                    for future in as_completed(futures):
-                        try:
-                            sources, refreshes, errors = future.result()
-                            dataflow_sources_info.extend(sources)
-                            dataflow_refresh_history.extend(refreshes)
-                            if errors:
+            # Details are fetched after the workspace loop by Spark tasks in "spark" mode
+            if EXTRACTION_MODE == "spark":
+                log(f"  Dataflow details queued for Spark executors")
+            else:
+                PROGRESS.add_total("Environment", "dataflows", len(dataflow_tasks))
+            
+                # Fetch dataflow details in parallel
+                if dataflow_tasks:
+                    log(f"  Fetching dataflow details in parallel ({CONCURRENCY.get('powerbi').current_limit} concurrent calls)...")
+                    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                        futures = {
+                            executor.submit(fetch_dataflow_details, client, ws_id, ws_name, df_id, df_name): (df_id, df_name)
+                            for df_id, df_name in dataflow_tasks
+                        }
+                        for future in as_completed(futures):
+                            PROGRESS.advance("Environment", "dataflows")
+                            try:
+                                sources, refreshes, errors = future.result()
+                                dataflow_sources_info.extend(sources)
+                                dataflow_refresh_history.extend(refreshes)
+                                if errors:
+                                    df_id, df_name = futures[future]
+                                    for err in errors:
+                                        log(f"    Warning ({df_name}): {err}")
+                            except Exception as e:
                                 df_id, df_name = futures[future]
-                                for err in errors:
-                                    log(f"    Warning ({df_name}): {err}")
-                        except Exception as e:
-                            df_id, df_name = futures[future]
-                            log(f"    Error fetching details for {df_name}: {e}")
+                                log(f"    Error fetching details for {df_name}: {e}")
         else:
             log(f"  No dataflows found")
     except Exception as e:
@@ -577,14 +3756,17 @@ for ws_info in workspaces_info:
     except Exception as e:
         log(f"  ERROR fetching Fabric items: {e}")
 
-    # -------------------- REPORTS --------------------
+    # -------------------- REPORTS (with parallel page fetching) --------------------
     try:
         log(f"  Fetching reports...")
         reports_df = fabric.list_reports(workspace=ws_name)
         
         if reports_df is not None and not reports_df.empty:
             log(f"  Reports found: {len(reports_df)}")
+            PROGRESS.add_total("Environment", "reports", len(reports_df))
             
+            # Collect report basic info first
+            report_tasks = []
             for _, rpt_row in reports_df.iterrows():
                 report_id = safe_get(rpt_row, "Id")
                 report_name = safe_get(rpt_row, "Name")
@@ -606,31 +3788,36 @@ for ws_info in workspaces_info:
                     "DatasetName": dataset_name
                 })
                 
-                # Fetch report pages using REST API
-                try:
-                    pages_url = f"v1.0/myorg/groups/{ws_id}/reports/{report_id}/pages"
-                    pages_response = client.get(pages_url)
-                    
-                    if pages_response.status_code == 200:
-                        pages = pages_response.json().get('value', [])
-                        for page in pages:
-                            report_pages_info.append({
-                                "WorkspaceId": ws_id,
-                                "WorkspaceName": ws_name,
-                                "ReportId": report_id,
-                                "ReportName": report_name,
-                                "PageName": page.get("name", ""),
-                                "PageDisplayName": page.get("displayName", ""),
-                                "PageOrder": page.get("order", 0)
-                            })
-                except Exception as e:
-                    log(f"    ERROR fetching pages for {report_name}: {e}")
+                report_tasks.append((report_id, report_name))
+            
+            # Fetch report pages in parallel
+            log(f"  Fetching report pages in parallel ({CONCURRENCY.get('powerbi').current_limit} concurrent calls)...")
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                futures = {
+                    executor.submit(fetch_report_pages, client, ws_id, ws_name, rpt_id, rpt_name): (rpt_id, rpt_name)
+                    for rpt_id, rpt_name in report_tasks
+                }
+                for future in as_completed(futures):
+                    PROGRESS.advance("Environment", "reports")
+                    try:
+                        pages, errors = future.result()
+                        report_pages_info.extend(pages)
+                        if errors:
+                            rpt_id, rpt_name = futures[future]
+                            for err in errors:
+                                log(f"    Warning ({rpt_name}): {err}")
+                    except Exception as e:
+                        rpt_id, rpt_name = futures[future]
+                        log(f"    Error fetching pages for {rpt_name}: {e}")
         else:
             log(f"  No reports found")
             
     except Exception as e:
         log(f"  ERROR fetching reports: {e}")
 
+    checkpoint.commit()
+    PROGRESS.advance("Environment", "workspaces")
+    FIXTURE_RECORDER.flush()
     log(f"✓ Finished workspace: {ws_name}")
 
 # ==============================================================  
@@ -711,10 +3898,15 @@ log("\n" + "="*80)
 log("Fetching Dataflow Lineage")
 log("="*80)
 
+deferred_workspace_ids = RUN_DEADLINE.deferred_ids("Environment", "workspace")
+
 for ws_info in workspaces_info:
     ws_name = ws_info["WorkspaceName"]
     ws_id = ws_info["WorkspaceId"]
     
+    if ws_id in deferred_workspace_ids:
+        continue
+    
     try:
         lineage_url = f"v1.0/myorg/groups/{ws_id}/dataflows/upstreamDataflows"
         response = client.get(lineage_url)
@@ -748,7 +3940,13 @@ log("Writing output to Lakehouse")
 log("="*80)
 
 def write_table(data, name, sample_row=None):
-    full_name = f"{CATALOG}.{LAKEHOUSE_SCHEMA}.{name}"
+    full_name = f"{CATALOG}.{LAKEHOUSE_SCHEMA}.{get_output_table_name(name)}"
+
+    if upserts_refresh_history(name):
+        # Only the refreshes after the watermarks were fetched
+        df = spark.createDataFrame(pd.DataFrame(data or [sample_row]))
+        upsert_refresh_history(df if data else df.filter("1=0"), name)
+        return
     
     if not data:
         # Create empty table using sample row structure if provided
@@ -758,7 +3956,7 @@ def write_table(data, name, sample_row=None):
             df = spark.createDataFrame(pandas_df)
             # Filter to create empty dataframe with schema
             empty_df = df.filter("1=0")
-            empty_df.write.mode("overwrite").option("overwriteSchema", "true").format("delta").saveAsTable(full_name)
+            write_output_table(empty_df, name, "Environment")
             log(f"✓ Created empty table: {full_name}\n")
         else:
             log(f"⚠ Empty table skipped (no schema): {name}\n")
@@ -771,31 +3969,53 @@ def write_table(data, name, sample_row=None):
 
     log(f"Writing {count} rows → {full_name}")
 
-    df.write.mode("overwrite").option("overwriteSchema", "true").format("delta").saveAsTable(full_name)
+    append_snapshot(write_output_table(df, name, "Environment"), name)
 
     log(f"✓ Wrote table: {full_name}\n")
 
 # Write all tables matching PowerShell script worksheets
-write_table(workspaces_info, "Workspaces", SAMPLE_ROWS.get("Workspaces"))
-write_table(fabric_items_info, "FabricItems", SAMPLE_ROWS.get("FabricItems"))
-write_table(datasets_info, "Datasets", SAMPLE_ROWS.get("Datasets"))
-write_table(dataset_sources_info, "DatasetSourcesInfo", SAMPLE_ROWS.get("DatasetSourcesInfo"))
-write_table(dataset_refresh_history, "DatasetRefreshHistory", SAMPLE_ROWS.get("DatasetRefreshHistory"))
-write_table(dataset_refresh_schedule, "DatasetRefreshSchedule", SAMPLE_ROWS.get("DatasetRefreshSchedule"))
-write_table(dataflows_info, "Dataflows", SAMPLE_ROWS.get("Dataflows"))
-write_table(dataflow_lineage, "DataflowLineage", SAMPLE_ROWS.get("DataflowLineage"))
-write_table(dataflow_sources_info, "DataflowSourcesInfo", SAMPLE_ROWS.get("DataflowSourcesInfo"))
-write_table(dataflow_refresh_history, "DataflowRefreshHistory", SAMPLE_ROWS.get("DataflowRefreshHistory"))
-write_table(reports_info, "Reports", SAMPLE_ROWS.get("Reports"))
-write_table(report_pages_info, "ReportPages", SAMPLE_ROWS.get("ReportPages"))
-write_table(apps_info, "Apps", SAMPLE_ROWS.get("Apps"))
-write_table(reports_in_app_info, "AppReports", SAMPLE_ROWS.get("AppReports"))
+# (unless every workspace was deferred by RUN_TIME_BUDGET_MINUTES)
+if RUN_DEADLINE.should_write("Environment", len(workspaces_info) > len(deferred_workspace_ids)):
+    write_table(workspaces_info, "Workspaces", SAMPLE_ROWS.get("Workspaces"))
+    write_table(fabric_items_info, "FabricItems", SAMPLE_ROWS.get("FabricItems"))
+    write_table(datasets_info, "Datasets", SAMPLE_ROWS.get("Datasets"))
+    write_table(dataflows_info, "Dataflows", SAMPLE_ROWS.get("Dataflows"))
+    write_table(dataflow_lineage, "DataflowLineage", SAMPLE_ROWS.get("DataflowLineage"))
+    if EXTRACTION_MODE == "spark":
+        # Every workspace's details (including restored ones) are fetched by the executors
+        write_details_from_executors(
+            [("dataset", ds["WorkspaceId"], ds["WorkspaceName"], ds["DatasetId"], ds["DatasetName"]) for ds in datasets_info] +
+            [("dataflow", df["WorkspaceId"], df["WorkspaceName"], df["DataflowId"], df["DataflowName"]) for df in dataflows_info]
+        )
+    else:
+        write_table(dataset_sources_info, "DatasetSourcesInfo", SAMPLE_ROWS.get("DatasetSourcesInfo"))
+        write_table(dataset_refresh_history, "DatasetRefreshHistory", SAMPLE_ROWS.get("DatasetRefreshHistory"))
+        write_table(dataset_refresh_schedule, "DatasetRefreshSchedule", SAMPLE_ROWS.get("DatasetRefreshSchedule"))
+        write_table(dataflow_sources_info, "DataflowSourcesInfo", SAMPLE_ROWS.get("DataflowSourcesInfo"))
+        write_table(dataflow_refresh_history, "DataflowRefreshHistory", SAMPLE_ROWS.get("DataflowRefreshHistory"))
+    write_table(reports_info, "Reports", SAMPLE_ROWS.get("Reports"))
+    write_table(report_pages_info, "ReportPages", SAMPLE_ROWS.get("ReportPages"))
+    write_table(apps_info, "Apps", SAMPLE_ROWS.get("Apps"))
+    write_table(reports_in_app_info, "AppReports", SAMPLE_ROWS.get("AppReports"))
+
+    # Headline counts for the Workload UI (see GOVERNANCE SUMMARY in Cell 0)
+    summary_workspaces = [ws["WorkspaceName"] for ws in workspaces_info if ws["WorkspaceId"] not in deferred_workspace_ids]
+    summary_counts = {
+        "TotalReports": Counter(row["WorkspaceName"] for row in reports_info),
+        "TotalModels": Counter(row["WorkspaceName"] for row in datasets_info),
+        "TotalDataflows": Counter(row["WorkspaceName"] for row in dataflows_info)
+    }
+    update_governance_summary({
+        metric: {name: counts[name] for name in summary_workspaces} for metric, counts in summary_counts.items()
+    }, replace=True)
+write_run_metrics("Environment")
+FIXTURE_RECORDER.flush()
 
 # ==============================================================  
 # END
 # ==============================================================
 
-heartbeat_running = False
+PROGRESS.finish_phase("Environment")
 
 log("\n" + "="*80)
 log("PROCESS COMPLETE")
@@ -823,6 +4043,9 @@ from sempy_labs._model_dependencies import get_model_calc_dependencies
 
 # Uses shared configuration from Cell 0: LAKEHOUSE_SCHEMA, WORKSPACE_NAMES, SCAN_ALL_WORKSPACES, MAX_PARALLEL_WORKERS
 
+# Record latency/call counts for sempy calls (RunMetrics, see Cell 0)
+fabric = instrument(fabric, "fabric")
+
 EXTRACTION_TIMESTAMP = datetime.now()
 REPORT_DATE = EXTRACTION_TIMESTAMP.strftime("%Y-%m-%d")
 start_time = time.time()
@@ -836,15 +4059,8 @@ def log(msg):
 def elapsed_min():
     return (time.time() - start_time) / 60
 
-# Heartbeat
-import threading
-heartbeat_running = True
-def heartbeat():
-    while heartbeat_running:
-        time.sleep(10)
-        print(f"[Heartbeat] Still running… elapsed {elapsed_min():.2f} min", flush=True)
-
-threading.Thread(target=heartbeat, daemon=True).start()
+# Progress (items completed/remaining, throughput and ETA) is reported by the
+# shared PROGRESS tracker from Cell 0
 
 # -----------------------------------
 # Start banner
@@ -978,15 +4194,27 @@ if not SCAN_ALL_WORKSPACES:
         raise ValueError(f"No workspaces found matching: {WORKSPACE_NAMES}")
     log(f"Filtering to workspaces: {WORKSPACE_NAMES}")
 
+workspaces_df = select_shard_workspaces(workspaces_df)
 log(f"Workspace count: {len(workspaces_df)}")
+workspaces_df = prioritize_workspaces(workspaces_df)
 log("")
 
+PROGRESS.start_phase("Models", "workspaces", total=len(workspaces_df))
+
+# Restore models finished by an interrupted run with the same RUN_ID (see CHECKPOINTS in Cell 0)
+MODEL_COLLECTIONS = {"ModelDetail": all_model_details, "ModelDependencies": all_model_dependencies}
+completed_models = CHECKPOINTS.restore("Models", MODEL_COLLECTIONS)
+
 # ==============================================================  
 # MODEL METADATA EXTRACTION
 # ==============================================================
 
 for ws_row in workspaces_df.itertuples(index=False):
     ws_name = ws_row.Name
+    if not RUN_DEADLINE.start_unit("Models"):
+        RUN_DEADLINE.defer("Models", "workspace", ws_name, ws_row.Id)
+        continue
+
     log(f"\nProcessing workspace: {ws_name} | Elapsed: {elapsed_min():.2f} min")
 
     try:
@@ -996,19 +4224,31 @@ for ws_row in workspaces_df.itertuples(index=False):
             continue
 
         log(f"  Datasets found: {len(datasets_df)}")
+        PROGRESS.add_total("Models", "models", len(datasets_df))
 
         for idx, row in datasets_df.iterrows():
             # Handle different possible column names
             model_name = row.get('Dataset Name') or row.get('Name') or row.get('Display Name', '')
             model_id = row.get('Dataset ID') or row.get('Id') or row.get('ID', '')
 
+            if f"{ws_name}|{model_id}" in completed_models:
+                log(f"\n  [{idx}/{len(datasets_df)}] Skipping model (restored from checkpoint): {model_name}")
+                PROGRESS.advance("Models", "models")
+                continue
+
+            if not RUN_DEADLINE.start_unit("Models"):
+                RUN_DEADLINE.defer("Models", "model", ws_name, model_id, model_name)
+                continue
+
             t0 = time.time()
             log(f"\n  [{idx}/{len(datasets_df)}] Extracting model: {model_name}")
+            checkpoint = CHECKPOINTS.begin("Models", f"{ws_name}|{model_id}", MODEL_COLLECTIONS)
 
             try:
-                tom = TOMWrapper(dataset=model_name, workspace=ws_name, readonly=True)
+                tom = timed_call("TOMWrapper", TOMWrapper, dataset=model_name, workspace=ws_name, readonly=True)
             except Exception as e:
                 log(f"    ERROR opening model {model_name}: {get_friendly_error_message(e)}")
+                PROGRESS.advance("Models", "models")
                 continue
 
             # Initialize variables that may be used later in dependencies
@@ -1109,7 +4349,7 @@ for ws_row in workspaces_df.itertuples(index=False):
                         "Description": ci.Description if ci.Description else "",
                         "IsHidden": "",
                         "TableStorageMode": "",
-                        "Expression": ci.Expression if ci.Expression else "",
+                        "Expression": EXPRESSIONS.intern(ci.Expression if ci.Expression else ""),
                         "ModelAsOfDate": REPORT_DATE,
                         "ModelName": model_name,
                         "ModelID": model_id,
@@ -1173,7 +4413,7 @@ for ws_row in workspaces_df.itertuples(index=False):
                         "Description": col.Description if col.Description else "",
                         "IsHidden": str(col.IsHidden),
                         "TableStorageMode": "",
-                        "Expression": col.Expression if col.Expression else "",
+                        "Expression": EXPRESSIONS.intern(col.Expression if col.Expression else ""),
                         "ModelAsOfDate": REPORT_DATE,
                         "ModelName": model_name,
                         "ModelID": model_id,
@@ -1206,7 +4446,7 @@ for ws_row in workspaces_df.itertuples(index=False):
                         "Description": m.Description if m.Description else "",
                         "IsHidden": str(m.IsHidden),
                         "TableStorageMode": "",
-                        "Expression": m.Expression if m.Expression else "",
+                        "Expression": EXPRESSIONS.intern(m.Expression if m.Expression else ""),
                         "ModelAsOfDate": REPORT_DATE,
                         "ModelName": model_name,
                         "ModelID": model_id,
@@ -1306,7 +4546,7 @@ for ws_row in workspaces_df.itertuples(index=False):
                         "Description": p.Description if p.Description else "",
                         "IsHidden": "",
                         "TableStorageMode": storage_mode,
-                        "Expression": expression,
+                        "Expression": EXPRESSIONS.intern(expression),
                         "ModelAsOfDate": REPORT_DATE,
                         "ModelName": model_name,
                         "ModelID": model_id,
@@ -1337,7 +4577,7 @@ for ws_row in workspaces_df.itertuples(index=False):
                         "Description": "",
                         "IsHidden": "",
                         "TableStorageMode": "",
-                        "Expression": r.Name if r.Name else "",  # Matches C# script structure
+                        "Expression": EXPRESSIONS.intern(r.Name if r.Name else ""),  # Matches C# script structure
                         "ModelAsOfDate": REPORT_DATE,
                         "ModelName": model_name,
                         "ModelID": model_id,
@@ -1368,7 +4608,9 @@ for ws_row in workspaces_df.itertuples(index=False):
                 elif not measures and not calc_columns and not calc_items:
                     log(f"    Warning: Skipping dependencies - no calculated objects to analyze")
                 else:
-                    dependencies_df = get_model_calc_dependencies(
+                    dependencies_df = timed_call(
+                        "get_model_calc_dependencies",
+                        get_model_calc_dependencies,
                         dataset=model_name,
                         workspace=ws_name
                     )
@@ -1434,11 +4676,16 @@ for ws_row in workspaces_df.itertuples(index=False):
             except Exception as e:
                 log(f"    Warning: Could not extract dependencies - {get_friendly_error_message(e)}")
 
+            checkpoint.commit()
+            PROGRESS.advance("Models", "models")
             log(f"  → Finished {model_name} in {time.time() - t0:.1f} sec "
                 f"(Total: {elapsed_min():.2f} min)")
 
     except Exception as e:
         log(f"ERROR accessing workspace {ws_name}: {get_friendly_error_message(e, 'accessing workspace')}")
+    finally:
+        PROGRESS.advance("Models", "workspaces")
+        FIXTURE_RECORDER.flush()
 
 # ==============================================================  
 # WRITE TO LAKEHOUSE
@@ -1457,38 +4704,42 @@ def write_table(data, name):
         data: List of dictionaries containing the data (first row is schema template)
         name: Name of the table
     """
-    full_name = f"{CATALOG}.{LAKEHOUSE_SCHEMA}.{name}"
+    full_name = f"{CATALOG}.{LAKEHOUSE_SCHEMA}.{get_output_table_name(name)}"
     
     # Check if we only have the template row (length 1 means just the schema template)
     if len(data) == 1:
         log(f"⚠ No data for {name}, creating empty table with schema")
         # Use template to create empty DataFrame with correct schema
-        df = spark.createDataFrame(pd.DataFrame(data))
+        df = spark.createDataFrame(hash_expression_column(add_change_tracking_columns(pd.DataFrame(data), name), name))
         # Filter out the template row to create truly empty table
         empty_df = df.filter("1=0")
-        empty_df.write.mode("overwrite").option("overwriteSchema", "true").format("delta").saveAsTable(full_name)
+        write_output_table(empty_df, name, "Models")
         log(f"✓ Created empty table: {full_name}\n")
         return
 
     # Skip the template row (first row) and create DataFrame with actual data
-    pandas_df = pd.DataFrame(data)
+    pandas_df = hash_expression_column(add_change_tracking_columns(pd.DataFrame(data), name), name)
     actual_df = spark.createDataFrame(pandas_df.iloc[1:])
     count = actual_df.count()
 
     log(f"Writing {count} rows → {full_name}")
 
-    actual_df.write.mode("overwrite").option("overwriteSchema", "true").format("delta").saveAsTable(full_name)
+    append_snapshot(write_output_table(actual_df, name, "Models"), name)
 
     log(f"✓ Wrote table: {full_name}\n")
 
-write_table(all_model_details, "ModelDetail")
-write_table(all_model_dependencies, "ModelDependencies")
+if RUN_DEADLINE.should_write("Models", len(all_model_details) > 1):
+    write_table(all_model_details, "ModelDetail")
+    write_table(all_model_dependencies, "ModelDependencies")
+write_expressions()
+write_run_metrics("Models")
+FIXTURE_RECORDER.flush()
 
 # ==============================================================  
 # END
 # ==============================================================
 
-heartbeat_running = False
+PROGRESS.finish_phase("Models")
 
 log("\n" + "="*80)
 log("PROCESS COMPLETE")
@@ -1514,7 +4765,11 @@ from sempy_labs.report import ReportWrapper
 # Note: Using private module for resolve_dataset_from_report - consider this dependency if upgrading semantic-link-labs
 from sempy_labs._helper_functions import resolve_dataset_from_report
 
-# Uses shared configuration from Cell 0: LAKEHOUSE_SCHEMA, WORKSPACE_NAMES, SCAN_ALL_WORKSPACES, MAX_PARALLEL_WORKERS
+# Uses shared configuration from Cell 0: LAKEHOUSE_SCHEMA, WORKSPACE_NAMES, SCAN_ALL_WORKSPACES
+# Uses shared helpers from Cell 0: CONCURRENCY (adaptive limits), CONCURRENCY_POOL_SIZE
+
+# Record latency/call counts for sempy calls (RunMetrics, see Cell 0)
+fabric = instrument(fabric, "fabric")
 
 EXTRACTION_TIMESTAMP = datetime.now()
 REPORT_DATE = EXTRACTION_TIMESTAMP.strftime("%Y-%m-%d")
@@ -1529,15 +4784,8 @@ def log(msg):
 def elapsed_min():
     return (time.time() - start_time) / 60
 
-# Heartbeat
-import threading
-heartbeat_running = True
-def heartbeat():
-    while heartbeat_running:
-        time.sleep(10)
-        print(f"[Heartbeat] Still running… elapsed {elapsed_min():.2f} min", flush=True)
-
-threading.Thread(target=heartbeat, daemon=True).start()
+# Progress (items completed/remaining, throughput and ETA) is reported by the
+# shared PROGRESS tracker from Cell 0
 
 # -----------------------------------
 # Start banner
@@ -1597,11 +4845,21 @@ def extract_report_metadata(ws_name, rpt_name, rpt_id, model_id, report_date):
         'visual_objects': [],
         'report_level_measures': [],
         'visual_interactions': [],
-        'error': None
+        'error': None,
+        'deferred': False
     }
     
+    # Reports still queued when the time budget runs out are deferred, not started
+    if not RUN_DEADLINE.start_unit("Reports"):
+        result['deferred'] = True
+        return result
+    
     try:
-        rpt = ReportWrapper(report=rpt_name, workspace=ws_name)
+        rpt = instrument(
+            timed_call("ReportWrapper", ReportWrapper, report=rpt_name, workspace=ws_name),
+            "ReportWrapper",
+            context={"report": rpt_name, "workspace": ws_name}
+        )
         
         # Add connection record
         result['connections'].append({
@@ -1817,7 +5075,7 @@ def extract_report_metadata(ws_name, rpt_name, rpt_id, model_id, report_date):
                     "TableName": row.get("Table Name", ""),
                     "ObjectName": row.get("Measure Name", ""),
                     "ObjectType": "Measure",
-                    "Expression": row.get("Expression", ""),
+                    "Expression": EXPRESSIONS.intern(row.get("Expression", "")),
                     "HiddenFlag": "False",
                     "FormatString": row.get("Format String", ""),
                     "DataType": row.get("Data Type", ""),
@@ -1863,15 +5121,39 @@ if not SCAN_ALL_WORKSPACES:
         raise ValueError(f"No workspaces found matching: {WORKSPACE_NAMES}")
     log(f"Filtering to workspaces: {WORKSPACE_NAMES}")
 
+workspaces_df = select_shard_workspaces(workspaces_df)
 log(f"Workspace count: {len(workspaces_df)}")
+workspaces_df = prioritize_workspaces(workspaces_df)
 log("")
 
+PROGRESS.start_phase("Reports", "workspaces", total=len(workspaces_df))
+
+# Restore reports finished by an interrupted run with the same RUN_ID (see CHECKPOINTS in Cell 0)
+REPORT_COLLECTIONS = {
+    "connections": all_connections,
+    "pages": all_pages,
+    "visuals": all_visuals,
+    "bookmarks": all_bookmarks,
+    "custom_visuals": all_custom_visuals,
+    "report_filters": all_report_filters,
+    "page_filters": all_page_filters,
+    "visual_filters": all_visual_filters,
+    "visual_objects": all_visual_objects,
+    "report_level_measures": all_report_level_measures,
+    "visual_interactions": all_visual_interactions
+}
+completed_reports = CHECKPOINTS.restore("Reports", REPORT_COLLECTIONS)
+
 # ==============================================================  
 # REPORT METADATA EXTRACTION (with parallel processing)
 # ==============================================================
 
 for ws_row in workspaces_df.itertuples(index=False):
     ws_name = ws_row.Name
+    if not RUN_DEADLINE.start_unit("Reports"):
+        RUN_DEADLINE.defer("Reports", "workspace", ws_name, ws_row.Id)
+        continue
+
     log(f"\nProcessing workspace: {ws_name} | Elapsed: {elapsed_min():.2f} min")
 
     try:
@@ -1881,6 +5163,7 @@ for ws_row in workspaces_df.itertuples(index=False):
             continue
 
         log(f"  Reports found: {len(reports_df)}")
+        PROGRESS.add_total("Reports", "reports", len(reports_df))
         
         # Prepare report tasks
         report_tasks = []
@@ -1888,6 +5171,10 @@ for ws_row in workspaces_df.itertuples(index=False):
             rpt_name = rpt_row.Name
             rpt_id = rpt_row.Id
             
+            if f"{ws_name}|{rpt_id}" in completed_reports:
+                PROGRESS.advance("Reports", "reports")
+                continue
+            
             # Get dataset/model ID - try from list_reports first, then use API as fallback
             model_id = ""
             if hasattr(rpt_row, 'DatasetId') and rpt_row.DatasetId is not None:
@@ -1895,7 +5182,9 @@ for ws_row in workspaces_df.itertuples(index=False):
             
             if not model_id:
                 try:
-                    dataset_id, _, _, _ = resolve_dataset_from_report(
+                    dataset_id, _, _, _ = timed_call(
+                        "resolve_dataset_from_report",
+                        resolve_dataset_from_report,
                         report=rpt_id, workspace=ws_name
                     )
                     model_id = str(dataset_id) if dataset_id is not None else ""
@@ -1904,29 +5193,37 @@ for ws_row in workspaces_df.itertuples(index=False):
             
             report_tasks.append((rpt_name, rpt_id, model_id))
         
+        if len(report_tasks) < len(reports_df):
+            log(f"  Skipping {len(reports_df) - len(report_tasks)} report(s) restored from checkpoint")
+        
         # Process reports in parallel
-        log(f"  Extracting reports in parallel (max {MAX_PARALLEL_WORKERS} workers)...")
+        log(f"  Extracting reports in parallel ({CONCURRENCY.get('fabric').current_limit} concurrent report loads)...")
         
         # Collect results first (thread-safe)
         report_results = []
         
-        with ThreadPoolExecutor(max_workers=MAX_PARALLEL_WORKERS) as executor:
+        with ThreadPoolExecutor(max_workers=CONCURRENCY_POOL_SIZE) as executor:
             futures = {
-                executor.submit(extract_report_metadata, ws_name, rpt_name, rpt_id, model_id, REPORT_DATE): rpt_name
+                executor.submit(extract_report_metadata, ws_name, rpt_name, rpt_id, model_id, REPORT_DATE): (rpt_name, rpt_id)
                 for rpt_name, rpt_id, model_id in report_tasks
             }
             
             completed = 0
             for future in as_completed(futures):
                 completed += 1
-                rpt_name = futures[future]
+                PROGRESS.advance("Reports", "reports")
+                rpt_name, rpt_id = futures[future]
                 try:
                     result = future.result()
                     
-                    if result['error']:
+                    if result['deferred']:
+                        RUN_DEADLINE.defer("Reports", "report", ws_name, rpt_id, rpt_name)
+                    elif result['error']:
                         log(f"  [{completed}/{len(report_tasks)}] ERROR extracting {rpt_name}: {result['error']}")
                     else:
                         report_results.append(result)
+                        CHECKPOINTS.save("Reports", f"{ws_name}|{rpt_id}",
+                                         {name: result[name] for name in REPORT_COLLECTIONS})
                         log(f"  [{completed}/{len(report_tasks)}] ✓ Extracted {rpt_name}")
                 except Exception as e:
                     log(f"  [{completed}/{len(report_tasks)}] ERROR extracting {rpt_name}: {e}")
@@ -1947,6 +5244,9 @@ for ws_row in workspaces_df.itertuples(index=False):
 
     except Exception as e:
         log(f"ERROR accessing workspace {ws_name}: {e}")
+    finally:
+        PROGRESS.advance("Reports", "workspaces")
+        FIXTURE_RECORDER.flush()
 
 # ==============================================================  
 # WRITE TO LAKEHOUSE
@@ -1965,47 +5265,54 @@ def write_table(data, name):
         data: List of dictionaries containing the data (first row is schema template)
         name: Name of the table
     """
-    full_name = f"{CATALOG}.{LAKEHOUSE_SCHEMA}.{name}"
+    full_name = f"{CATALOG}.{LAKEHOUSE_SCHEMA}.{get_output_table_name(name)}"
     
     # Check if we only have the template row (length 1 means just the schema template)
     if len(data) == 1:
         log(f"⚠ No data for {name}, creating empty table with schema")
         # Use template to create empty DataFrame with correct schema
-        df = spark.createDataFrame(pd.DataFrame(data))
+        df = spark.createDataFrame(hash_expression_column(add_change_tracking_columns(pd.DataFrame(data), name), name))
         # Filter out the template row to create truly empty table
         empty_df = df.filter("1=0")
-        empty_df.write.mode("overwrite").option("overwriteSchema", "true").format("delta").saveAsTable(full_name)
+        write_output_table(empty_df, name, "Reports")
         log(f"✓ Created empty table: {full_name}\n")
         return
 
     # Skip the template row (first row) and create DataFrame with actual data
-    pandas_df = pd.DataFrame(data)
+    pandas_df = hash_expression_column(add_change_tracking_columns(pd.DataFrame(data), name), name)
     actual_df = spark.createDataFrame(pandas_df.iloc[1:])
     count = actual_df.count()
 
     log(f"Writing {count} rows → {full_name}")
 
-    actual_df.write.mode("overwrite").option("overwriteSchema", "true").format("delta").saveAsTable(full_name)
+    append_snapshot(write_output_table(actual_df, name, "Reports"), name)
 
     log(f"✓ Wrote table: {full_name}\n")
 
-write_table(all_connections, "Connections")
-write_table(all_pages, "Pages")
-write_table(all_visuals, "Visuals")
-write_table(all_bookmarks, "Bookmarks")
-write_table(all_custom_visuals, "CustomVisuals")
-write_table(all_report_filters, "ReportFilters")
-write_table(all_page_filters, "PageFilters")
-write_table(all_visual_filters, "VisualFilters")
-write_table(all_visual_objects, "VisualObjects")
-write_table(all_report_level_measures, "ReportLevelMeasures")
-write_table(all_visual_interactions, "VisualInteractions")
+if RUN_DEADLINE.should_write("Reports", len(all_connections) > 1):
+    write_table(all_connections, "Connections")
+    write_table(all_pages, "Pages")
+    write_table(all_visuals, "Visuals")
+    write_table(all_bookmarks, "Bookmarks")
+    write_table(all_custom_visuals, "CustomVisuals")
+    write_table(all_report_filters, "ReportFilters")
+    write_table(all_page_filters, "PageFilters")
+    write_table(all_visual_filters, "VisualFilters")
+    write_table(all_visual_objects, "VisualObjects")
+    write_table(all_report_level_measures, "ReportLevelMeasures")
+    write_table(all_visual_interactions, "VisualInteractions")
+
+    # Impact index, unused objects, broken visuals (see ANALYSIS STAGES in Cell 0)
+    run_analysis_stages()
+write_expressions()
+write_run_metrics("Reports")
+FIXTURE_RECORDER.flush()
 
 # ==============================================================  
 # END
 # ==============================================================
 
-heartbeat_running = False
+PROGRESS.finish_phase("Reports")
 
 log("\n" + "="*80)
 log("PROCESS COMPLETE")
@@ -2042,10 +5349,16 @@ log("="*80)
 
 import time, re, pandas as pd, json, base64
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import sempy.fabric as fabric
 from sempy.fabric import FabricRestClient
 
 # Uses shared configuration from Cell 0: LAKEHOUSE_SCHEMA, WORKSPACE_NAMES, SCAN_ALL_WORKSPACES
+# Uses shared helpers from Cell 0: LongRunningOperationTracker, RunMetrics instrumentation,
+# CONCURRENCY (adaptive limits), CONCURRENCY_POOL_SIZE
+
+# Record latency/call counts for sempy calls (RunMetrics, see Cell 0)
+fabric = instrument(fabric, "fabric")
 
 EXTRACTION_TIMESTAMP = datetime.now()
 REPORT_DATE = EXTRACTION_TIMESTAMP.strftime("%Y-%m-%d")
@@ -2060,15 +5373,8 @@ def log(msg):
 def elapsed_min():
     return (time.time() - start_time) / 60
 
-# Heartbeat
-import threading
-heartbeat_running = True
-def heartbeat():
-    while heartbeat_running:
-        time.sleep(10)
-        print(f"[Heartbeat] Still running… elapsed {elapsed_min():.2f} min", flush=True)
-
-threading.Thread(target=heartbeat, daemon=True).start()
+# Progress (items completed/remaining, throughput and ETA) is reported by the
+# shared PROGRESS tracker from Cell 0
 
 # -----------------------------------
 # Start banner
@@ -2182,7 +5488,7 @@ def parse_power_query_document(document_content, dataflow_id, dataflow_name, wor
             "DataflowId": dataflow_id,
             "DataflowName": dataflow_name,
             "QueryName": query_name,
-            "Query": query_expression,
+            "Query": EXPRESSIONS.intern(query_expression),
             "ReportDate": report_date,
             "WorkspaceName": workspace_name,
             "WorkspaceNameDataflowName": workspace_dataflow_name
@@ -2190,13 +5496,15 @@ def parse_power_query_document(document_content, dataflow_id, dataflow_name, wor
     
     return queries
 
-def extract_gen2_dataflow(client, workspace_id, dataflow_id, dataflow_name, workspace_name, report_date):
+def parse_gen2_definition(response_data, dataflow_id, dataflow_name, workspace_name, report_date):
     """
-    Extract Gen2 (Fabric) dataflow definition using getDefinition API.
+    Parse a Gen2 (Fabric) dataflow definition returned by the getDefinition API.
+    
+    The definition may come straight from the POST (200) or from the result of
+    a long-running operation (202), see LongRunningOperationTracker in Cell 0.
     
     Args:
-        client: FabricRestClient instance
-        workspace_id: Workspace ID
+        response_data: getDefinition response JSON
         dataflow_id: Dataflow ID
         dataflow_name: Dataflow name
         workspace_name: Workspace name
@@ -2207,45 +5515,32 @@ def extract_gen2_dataflow(client, workspace_id, dataflow_id, dataflow_name, work
     """
     queries = []
     
-    try:
-        # Use Fabric API to get dataflow definition
-        endpoint = f"v1/workspaces/{workspace_id}/dataflows/{dataflow_id}/getDefinition"
-        response = client.post(endpoint, json={})
-        
-        if response.status_code != 200:
-            return queries
-        
-        response_data = response.json()
-        
-        if not response_data.get('definition', {}).get('parts'):
-            return queries
-        
-        # Find the .pq file in the parts
-        for part in response_data['definition']['parts']:
-            file_path = part.get('path', '')
-            payload_type = part.get('payloadType', '')
-            payload = part.get('payload', '')
-            
-            if file_path.endswith('.pq') and payload_type == 'InlineBase64':
-                # Decode Base64 content
-                try:
-                    decoded_bytes = base64.b64decode(payload)
-                    pq_content = decoded_bytes.decode('utf-8')
-                    
-                    # Parse the Power Query document
-                    queries = parse_power_query_document(
-                        pq_content,
-                        dataflow_id,
-                        dataflow_name,
-                        workspace_name,
-                        report_date
-                    )
-                    break
-                except Exception as e:
-                    log(f"      Error decoding Gen2 dataflow content: {e}")
+    if not response_data or not response_data.get('definition', {}).get('parts'):
+        return queries
     
-    except Exception as e:
-        log(f"    Could not extract Gen2 dataflow {dataflow_name}: {e}")
+    # Find the .pq file in the parts
+    for part in response_data['definition']['parts']:
+        file_path = part.get('path', '')
+        payload_type = part.get('payloadType', '')
+        payload = part.get('payload', '')
+        
+        if file_path.endswith('.pq') and payload_type == 'InlineBase64':
+            # Decode Base64 content
+            try:
+                decoded_bytes = base64.b64decode(payload)
+                pq_content = decoded_bytes.decode('utf-8')
+                
+                # Parse the Power Query document
+                queries = parse_power_query_document(
+                    pq_content,
+                    dataflow_id,
+                    dataflow_name,
+                    workspace_name,
+                    report_date
+                )
+                break
+            except Exception as e:
+                log(f"      Error decoding Gen2 dataflow content: {e}")
     
     return queries
 
@@ -2308,11 +5603,19 @@ if not SCAN_ALL_WORKSPACES:
         raise ValueError(f"No workspaces found matching: {WORKSPACE_NAMES}")
     log(f"Filtering to workspaces: {WORKSPACE_NAMES}")
 
+workspaces_df = select_shard_workspaces(workspaces_df)
 log(f"Workspace count: {len(workspaces_df)}")
+workspaces_df = prioritize_workspaces(workspaces_df)
 log("")
 
-# Create REST client instance
-client = FabricRestClient()
+# Create REST client instance (instrumented for RunMetrics)
+client = InstrumentedRestClient(FabricRestClient())
+
+PROGRESS.start_phase("Dataflows", "workspaces", total=len(workspaces_df))
+
+# Restore workspaces finished by an interrupted run with the same RUN_ID (see CHECKPOINTS in Cell 0)
+DATAFLOW_COLLECTIONS = {"DataflowDetail": all_dataflow_details}
+completed_workspaces = CHECKPOINTS.restore("Dataflows", DATAFLOW_COLLECTIONS)
 
 # ==============================================================  
 # DATAFLOW DETAIL EXTRACTION
@@ -2321,7 +5624,18 @@ client = FabricRestClient()
 for ws_row in workspaces_df.itertuples(index=False):
     ws_name = ws_row.Name
     ws_id = ws_row.Id
+    
+    if ws_id in completed_workspaces:
+        log(f"\nSkipping workspace (restored from checkpoint): {ws_name}")
+        PROGRESS.advance("Dataflows", "workspaces")
+        continue
+    
+    if not RUN_DEADLINE.start_unit("Dataflows"):
+        RUN_DEADLINE.defer("Dataflows", "workspace", ws_name, ws_id)
+        continue
+    
     log(f"\nProcessing workspace: {ws_name} | Elapsed: {elapsed_min():.2f} min")
+    checkpoint = CHECKPOINTS.begin("Dataflows", ws_id, DATAFLOW_COLLECTIONS)
 
     # -------------------- Gen1 Dataflows (Power BI API) --------------------
     try:
@@ -2332,27 +5646,34 @@ for ws_row in workspaces_df.itertuples(index=False):
         if response.status_code == 200:
             dataflows = response.json().get('value', [])
             log(f"  Gen1 Dataflows found: {len(dataflows)}")
+            PROGRESS.add_total("Dataflows", "dataflows", len(dataflows))
             
-            for dataflow in dataflows:
-                dataflow_id = dataflow.get('objectId', '')
-                dataflow_name = dataflow.get('name', '')
-                
-                log(f"    Extracting: {dataflow_name}")
-                
-                queries = extract_gen1_dataflow(
-                    client,
-                    ws_id,
-                    dataflow_id,
-                    dataflow_name,
-                    ws_name,
-                    REPORT_DATE
-                )
-                
-                if queries:
-                    all_dataflow_details.extend(queries)
-                    log(f"      Queries extracted: {len(queries)}")
-                else:
-                    log(f"      No queries found")
+            # Fetch definitions in parallel (bounded by the adaptive Power BI API limit)
+            with ThreadPoolExecutor(max_workers=CONCURRENCY_POOL_SIZE) as executor:
+                futures = {
+                    executor.submit(
+                        extract_gen1_dataflow,
+                        client,
+                        ws_id,
+                        dataflow.get('objectId', ''),
+                        dataflow.get('name', ''),
+                        ws_name,
+                        REPORT_DATE
+                    ): dataflow.get('name', '')
+                    for dataflow in dataflows
+                }
+                for future in as_completed(futures):
+                    dataflow_name = futures[future]
+                    PROGRESS.advance("Dataflows", "dataflows")
+                    
+                    log(f"    Extracted: {dataflow_name}")
+                    queries = future.result()
+                    
+                    if queries:
+                        all_dataflow_details.extend(queries)
+                        log(f"      Queries extracted: {len(queries)}")
+                    else:
+                        log(f"      No queries found")
         else:
             log(f"  No Gen1 dataflows found")
     except Exception as e:
@@ -2369,16 +5690,32 @@ for ws_row in workspaces_df.itertuples(index=False):
             gen2_dataflows = [item for item in items if item.get('type') == 'Dataflow']
             
             log(f"  Gen2 Dataflows found: {len(gen2_dataflows)}")
+            PROGRESS.add_total("Dataflows", "dataflows", len(gen2_dataflows))
             
+            # Request all definitions up front; large dataflows answer 202 and are
+            # polled together on one shared Retry-After schedule
+            gen2_names = {}
+            tracker = LongRunningOperationTracker(client)
             for dataflow in gen2_dataflows:
                 dataflow_id = dataflow.get('id', '')
-                dataflow_name = dataflow.get('displayName', '')
+                gen2_names[dataflow_id] = dataflow.get('displayName', '')
+                tracker.post(dataflow_id, f"v1/workspaces/{ws_id}/dataflows/{dataflow_id}/getDefinition")
+            
+            if tracker.pending_count:
+                log(f"  Waiting on {tracker.pending_count} long-running getDefinition operation(s)...")
+            
+            for dataflow_id, definition, error in tracker.as_completed():
+                dataflow_name = gen2_names.get(dataflow_id, "")
+                PROGRESS.advance("Dataflows", "dataflows")
                 
                 log(f"    Extracting: {dataflow_name}")
                 
-                queries = extract_gen2_dataflow(
-                    client,
-                    ws_id,
+                if error:
+                    log(f"    Could not extract Gen2 dataflow {dataflow_name}: {error}")
+                    continue
+                
+                queries = parse_gen2_definition(
+                    definition,
                     dataflow_id,
                     dataflow_name,
                     ws_name,
@@ -2395,6 +5732,9 @@ for ws_row in workspaces_df.itertuples(index=False):
     except Exception as e:
         log(f"  ERROR fetching Gen2 dataflows: {e}")
     
+    checkpoint.commit()
+    PROGRESS.advance("Dataflows", "workspaces")
+    FIXTURE_RECORDER.flush()
     log(f"✓ Finished workspace: {ws_name}")
 
 # ==============================================================  
@@ -2414,37 +5754,41 @@ def write_table(data, name):
         data: List of dictionaries containing the data (first row is schema template)
         name: Name of the table
     """
-    full_name = f"{CATALOG}.{LAKEHOUSE_SCHEMA}.{name}"
+    full_name = f"{CATALOG}.{LAKEHOUSE_SCHEMA}.{get_output_table_name(name)}"
     
     # Check if we only have the template row (length 1 means just the schema template)
     if len(data) == 1:
         log(f"⚠ No data for {name}, creating empty table with schema")
         # Use template to create empty DataFrame with correct schema
-        df = spark.createDataFrame(pd.DataFrame(data))
+        df = spark.createDataFrame(hash_expression_column(add_change_tracking_columns(pd.DataFrame(data), name), name))
         # Filter out the template row to create truly empty table
         empty_df = df.filter("1=0")
-        empty_df.write.mode("overwrite").option("overwriteSchema", "true").format("delta").saveAsTable(full_name)
+        write_output_table(empty_df, name, "Dataflows")
         log(f"✓ Created empty table: {full_name}\n")
         return
 
     # Skip the template row (first row) and create DataFrame with actual data
-    pandas_df = pd.DataFrame(data)
+    pandas_df = hash_expression_column(add_change_tracking_columns(pd.DataFrame(data), name), name)
     actual_df = spark.createDataFrame(pandas_df.iloc[1:])
     count = actual_df.count()
 
     log(f"Writing {count} rows → {full_name}")
 
-    actual_df.write.mode("overwrite").option("overwriteSchema", "true").format("delta").saveAsTable(full_name)
+    append_snapshot(write_output_table(actual_df, name, "Dataflows"), name)
 
     log(f"✓ Wrote table: {full_name}\n")
 
-write_table(all_dataflow_details, "DataflowDetail")
+if RUN_DEADLINE.should_write("Dataflows", len(all_dataflow_details) > 1):
+    write_table(all_dataflow_details, "DataflowDetail")
+write_expressions()
+write_run_metrics("Dataflows")
+FIXTURE_RECORDER.flush()
 
 # ==============================================================  
 # END
 # ==============================================================
 
-heartbeat_running = False
+PROGRESS.finish_phase("Dataflows")
 
 log("\n" + "="*80)
 log("DATA EXTRACTION COMPLETE")
@@ -2465,15 +5809,51 @@ log("="*80)
 # This uses the Fabric REST API to:
 # 1. Get the workspace ID from the notebook context (attached lakehouse)
 # 2. List SQL endpoints in the workspace
-# 3. Find the SQL endpoint matching the lakehouse name
-# 4. Refresh the SQL endpoint metadata
+# 3. Select the SQL endpoint matching the lakehouse name (default), or the
+#    endpoints listed in SQL_ENDPOINTS_TO_REFRESH
+# 4. Start all selected metadata refreshes at once and poll each 202 operation
+#    to completion (bounded by SQL_ENDPOINT_REFRESH_TIMEOUT_SECONDS)
+# 5. Report per-endpoint refresh latency and table sync failures
 # ================================
 
+def summarize_sync_result(result):
+    """Count table sync statuses from a refreshMetadata result (list or {'value': [...]})"""
+    tables = result.get('value', []) if isinstance(result, dict) else (result or [])
+    failed = [t.get('tableName', '') for t in tables if isinstance(t, dict) and t.get('status') == 'Failure']
+    return len(tables), failed
+
 log("\n" + "="*80)
 log("SQL ENDPOINT METADATA REFRESH")
 log(f"Started: {datetime.now()}")
 log("="*80)
 
+# Record units deferred by RUN_TIME_BUDGET_MINUTES (an empty table when none were)
+try:
+    RUN_DEADLINE.save()
+except Exception as e:
+    log(f"Could not write deferred units: {e}")
+
+# With SHARD_COUNT > 1, the last shard to get here merges the <Table>_Shard<i> tables
+try:
+    complete_shard()
+except Exception as e:
+    log(f"ERROR merging shard tables: {e}")
+    log(f"Run merge_shard_tables(...) once every shard has finished, or remove runs/{RUN_ID}/shards/merge.lock and rerun this cell.")
+
+# Compare this run's row hashes with the previous run's (Changes table)
+try:
+    detect_changes()
+except Exception as e:
+    log(f"ERROR during change detection: {e}")
+
+# Compact and vacuum the output tables before the SQL endpoint syncs them
+try:
+    run_delta_maintenance()
+except Exception as e:
+    log(f"ERROR during Delta maintenance: {e}")
+
+PROGRESS.start_phase("SqlEndpointRefresh", "endpoints")
+
 try:
     log("\nGetting workspace context...")
     
@@ -2501,16 +5881,13 @@ try:
         log("\nERROR during SQL endpoint refresh: Unable to get workspace ID")
         log("This is not critical - tables are still written to lakehouse.")
         log("You may need to manually refresh the SQL endpoint if needed.")
-    elif not lakehouse_name:
+    elif not lakehouse_name and not SQL_ENDPOINTS_TO_REFRESH:
         log("\n  ERROR: Unable to get lakehouse name from notebook context")
         log("\nERROR during SQL endpoint refresh: Unable to get lakehouse name")
         log("This is not critical - tables are still written to lakehouse.")
         log("You may need to manually refresh the SQL endpoint if needed.")
     else:
-        # Use FabricRestClient to refresh SQL endpoint
-        log(f"\nRefreshing SQL endpoint metadata for lakehouse: {lakehouse_name}")
-        
-        client = FabricRestClient()
+        client = InstrumentedRestClient(FabricRestClient())
         
         # List SQL endpoints in the workspace
         sql_endpoints_url = f"v1/workspaces/{workspace_id}/sqlEndpoints"
@@ -2520,37 +5897,75 @@ try:
             sql_endpoints = response.json().get('value', [])
             log(f"  Found {len(sql_endpoints)} SQL endpoint(s) in workspace")
             
-            # Refresh all SQL endpoints in the workspace
-            if sql_endpoints:
-                log(f"  Refreshing {len(sql_endpoints)} SQL endpoint(s)...")
+            # Select the endpoints to refresh (attached lakehouse by default)
+            if not SQL_ENDPOINTS_TO_REFRESH:
+                targets = [ep for ep in sql_endpoints if ep.get('displayName', '') == lakehouse_name]
+                log(f"\nRefreshing SQL endpoint metadata for lakehouse: {lakehouse_name}")
+            elif len(SQL_ENDPOINTS_TO_REFRESH) == 1 and SQL_ENDPOINTS_TO_REFRESH[0].lower() == "all":
+                targets = sql_endpoints
+                log(f"\nRefreshing metadata for all SQL endpoints in workspace")
+            else:
+                targets = [ep for ep in sql_endpoints if ep.get('displayName', '') in SQL_ENDPOINTS_TO_REFRESH]
+                log(f"\nRefreshing SQL endpoint metadata for: {SQL_ENDPOINTS_TO_REFRESH}")
+            
+            if targets:
+                log(f"  Refreshing {len(targets)} SQL endpoint(s) (timeout {SQL_ENDPOINT_REFRESH_TIMEOUT_SECONDS}s)...")
+                PROGRESS.add_total("SqlEndpointRefresh", "endpoints", len(targets))
                 
-                for endpoint in sql_endpoints:
-                    endpoint_name = endpoint.get('displayName', '')
+                # Start every refresh first so they run concurrently, then poll all
+                # pending 202 operations on one shared schedule until they finish
+                endpoint_names = {}
+                tracker = LongRunningOperationTracker(client, max_wait_seconds=SQL_ENDPOINT_REFRESH_TIMEOUT_SECONDS)
+                for endpoint in targets:
                     endpoint_id = endpoint.get('id', '')
-                    
-                    # Refresh the SQL endpoint metadata
+                    endpoint_names[endpoint_id] = endpoint.get('displayName', '')
                     # The API expects a JSON body but all parameters are optional, so we pass an empty object
-                    refresh_url = f"v1/workspaces/{workspace_id}/sqlEndpoints/{endpoint_id}/refreshMetadata"
-                    refresh_response = client.post(refresh_url, json={})
+                    tracker.post(endpoint_id, f"v1/workspaces/{workspace_id}/sqlEndpoints/{endpoint_id}/refreshMetadata", json={})
+                
+                refreshed = 0
+                for endpoint_id, result, error in tracker.as_completed():
+                    endpoint_name = endpoint_names.get(endpoint_id, endpoint_id)
+                    latency = tracker.durations.get(endpoint_id, 0.0)
+                    PROGRESS.advance("SqlEndpointRefresh", "endpoints")
+                    if error:
+                        log(f"  Warning: SQL endpoint '{endpoint_name}' refresh failed after {latency:.1f} sec: {error}")
+                        continue
                     
-                    if refresh_response.status_code in [200, 202]:
-                        log(f"  ✓ Refreshed SQL endpoint: {endpoint_name}")
-                    else:
-                        log(f"  Warning: SQL endpoint '{endpoint_name}' refresh returned status {refresh_response.status_code}")
-                        log(f"  Response: {refresh_response.text}")
+                    refreshed += 1
+                    table_count, failed_tables = summarize_sync_result(result)
+                    log(f"  ✓ Refreshed SQL endpoint: {endpoint_name} in {latency:.1f} sec ({table_count} table(s) synced)")
+                    if failed_tables:
+                        log(f"    Warning: {len(failed_tables)} table(s) failed to sync: {', '.join(failed_tables)}")
+                
+                log(f"\n✓ SQL endpoint metadata refresh completed ({refreshed}/{len(targets)} endpoint(s))")
             else:
-                log(f"  Warning: No SQL endpoints found in workspace")
+                log(f"  Warning: No matching SQL endpoints found in workspace")
         else:
             log(f"  Warning: Could not list SQL endpoints (status {response.status_code})")
             log(f"  Response: {response.text}")
-        
-        log("\n✓ SQL endpoint metadata refresh completed")
 
 except Exception as e:
     log(f"\nERROR during SQL endpoint refresh: {e}")
     log("This is not critical - tables are still written to lakehouse.")
     log("You may need to manually refresh the SQL endpoint if needed.")
 
+try:
+    write_run_metrics("SqlEndpointRefresh")
+except Exception as e:
+    log(f"Could not write run metrics: {e}")
+
+PROGRESS.finish_phase("SqlEndpointRefresh")
+PROGRESS.complete_run("partial" if RUN_DEADLINE.deferred_count() else "completed")
+
+# A completed run cannot be resumed: its checkpoints (a copy of every extracted row) are no longer needed
+try:
+    if not RUN_DEADLINE.deferred_count():
+        CHECKPOINTS.clear()
+    CHECKPOINTS.prune(CHECKPOINT_RETENTION_DAYS)
+except Exception as e:
+    log(f"Could not delete checkpoints: {e}")
+FIXTURE_RECORDER.close()
+
 log("\n" + "="*80)
 log("ALL PROCESSES COMPLETE")
 log(f"Finished at: {datetime.now()}")
@@ -11,8 +11,12 @@ export interface GovernanceConfig {
 
 export interface AnalysisResult {
   status: string;
-  config?: GovernanceConfig;
+  config?: Record<string, unknown>;
   runId?: string;
+  coalesced?: boolean;
+  progress?: number;
+  currentPhase?: string;
+  etaMinutes?: number;
   message: string;
 }
 
@@ -27,19 +31,29 @@ export interface GovernanceSummary {
 export interface GovernanceResults {
   status: string;
   summary: GovernanceSummary;
+  runId?: string;
+  updatedAt?: string;
   message: string;
 }
 
+export interface ImpactedVisual {
+  workspaceName: string;
+  reportID: string;
+  reportName: string;
+  pageName: string;
+  visualId: string;
+  visualName: string;
+  via: string;
+}
+
 export interface ImpactAnalysis {
+  status: string;
   objectName: string;
   objectType: string;
-  impactedVisuals: Array<{
-    reportName: string;
-    pageName: string;
-    visualTitle: string;
-  }>;
-  impactedMeasures: string[];
-  impactedReports: string[];
+  impactedVisuals: ImpactedVisual[];
+  impactedFilters: Array<Record<string, unknown>>;
+  impactedMeasures: Array<Record<string, unknown>>;
+  impactedReports: Array<{ workspaceName: string; reportID: string; reportName: string }>;
   message: string;
 }
 
@@ -50,6 +64,8 @@ export class GovernanceClient {
   private baseUrl: string;
   private workspaceId: string;
   private lakehouseName: string;
+  // Last response per URL; re-requested with If-None-Match and reused on 304
+  private responseCache = new Map<string, { etag: string; body: unknown }>();
 
   constructor(workspaceId: string, lakehouseName: string, baseUrl?: string) {
     this.workspaceId = workspaceId;
@@ -57,6 +73,33 @@ export class GovernanceClient {
     this.baseUrl = baseUrl || '/api';
   }
 
+  /**
+   * GET a JSON resource, sending the cached ETag so unchanged results are not re-downloaded
+   */
+  private async getJson<T>(path: string): Promise<T> {
+    const url = `${this.baseUrl}${path}`;
+    const cached = this.responseCache.get(url);
+    const response = await fetch(url, {
+      headers: cached ? { 'If-None-Match': cached.etag } : {},
+    });
+
+    if (response.status === 304 && cached) {
+      return cached.body as T;
+    }
+    if (!response.ok) {
+      throw new Error(response.statusText);
+    }
+
+    const body = await response.json();
+    const etag = response.headers.get('ETag');
+    if (etag) {
+      this.responseCache.set(url, { etag, body });
+    } else {
+      this.responseCache.delete(url);
+    }
+    return body as T;
+  }
+
   /**
    * Trigger a governance analysis run
    */
@@ -71,32 +114,23 @@ export class GovernanceClient {
         maxParallelWorkers,
       };
 
-      // TODO: Implement actual API call when backend is ready
-      // const response = await fetch(`${this.baseUrl}/governance/analyze`, {
-      //   method: 'POST',
-      //   headers: {
-      //     'Content-Type': 'application/json',
-      //   },
-      //   body: JSON.stringify({
-      //     workspaceId: this.workspaceId,
-      //     lakehouseName: this.lakehouseName,
-      //     config,
-      //   }),
-      // });
-      //
-      // if (!response.ok) {
-      //   throw new Error(`Analysis failed: ${response.statusText}`);
-      // }
-      //
-      // return await response.json();
-
-      // Mock response for now
-      return {
-        status: 'initiated',
-        config,
-        runId: `run-${Date.now()}`,
-        message: 'Governance analysis initiated successfully',
-      };
+      const response = await fetch(`${this.baseUrl}/governance/analyze`, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+          workspaceId: this.workspaceId,
+          lakehouseName: this.lakehouseName,
+          config,
+        }),
+      });
+
+      if (!response.ok) {
+        throw new Error(`Analysis failed: ${response.statusText}`);
+      }
+
+      return await response.json();
     } catch (error) {
       throw new Error(`Failed to trigger analysis: ${error}`);
     }
@@ -107,21 +141,7 @@ export class GovernanceClient {
    */
   async getAnalysisStatus(runId: string): Promise<AnalysisResult> {
     try {
-      // TODO: Implement actual API call
-      // const response = await fetch(`${this.baseUrl}/governance/status/${runId}`);
-      //
-      // if (!response.ok) {
-      //   throw new Error(`Status check failed: ${response.statusText}`);
-      // }
-      //
-      // return await response.json();
-
-      // Mock response
-      return {
-        status: 'running',
-        runId,
-        message: 'Analysis in progress',
-      };
+      return await this.getJson<AnalysisResult>(`/governance/status/${encodeURIComponent(runId)}`);
     } catch (error) {
       throw new Error(`Failed to get analysis status: ${error}`);
     }
@@ -132,31 +152,8 @@ export class GovernanceClient {
    */
   async getResults(workspaceFilter?: string): Promise<GovernanceResults> {
     try {
-      // TODO: Implement actual API call
-      // const url = workspaceFilter
-      //   ? `${this.baseUrl}/governance/results?workspace=${workspaceFilter}`
-      //   : `${this.baseUrl}/governance/results`;
-      //
-      // const response = await fetch(url);
-      //
-      // if (!response.ok) {
-      //   throw new Error(`Failed to get results: ${response.statusText}`);
-      // }
-      //
-      // return await response.json();
-
-      // Mock response
-      return {
-        status: 'success',
-        summary: {
-          totalReports: 0,
-          totalModels: 0,
-          totalDataflows: 0,
-          unusedObjects: 0,
-          brokenVisuals: 0,
-        },
-        message: 'Results retrieved successfully',
-      };
+      const query = workspaceFilter ? `?workspace=${encodeURIComponent(workspaceFilter)}` : '';
+      return await this.getJson<GovernanceResults>(`/governance/results${query}`);
     } catch (error) {
       throw new Error(`Failed to get results: ${error}`);
     }
@@ -170,26 +167,9 @@ export class GovernanceClient {
     objectType: 'column' | 'measure' | 'table' = 'column'
   ): Promise<ImpactAnalysis> {
     try {
-      // TODO: Implement actual API call
-      // const response = await fetch(
-      //   `${this.baseUrl}/governance/impact?name=${objectName}&type=${objectType}`
-      // );
-      //
-      // if (!response.ok) {
-      //   throw new Error(`Impact analysis failed: ${response.statusText}`);
-      // }
-      //
-      // return await response.json();
-
-      // Mock response
-      return {
-        objectName,
-        objectType,
-        impactedVisuals: [],
-        impactedMeasures: [],
-        impactedReports: [],
-        message: 'Impact analysis completed',
-      };
+      return await this.getJson<ImpactAnalysis>(
+        `/governance/impact?name=${encodeURIComponent(objectName)}&type=${objectType}`
+      );
     } catch (error) {
       throw new Error(`Failed to get impact analysis: ${error}`);
     }
@@ -0,0 +1,1100 @@
+"""
+Record-and-replay harness for GovernanceNotebook.
+
+GovernanceNotebook captures every REST and sempy response into compressed fixture
+files when REST_RECORD_PATH is set (see "FIXTURE RECORDING" in Cell 0). This module
+serves those fixtures through local stand-ins for FabricRestClient, the
+sempy.fabric list_* functions, ReportWrapper and TOMWrapper, so the extractor
+cells can be run and benchmarked on a laptop with no network access.
+
+Simulated service behaviour (per-call latency and 429 throttling) is configurable,
+which makes it possible to measure extractor throughput and catch regressions.
+
+Example:
+    python fabric_replay.py --fixtures ./fixtures/20250101120000-ab12cd34 --cells 1 2 3 4 --latency-ms 40
+"""
+
+import argparse
+import gzip
+import io
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import types
+from collections import defaultdict
+from functools import reduce
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+import pandas as pd
+
+
+FIXTURE_KINDS = ("rest", "sempy", "tom")
+
+# Default notebook path (alongside this module)
+DEFAULT_NOTEBOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "GovernanceNotebook.py")
+
+# TOM properties whose values are .NET enums (read with .ToString() by the notebook)
+TOM_ENUM_FIELDS = ("Mode", "FromCardinality", "ToCardinality", "CrossFilteringBehavior")
+
+# TOM object types per snapshot collection (used for depends_on lookups)
+TOM_OBJECT_TYPES = {
+    "tables": "Table",
+    "calculation_groups": "Table",
+    "calculation_items": "CalculationItem",
+    "columns": "Column",
+    "calculated_columns": "Column",
+    "measures": "Measure",
+    "hierarchies": "Hierarchy",
+    "levels": "Level",
+    "partitions": "Partition",
+    "relationships": "Relationship"
+}
+
+
+def canonical_key(*parts: Any) -> str:
+    """Build a stable lookup key from JSON-serializable parts."""
+    return json.dumps(parts, sort_keys=True, default=str)
+
+
+def rest_key(method: str, path: str, body: Any = None) -> str:
+    """Lookup key for a REST call (method, client-relative path and JSON body)."""
+    path = path.split("://", 1)[-1].split("/", 1)[-1] if "://" in path else path
+    return canonical_key(method.upper(), path.lstrip("/"), body or {})
+
+
+def call_key(call: str, args: Iterable[Any], kwargs: Dict[str, Any], context: Optional[Dict[str, Any]] = None) -> str:
+    """Lookup key for a sempy / semantic-link-labs call."""
+    return canonical_key(call, list(args), kwargs or {}, context or {})
+
+
+# ==============================================================
+# FIXTURE STORE
+# ==============================================================
+
+class FixtureStore:
+    """
+    In-memory index of recorded fixtures.
+
+    Repeated recordings of the same request (e.g. long-running operation polls)
+    are served in order; the last one is repeated once exhausted.
+    """
+
+    def __init__(self):
+        self.rest = defaultdict(list)
+        self.calls = defaultdict(list)
+        self.models = {}
+        self.dependencies = {}
+        self._cursor = defaultdict(int)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str) -> "FixtureStore":
+        """
+        Load fixtures recorded by the notebook (or generated by synthetic_tenant.py).
+
+        Args:
+            path: Folder containing rest/sempy/tom .jsonl.gz files
+
+        Returns:
+            FixtureStore instance
+        """
+        store = cls()
+        for kind in FIXTURE_KINDS:
+            file_path = os.path.join(path, f"{kind}.jsonl.gz")
+            if not os.path.exists(file_path):
+                continue
+            with gzip.open(file_path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        store.add(kind, json.loads(line))
+        return store
+
+    def add(self, kind: str, entry: Dict[str, Any]) -> None:
+        """Index one fixture entry."""
+        if kind == "rest":
+            self.rest[rest_key(entry["method"], entry["path"], entry.get("body"))].append(entry)
+        elif kind == "sempy":
+            key = call_key(entry["call"], entry.get("args", []), entry.get("kwargs", {}), entry.get("context"))
+            self.calls[key].append(entry["result"])
+        elif kind == "tom" and entry.get("type") == "model":
+            self.models[(entry["dataset"], entry["workspace"])] = entry["model"]
+        elif kind == "tom" and entry.get("type") == "depends_on":
+            self.dependencies[(entry["dataset"], entry["workspace"], entry["object"])] = entry["result"]
+
+    def next_entry(self, index: Dict[str, List[Any]], key: str) -> Optional[Any]:
+        entries = index.get(key)
+        if not entries:
+            return None
+        with self._lock:
+            position = self._cursor[key]
+            self._cursor[key] = position + 1
+        return entries[min(position, len(entries) - 1)]
+
+
+class FixtureWriter:
+    """Write fixtures in the notebook's recording format (used by synthetic_tenant.py)."""
+
+    def __init__(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self._files = {kind: gzip.open(os.path.join(path, f"{kind}.jsonl.gz"), "wt", encoding="utf-8")
+                       for kind in FIXTURE_KINDS}
+
+    def rest(self, method: str, path: str, content: Any, status: int = 200,
+             body: Any = None, headers: Optional[Dict[str, str]] = None) -> None:
+        self._write("rest", {
+            "method": method,
+            "path": path,
+            "body": body,
+            "status": status,
+            "headers": headers or {"Content-Type": "application/json"},
+            "content": content if isinstance(content, str) else json.dumps(content)
+        })
+
+    def call(self, call: str, result: Any, kwargs: Optional[Dict[str, Any]] = None,
+             context: Optional[Dict[str, Any]] = None, args: Optional[List[Any]] = None) -> None:
+        if isinstance(result, pd.DataFrame):
+            serialized = {"type": "dataframe", "data": result.to_json(orient="split", date_format="iso")}
+        elif isinstance(result, BaseException):
+            serialized = {"type": "error", "error_type": type(result).__name__, "message": str(result)}
+        elif call == "ReportWrapper":
+            serialized = {"type": "object"}
+        else:
+            serialized = {"type": "json", "value": result}
+        self._write("sempy", {"call": call, "args": args or [], "kwargs": kwargs or {},
+                              "context": context or {}, "result": serialized})
+
+    def model(self, dataset: str, workspace: str, model: Dict[str, Any]) -> None:
+        self._write("tom", {"type": "model", "dataset": dataset, "workspace": workspace, "model": model})
+
+    def depends_on(self, dataset: str, workspace: str, object_key: str, result: List[Dict[str, Any]]) -> None:
+        self._write("tom", {"type": "depends_on", "dataset": dataset, "workspace": workspace,
+                            "object": object_key, "result": result})
+
+    def close(self) -> None:
+        for f in self._files.values():
+            f.close()
+
+    def _write(self, kind: str, entry: Dict[str, Any]) -> None:
+        self._files[kind].write(json.dumps(entry, default=str) + "\n")
+
+
+# ==============================================================
+# SIMULATED SERVICE BEHAVIOUR
+# ==============================================================
+
+class ServiceSimulator:
+    """Latency and 429 injection shared by all replay stand-ins."""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 throttle_rate: float = 0.0, retry_after_seconds: int = 1, seed: Optional[int] = None):
+        """
+        Args:
+            latency_ms: Base latency added to every call
+            jitter_ms: Uniform random jitter added on top of latency_ms
+            throttle_rate: Probability (0-1) that a REST call answers 429 Too Many Requests
+            retry_after_seconds: Retry-After value sent with injected 429 responses
+            seed: Random seed for reproducible runs
+        """
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.throttle_rate = throttle_rate
+        self.retry_after_seconds = retry_after_seconds
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.throttled = 0
+
+    def delay(self) -> None:
+        with self._lock:
+            self.calls += 1
+            jitter = self._random.uniform(0, self.jitter_ms) if self.jitter_ms else 0.0
+        if self.latency_ms or jitter:
+            time.sleep((self.latency_ms + jitter) / 1000.0)
+
+    def should_throttle(self) -> bool:
+        if not self.throttle_rate:
+            return False
+        with self._lock:
+            throttled = self._random.random() < self.throttle_rate
+            self.throttled += int(throttled)
+        return throttled
+
+
+# ==============================================================
+# REST STAND-IN
+# ==============================================================
+
+class ReplayResponse:
+    """Minimal requests.Response stand-in."""
+
+    def __init__(self, status_code: int, content: str = "", headers: Optional[Dict[str, str]] = None):
+        self.status_code = status_code
+        self.text = content or ""
+        self.content = self.text.encode("utf-8")
+        self.headers = headers or {}
+
+    def json(self) -> Any:
+        return json.loads(self.text)
+
+
+class ReplayFabricRestClient:
+    """FabricRestClient stand-in serving recorded REST responses."""
+
+    def __init__(self, store: FixtureStore, simulator: ServiceSimulator):
+        self.store = store
+        self.simulator = simulator
+
+    def get(self, path: str, **kwargs) -> ReplayResponse:
+        return self._serve("GET", path, None)
+
+    def post(self, path: str, json: Any = None, **kwargs) -> ReplayResponse:
+        return self._serve("POST", path, json)
+
+    def _serve(self, method: str, path: str, body: Any) -> ReplayResponse:
+        self.simulator.delay()
+        if self.simulator.should_throttle():
+            return ReplayResponse(429, '{"error": {"code": "TooManyRequests"}}',
+                                  {"Retry-After": str(self.simulator.retry_after_seconds)})
+        entry = self.store.next_entry(self.store.rest, rest_key(method, path, body))
+        if entry is None and "$top=" in path:
+            return self._serve_top(method, path, body)
+        if entry is None:
+            return ReplayResponse(404, json.dumps({"error": {"code": "NotRecorded", "message": f"{method} {path}"}}))
+        return ReplayResponse(entry["status"], entry.get("content", ""), entry.get("headers", {}))
+
+    def _serve_top(self, method: str, path: str, body: Any) -> ReplayResponse:
+        """Serve "<path>?$top=N" from a recording of <path> (first N entries of "value")."""
+        base, _, query = path.partition("?")
+        top = int(parse_qs(query).get("$top", ["0"])[0])
+        entry = self.store.next_entry(self.store.rest, rest_key(method, base, body))
+        if entry is None:
+            return ReplayResponse(404, json.dumps({"error": {"code": "NotRecorded", "message": f"{method} {path}"}}))
+        content = entry.get("content", "")
+        if entry["status"] == 200 and content:
+            payload = json.loads(content)
+            if isinstance(payload, dict) and isinstance(payload.get("value"), list):
+                content = json.dumps({**payload, "value": payload["value"][:top]})
+        return ReplayResponse(entry["status"], content, entry.get("headers", {}))
+
+
+# ==============================================================
+# SEMPY / SEMANTIC-LINK-LABS STAND-INS
+# ==============================================================
+
+class ReplayError(Exception):
+    """Raised in place of the exception recorded for a sempy call."""
+
+
+def serve_call(store: FixtureStore, simulator: ServiceSimulator, call: str,
+               args: Iterable[Any], kwargs: Dict[str, Any], context: Optional[Dict[str, Any]] = None) -> Any:
+    """Return (or raise) the recorded result of a sempy call."""
+    simulator.delay()
+    result = store.next_entry(store.calls, call_key(call, args, kwargs, context))
+    if result is None:
+        raise ReplayError(f"No fixture recorded for {call} {kwargs or list(args)} {context or ''}".rstrip())
+    if result["type"] == "error":
+        raise ReplayError(result["message"])
+    if result["type"] == "dataframe":
+        return pd.read_json(io.StringIO(result["data"]), orient="split")
+    if result["type"] == "json" and isinstance(result["value"], list):
+        return tuple(result["value"])
+    return result.get("value")
+
+
+class TomEnum:
+    """Stand-in for a .NET enum value."""
+
+    def __init__(self, value: str):
+        self.value = value
+
+    def ToString(self) -> str:
+        return self.value
+
+    def __str__(self) -> str:
+        return self.value
+
+
+class TomCollection(list):
+    """Stand-in for a .NET collection (supports len(), iteration and .Count)."""
+
+    @property
+    def Count(self) -> int:
+        return len(self)
+
+
+def build_tom_object(fields: Dict[str, Any], object_type: str) -> types.SimpleNamespace:
+    """Rebuild a TOM-like object from a snapshot row with dotted field paths."""
+    obj = types.SimpleNamespace(ObjectType=TomEnum(object_type))
+    for path, value in fields.items():
+        parts = path.split(".")
+        target = obj
+        for part in parts[:-1]:
+            if not hasattr(target, part):
+                setattr(target, part, types.SimpleNamespace())
+            target = getattr(target, part)
+        if parts[-1] in TOM_ENUM_FIELDS and value is not None:
+            value = TomEnum(value)
+        setattr(target, parts[-1], value)
+    return obj
+
+
+class ReplayTOMWrapper:
+    """TOMWrapper stand-in built from a recorded model snapshot."""
+
+    def __init__(self, store: FixtureStore, simulator: ServiceSimulator, dataset: str, workspace: str, **kwargs):
+        simulator.delay()
+        key = (dataset, workspace)
+        if key not in store.models:
+            # Opening the model failed while recording (or was never recorded): raise that error
+            serve_call(store, simulator, "TOMWrapper", [], {"dataset": dataset, "workspace": workspace, **kwargs})
+            raise ReplayError(f"No TOM snapshot recorded for {dataset} in {workspace}")
+        self._store = store
+        self._key = key
+        self._snapshot = store.models[key]
+        self._collections = {name: self._build(name) for name in TOM_OBJECT_TYPES}
+
+        tables = self._collections["tables"]
+        if isinstance(tables, TomCollection):
+            partitions = self._collections["partitions"]
+            for table in tables:
+                table.Partitions = TomCollection(
+                    p for p in (partitions if isinstance(partitions, TomCollection) else [])
+                    if p.Table.Name == table.Name
+                )
+        self.model = types.SimpleNamespace(
+            Tables=tables if isinstance(tables, TomCollection) else TomCollection(),
+            Relationships=self._collections["relationships"]
+        )
+
+    def _build(self, name: str) -> Any:
+        rows = self._snapshot.get(name, [])
+        if isinstance(rows, dict) and "error" in rows:
+            return ReplayError(rows["error"])
+        return TomCollection(build_tom_object(row, TOM_OBJECT_TYPES[name]) for row in rows)
+
+    def _all(self, name: str) -> TomCollection:
+        collection = self._collections[name]
+        if isinstance(collection, Exception):
+            raise collection
+        return collection
+
+    def all_calculation_groups(self): return self._all("calculation_groups")
+    def all_calculation_items(self): return self._all("calculation_items")
+    def all_columns(self): return self._all("columns")
+    def all_calculated_columns(self): return self._all("calculated_columns")
+    def all_measures(self): return self._all("measures")
+    def all_hierarchies(self): return self._all("hierarchies")
+    def all_levels(self): return self._all("levels")
+    def all_partitions(self): return self._all("partitions")
+
+    def depends_on(self, object: Any, dependencies: Any = None) -> List[types.SimpleNamespace]:
+        table = getattr(getattr(object, "Table", None), "Name", "") if hasattr(object, "Table") else ""
+        object_key = f"{object.ObjectType}|{table or ''}|{object.Name}"
+        recorded = self._store.dependencies.get(self._key + (object_key,), [])
+        return [build_tom_object(dep, dep["ObjectType"]) for dep in recorded]
+
+
+class ReplayReportWrapper:
+    """ReportWrapper stand-in serving recorded list_* DataFrames."""
+
+    def __init__(self, store: FixtureStore, simulator: ServiceSimulator, report: str, workspace: str, **kwargs):
+        self._store = store
+        self._simulator = simulator
+        self._context = {"report": report, "workspace": workspace}
+        serve_call(store, simulator, "ReportWrapper", [], {"report": report, "workspace": workspace})
+
+    def __getattr__(self, name: str):
+        if not name.startswith("list_"):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: serve_call(
+            self._store, self._simulator, f"ReportWrapper.{name}", args, kwargs, self._context
+        )
+
+
+# ==============================================================
+# MODULE INSTALLATION
+# ==============================================================
+
+SEMPY_MODULES = (
+    "sempy", "sempy.fabric", "sempy_labs", "sempy_labs.tom", "sempy_labs.report",
+    "sempy_labs._helper_functions", "sempy_labs._model_dependencies"
+)
+
+
+def install_replay(store: FixtureStore, simulator: Optional[ServiceSimulator] = None) -> ServiceSimulator:
+    """
+    Register replay stand-ins as the sempy / sempy_labs modules in sys.modules.
+
+    Args:
+        store: Loaded fixtures
+        simulator: Latency/throttling behaviour (default: none)
+
+    Returns:
+        The ServiceSimulator in use (exposes call and throttle counters)
+    """
+    simulator = simulator or ServiceSimulator()
+
+    def recorded_call(call: str):
+        return lambda *args, **kwargs: serve_call(store, simulator, call, args, kwargs)
+
+    fabric = types.ModuleType("sempy.fabric")
+    fabric.FabricRestClient = lambda *args, **kwargs: ReplayFabricRestClient(store, simulator)
+    fabric.__getattr__ = lambda name: recorded_call(f"fabric.{name}")
+
+    tom = types.ModuleType("sempy_labs.tom")
+    tom.TOMWrapper = lambda dataset, workspace, **kwargs: ReplayTOMWrapper(store, simulator, dataset, workspace, **kwargs)
+
+    report = types.ModuleType("sempy_labs.report")
+    report.ReportWrapper = lambda report, workspace, **kwargs: ReplayReportWrapper(store, simulator, report, workspace, **kwargs)
+
+    helpers = types.ModuleType("sempy_labs._helper_functions")
+    helpers.resolve_dataset_from_report = recorded_call("resolve_dataset_from_report")
+
+    dependencies = types.ModuleType("sempy_labs._model_dependencies")
+    dependencies.get_model_calc_dependencies = recorded_call("get_model_calc_dependencies")
+
+    sempy = types.ModuleType("sempy")
+    sempy.fabric = fabric
+    sempy_labs = types.ModuleType("sempy_labs")
+    sempy_labs.tom, sempy_labs.report = tom, report
+
+    sys.modules.update({
+        "sempy": sempy,
+        "sempy.fabric": fabric,
+        "sempy_labs": sempy_labs,
+        "sempy_labs.tom": tom,
+        "sempy_labs.report": report,
+        "sempy_labs._helper_functions": helpers,
+        "sempy_labs._model_dependencies": dependencies
+    })
+    return simulator
+
+
+# ==============================================================
+# LOCAL SPARK STAND-IN
+# ==============================================================
+
+def parse_in_condition(condition: str) -> Tuple[str, List[str], bool]:
+    """Split "<column> [NOT] IN ('a', 'b')" into the column, its values and whether it is negated."""
+    match = re.match(r"(?is)^\s*(\w+)\s+(NOT\s+)?IN\s*\((.*)\)\s*$", condition)
+    if not match:
+        raise NotImplementedError(f"Unsupported condition {condition!r}")
+    values = [value.replace("''", "'") for value in re.findall(r"'((?:[^']|'')*)'", match.group(3))]
+    return match.group(1), values, bool(match.group(2))
+
+
+def split_top_level(condition: str, keyword: str) -> List[str]:
+    """Split a condition on a keyword (e.g. OR) outside parentheses and string literals."""
+    parts, depth, quoted, start, i = [], 0, False, 0, 0
+    pattern = re.compile(rf"(?i)\s{keyword}\s")
+    while i < len(condition):
+        char = condition[i]
+        if char == "'":
+            quoted = not quoted
+        elif not quoted and char in "()":
+            depth += 1 if char == "(" else -1
+        elif not quoted and depth == 0:
+            match = pattern.match(condition, i)
+            if match:
+                parts.append(condition[start:i])
+                start = i = match.end()
+                continue
+        i += 1
+    return parts + [condition[start:]]
+
+
+def condition_mask(pdf: pd.DataFrame, condition: str) -> pd.Series:
+    """Rows matching "NOT (<c>)", "<c> OR <c>" and "<column> [NOT] IN (...)" conditions (nulls match no IN)."""
+    condition = condition.strip()
+    match = re.match(r"(?is)^NOT\s*\((.*)\)$", condition)
+    if match and len(split_top_level(condition, "OR")) == 1:
+        return ~condition_mask(pdf, match.group(1))
+    parts = split_top_level(condition, "OR")
+    if len(parts) > 1:
+        return reduce(lambda a, b: a | b, (condition_mask(pdf, part) for part in parts))
+    column, values, negated = parse_in_condition(condition)
+    matches = pdf[column].astype(str).isin(values)
+    return ~matches & pdf[column].notna() if negated else matches & pdf[column].notna()
+
+
+class LocalRow(tuple):
+    """Row returned by LocalSparkSession.sql(...).first()."""
+
+
+class LocalColumn:
+    """
+    Column expression stand-in (pyspark.sql.Column), evaluated against the pandas
+    frame of a LocalDataFrame. Comparisons with a null side are false, so
+    filters and when() branches skip them like Spark's null results do.
+    """
+
+    def __init__(self, name: str, evaluate):
+        self._name = name
+        self._evaluate = evaluate
+
+    def evaluate(self, pdf: pd.DataFrame) -> pd.Series:
+        value = self._evaluate(pdf)
+        if isinstance(value, pd.Series):
+            return value
+        return pd.Series([value] * len(pdf), index=pdf.index, dtype=object)
+
+    def alias(self, name: str) -> "LocalColumn":
+        return LocalColumn(name, self._evaluate)
+
+    def cast(self, data_type: str) -> "LocalColumn":
+        if data_type != "string":
+            raise NotImplementedError(f"LocalColumn.cast({data_type!r})")
+        return LocalColumn(self._name, lambda pdf: self.evaluate(pdf).map(lambda v: v if pd.isna(v) else str(v)))
+
+    def isin(self, values: Iterable[Any]) -> "LocalColumn":
+        values = list(values)
+        return LocalColumn(self._name, lambda pdf: self.evaluate(pdf).isin(values))
+
+    def isNull(self) -> "LocalColumn":
+        return LocalColumn(self._name, lambda pdf: self.evaluate(pdf).isna())
+
+    def isNotNull(self) -> "LocalColumn":
+        return LocalColumn(self._name, lambda pdf: self.evaluate(pdf).notna())
+
+    def _compare(self, other: Any, op) -> "LocalColumn":
+        def evaluate(pdf):
+            left, right = self.evaluate(pdf), as_column(other).evaluate(pdf)
+            return op(left, right).fillna(False).astype(bool) & left.notna() & right.notna()
+        return LocalColumn(self._name, evaluate)
+
+    def __eq__(self, other: Any) -> "LocalColumn":
+        return self._compare(other, lambda a, b: a == b)
+
+    def __ne__(self, other: Any) -> "LocalColumn":
+        return self._compare(other, lambda a, b: a != b)
+
+    def __and__(self, other: "LocalColumn") -> "LocalColumn":
+        return LocalColumn(self._name, lambda pdf: self.evaluate(pdf).astype(bool) & other.evaluate(pdf).astype(bool))
+
+    def __or__(self, other: "LocalColumn") -> "LocalColumn":
+        return LocalColumn(self._name, lambda pdf: self.evaluate(pdf).astype(bool) | other.evaluate(pdf).astype(bool))
+
+    def __invert__(self) -> "LocalColumn":
+        return LocalColumn(self._name, lambda pdf: ~self.evaluate(pdf).fillna(False).astype(bool))
+
+    def when(self, condition: "LocalColumn", value: Any) -> "LocalColumn":
+        """Further branch of a functions.when() chain."""
+        return local_when(self._branches + [(condition, as_column(value))])
+
+    def otherwise(self, value: Any) -> "LocalColumn":
+        return local_when(self._branches, as_column(value))
+
+
+def as_column(value: Any) -> LocalColumn:
+    """Wrap a literal as a LocalColumn (columns are returned unchanged)."""
+    return value if isinstance(value, LocalColumn) else LocalColumn(str(value), lambda pdf: value)
+
+
+def local_when(branches: List[Tuple[LocalColumn, LocalColumn]], default: Optional[LocalColumn] = None) -> LocalColumn:
+    """CASE WHEN stand-in: the value of the first branch whose condition holds, else the default (or null)."""
+    def evaluate(pdf):
+        result = default.evaluate(pdf).astype(object) if default is not None else pd.Series([None] * len(pdf), index=pdf.index, dtype=object)
+        decided = pd.Series(False, index=pdf.index)
+        for condition, value in branches:
+            take = condition.evaluate(pdf).fillna(False).astype(bool) & ~decided
+            result = result.where(~take, value.evaluate(pdf))
+            decided |= take
+        return result
+    column = LocalColumn("CASE", evaluate)
+    column._branches = branches
+    return column
+
+
+class LocalAggregate:
+    """Aggregate expression stand-in (functions.collect_set) for LocalGroupedData.agg."""
+
+    def __init__(self, name: str, column: LocalColumn, reduce):
+        self._name = name
+        self.column = column
+        self.reduce = reduce
+
+    def alias(self, name: str) -> "LocalAggregate":
+        return LocalAggregate(name, self.column, self.reduce)
+
+
+def collect_set_values(values: Iterable[Any]) -> List[Any]:
+    """Distinct non-null values of a group, sorted so replays are deterministic."""
+    distinct = {tuple(v) if isinstance(v, list) else v for v in values if isinstance(v, list) or not pd.isna(v)}
+    return [list(v) if isinstance(v, tuple) else v for v in sorted(distinct, key=repr)]
+
+
+def functions_col(column: Any) -> LocalColumn:
+    """Column name or LocalColumn argument of a functions.* call."""
+    return column if isinstance(column, LocalColumn) else LocalColumn(column, lambda pdf: pdf[column])
+
+
+def map_values(name: str, column: Any, function) -> LocalColumn:
+    """Column of function(value) for non-null values (null stays null)."""
+    column = functions_col(column)
+    return LocalColumn(name, lambda pdf: column.evaluate(pdf).map(
+        lambda v: function(v) if isinstance(v, list) or not pd.isna(v) else None).astype(object))
+
+
+def local_functions_module() -> types.ModuleType:
+    """pyspark.sql.functions stand-in with the functions the notebook uses on LocalDataFrames."""
+    functions = types.ModuleType("pyspark.sql.functions")
+    functions.col = lambda name: LocalColumn(name, lambda pdf: pdf[name])
+    functions.lit = lambda value: as_column(value).alias(str(value))
+    functions.when = lambda condition, value: local_when([(condition, as_column(value))])
+    functions.coalesce = lambda *cols: LocalColumn("coalesce", lambda pdf: reduce(
+        lambda result, values: result.where(result.notna(), values), [col.evaluate(pdf).astype(object) for col in cols]))
+    functions.concat_ws = lambda sep, *cols: LocalColumn("concat_ws", lambda pdf: pd.concat(
+        [col.evaluate(pdf) for col in cols], axis=1).apply(lambda row: sep.join(str(v) for v in row if not pd.isna(v)), axis=1)
+        if len(pdf) else pd.Series([], index=pdf.index, dtype=object))
+    functions.array = lambda *cols: LocalColumn("array", lambda pdf: pd.Series(
+        [list(values) for values in zip(*[functions_col(col).evaluate(pdf) for col in cols])], index=pdf.index, dtype=object))
+    functions.collect_set = lambda col: LocalAggregate("collect_set", functions_col(col), collect_set_values)
+    functions.to_json = lambda col: map_values("to_json", col, lambda v: json.dumps(v, separators=(",", ":")))
+    functions.size = lambda col: map_values("size", col, lambda v: len(v) if isinstance(v, list) else -1)
+    return functions
+
+
+def install_local_spark() -> None:
+    """Register the functions stand-in as pyspark.sql.functions (shadows an installed pyspark)."""
+    functions = local_functions_module()
+    sql = types.ModuleType("pyspark.sql")
+    sql.functions = functions
+    pyspark = types.ModuleType("pyspark")
+    pyspark.sql = sql
+    sys.modules.update({"pyspark": pyspark, "pyspark.sql": sql, "pyspark.sql.functions": functions})
+
+
+class LocalDataFrame:
+    """Minimal Spark DataFrame stand-in backed by pandas."""
+
+    def __init__(self, session: "LocalSparkSession", pdf: pd.DataFrame):
+        self._session = session
+        self._pdf = pdf
+
+    def filter(self, condition: Any) -> "LocalDataFrame":
+        """Supports LocalColumn conditions, "1=0" and the IN conditions of condition_mask."""
+        if isinstance(condition, LocalColumn):
+            return LocalDataFrame(self._session, self._pdf[condition.evaluate(self._pdf).fillna(False).astype(bool)])
+        if condition.replace(" ", "") == "1=0":
+            return LocalDataFrame(self._session, self._pdf.iloc[0:0])
+        return LocalDataFrame(self._session, self._pdf[condition_mask(self._pdf, condition)])
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self._pdf.columns)
+
+    def select(self, *cols: Any) -> "LocalDataFrame":
+        """Column names or LocalColumn expressions."""
+        if all(isinstance(col, str) for col in cols):
+            return LocalDataFrame(self._session, self._pdf[list(cols)])
+        pdf = pd.DataFrame(index=self._pdf.index)
+        for col in cols:
+            if isinstance(col, str):
+                pdf[col] = self._pdf[col]
+            else:
+                pdf[col._name] = col.evaluate(self._pdf)
+        return LocalDataFrame(self._session, pdf)
+
+    def join(self, other: "LocalDataFrame", on: Any, how: str = "inner") -> "LocalDataFrame":
+        """Equi-join on column name(s); how is inner, left, full_outer/outer or left_anti."""
+        on = [on] if isinstance(on, str) else list(on)
+        if how == "left_anti":
+            keys = pd.MultiIndex.from_frame(other._pdf[on]) if len(on) > 1 else other._pdf[on[0]]
+            own = pd.MultiIndex.from_frame(self._pdf[on]) if len(on) > 1 else self._pdf[on[0]]
+            return LocalDataFrame(self._session, self._pdf[~pd.Series(own.isin(keys), index=self._pdf.index)])
+        how = {"full_outer": "outer", "full": "outer", "outer": "outer", "left": "left", "inner": "inner"}[how]
+        return LocalDataFrame(self._session, self._pdf.merge(other._pdf, on=on, how=how))
+
+    def selectExpr(self, *exprs: str) -> "LocalDataFrame":
+        """Supports "*", column names ("Name" or "`Name`") and string literals ("'value' AS Name")."""
+        pdf = pd.DataFrame(index=self._pdf.index)
+        for expr in exprs:
+            if expr.strip() == "*":
+                pdf = pd.concat([pdf, self._pdf], axis=1)
+                continue
+            column = expr.strip().strip("`")
+            if column in self._pdf.columns:
+                pdf[column] = self._pdf[column]
+                continue
+            match = re.match(r"(?is)^\s*'((?:[^']|'')*)'\s+AS\s+(\w+)\s*$", expr)
+            if not match:
+                raise NotImplementedError(f"LocalDataFrame.selectExpr({expr!r})")
+            pdf[match.group(2)] = match.group(1).replace("''", "'")
+        return LocalDataFrame(self._session, pdf)
+
+    def distinct(self) -> "LocalDataFrame":
+        return LocalDataFrame(self._session, self._pdf.drop_duplicates())
+
+    def dropDuplicates(self, subset: Optional[List[str]] = None) -> "LocalDataFrame":
+        return LocalDataFrame(self._session, self._pdf.drop_duplicates(subset))
+
+    def groupBy(self, *cols: str) -> "LocalGroupedData":
+        return LocalGroupedData(self._session, self._pdf, list(cols))
+
+    def createOrReplaceTempView(self, name: str) -> None:
+        with self._session._lock:
+            self._session.views[name] = self._pdf
+
+    def count(self) -> int:
+        return len(self._pdf)
+
+    def first(self) -> Optional[LocalRow]:
+        return LocalRow(self._pdf.iloc[0].tolist()) if len(self._pdf) else None
+
+    def collect(self) -> List[LocalRow]:
+        return [LocalRow(row) for row in self._pdf.itertuples(index=False)]
+
+    def toPandas(self) -> pd.DataFrame:
+        return self._pdf.copy()
+
+    def unionByName(self, other: "LocalDataFrame", allowMissingColumns: bool = False) -> "LocalDataFrame":
+        if not allowMissingColumns and set(self._pdf.columns) != set(other._pdf.columns):
+            raise ValueError("unionByName: column sets differ")
+        return LocalDataFrame(self._session, pd.concat([self._pdf, other._pdf], ignore_index=True))
+
+    @property
+    def write(self) -> "LocalWriter":
+        return LocalWriter(self._session, self._pdf)
+
+
+class LocalGroupedData:
+    """GroupedData stand-in for count() and agg()."""
+
+    def __init__(self, session: "LocalSparkSession", pdf: pd.DataFrame, cols: List[str]):
+        self._session = session
+        self._pdf = pdf
+        self._cols = cols
+
+    def count(self) -> LocalDataFrame:
+        sizes = self._pdf.groupby(self._cols, dropna=False).size()
+        return LocalDataFrame(self._session, sizes.rename("count").reset_index())
+
+    def agg(self, *exprs: Any) -> LocalDataFrame:
+        """{column: "max" | ...} or LocalAggregate expressions (functions.collect_set)."""
+        if len(exprs) == 1 and isinstance(exprs[0], dict):
+            grouped = self._pdf.groupby(self._cols, dropna=False)
+            pdf = pd.DataFrame({f"{fn}({column})": grouped[column].agg(fn) for column, fn in exprs[0].items()})
+            return LocalDataFrame(self._session, pdf.reset_index())
+        values = [expr.column.evaluate(self._pdf).tolist() for expr in exprs]
+        rows = []
+        for key, positions in self._pdf.groupby(self._cols, dropna=False, sort=False).indices.items():
+            key = key if isinstance(key, tuple) else (key,)
+            rows.append(list(key) + [expr.reduce([column[i] for i in positions]) for expr, column in zip(exprs, values)])
+        return LocalDataFrame(self._session, pd.DataFrame(rows, columns=self._cols + [expr._name for expr in exprs]))
+
+
+class LocalWriter:
+    """DataFrameWriter stand-in that keeps written tables in memory."""
+
+    def __init__(self, session: "LocalSparkSession", pdf: pd.DataFrame):
+        self._session = session
+        self._pdf = pdf
+        self._mode = "errorifexists"
+        self._replace_where = None
+
+    def mode(self, mode: str) -> "LocalWriter":
+        self._mode = mode
+        return self
+
+    def option(self, key: str, value: Any = None) -> "LocalWriter":
+        if key == "replaceWhere":
+            self._replace_where = value
+        return self
+
+    def options(self, **kwargs) -> "LocalWriter":
+        return self
+
+    def format(self, fmt: str) -> "LocalWriter":
+        return self
+
+    def partitionBy(self, *cols) -> "LocalWriter":
+        return self
+
+    def saveAsTable(self, name: str) -> None:
+        if self._replace_where and self._mode == "overwrite":
+            self._session.replace_where(name, self._pdf, self._replace_where)
+        else:
+            self._session.save_table(name, self._pdf, self._mode)
+
+
+class LocalSparkSession:
+    """
+    Stand-in for the `spark` session used by the notebook cells.
+
+    Written tables are kept in memory (see `tables`); SQL statements other than
+    the catalog lookup, table reads, DESCRIBE DETAIL (one file per table), DROP
+    TABLE IF EXISTS, DELETE FROM ... WHERE <column> < '<value>' and MERGE INTO
+    ... USING <temp view> ON t.<key> <=> s.<key> AND ... WHEN MATCHED THEN
+    UPDATE SET * WHEN NOT MATCHED THEN INSERT * are accepted and ignored.
+    """
+
+    def __init__(self, catalog: str = "replay", conf: Optional[Dict[str, str]] = None):
+        self.catalog = catalog
+        self.tables = {}
+        self.views = {}
+        self._lock = threading.Lock()
+        self._conf = dict(conf or {})
+        self.conf = types.SimpleNamespace(get=lambda key, default=None: self._conf.get(key, default),
+                                          set=lambda key, value: self._conf.__setitem__(key, value))
+
+    def createDataFrame(self, data: Any, schema: Any = None) -> LocalDataFrame:
+        return LocalDataFrame(self, data if isinstance(data, pd.DataFrame) else pd.DataFrame(data))
+
+    def save_table(self, name: str, pdf: pd.DataFrame, mode: str) -> None:
+        with self._lock:
+            if mode == "append" and name in self.tables:
+                self.tables[name] = pd.concat([self.tables[name], pdf], ignore_index=True)
+            else:
+                self.tables[name] = pdf.reset_index(drop=True)
+
+    def replace_where(self, name: str, pdf: pd.DataFrame, condition: str) -> None:
+        """Delta replaceWhere for the IN conditions of condition_mask."""
+        with self._lock:
+            existing = self.tables.get(name)
+            if existing is not None:
+                existing = existing[~condition_mask(existing, condition)]
+                pdf = pd.concat([existing, pdf], ignore_index=True)
+            self.tables[name] = pdf.reset_index(drop=True)
+
+    def table(self, name: str) -> LocalDataFrame:
+        if name not in self.tables:
+            raise ValueError(f"Table or view not found: {name}")
+        return LocalDataFrame(self, self.tables[name])
+
+    def sql(self, statement: str) -> LocalDataFrame:
+        if re.match(r"(?is)^\s*SELECT\s+current_catalog\(\)\s*$", statement):
+            return LocalDataFrame(self, pd.DataFrame({"catalog": [self.catalog]}))
+        match = re.match(r"(?is)^\s*SELECT\s+\*\s+FROM\s+([\w.`]+)\s*$", statement)
+        if match:
+            return self.table(match.group(1).replace("`", ""))
+        match = re.match(r"(?is)^\s*DROP\s+TABLE\s+IF\s+EXISTS\s+([\w.`]+)\s*$", statement)
+        if match:
+            with self._lock:
+                self.tables.pop(match.group(1).replace("`", ""), None)
+        match = re.match(r"(?is)^\s*DESCRIBE\s+DETAIL\s+([\w.`]+)\s*$", statement)
+        if match:
+            pdf = self.table(match.group(1).replace("`", "")).toPandas()
+            return LocalDataFrame(self, pd.DataFrame({"numFiles": [1], "sizeInBytes": [int(pdf.memory_usage(deep=True).sum())]}))
+        match = re.match(r"(?is)^\s*DELETE\s+FROM\s+([\w.`]+)\s+WHERE\s+(\w+)\s*<\s*'([^']*)'\s*$", statement)
+        if match:
+            name = match.group(1).replace("`", "")
+            with self._lock:
+                if name in self.tables:
+                    pdf = self.tables[name]
+                    self.tables[name] = pdf[~(pdf[match.group(2)].astype(str) < match.group(3))].reset_index(drop=True)
+        match = re.match(r"(?is)^\s*MERGE\s+INTO\s+([\w.`]+)\s+\w+\s+USING\s+(\w+)\s+\w+\s+ON\s+(.*?)\s+"
+                         r"WHEN\s+MATCHED\s+THEN\s+UPDATE\s+SET\s+\*\s+WHEN\s+NOT\s+MATCHED\s+THEN\s+INSERT\s+\*\s*$", statement)
+        if match:
+            name = match.group(1).replace("`", "")
+            keys = re.findall(r"\w+\.(\w+)\s*<=>\s*\w+\.\w+", match.group(3))
+            with self._lock:
+                merged = pd.concat([self.tables[name], self.views[match.group(2)]], ignore_index=True)
+                self.tables[name] = merged.drop_duplicates(keys, keep="last").reset_index(drop=True)
+        return LocalDataFrame(self, pd.DataFrame())
+
+
+# ==============================================================
+# NOTEBOOK RUNNER
+# ==============================================================
+
+def split_notebook_cells(source: str) -> Dict[str, str]:
+    """
+    Split the notebook into its parameter block and numbered cells.
+
+    Returns:
+        Dictionary mapping "parameters", "0", "1", ... to cell source
+    """
+    parts = re.split(r"(?m)^# In\[(\d+)\]:\s*$", source)
+    cells = {"parameters": parts[0]}
+    for number, body in zip(parts[1::2], parts[2::2]):
+        cells[number] = body
+    return cells
+
+
+class LocalShell:
+    """Stand-in for the notebook's IPython shell: magics are ignored, custom exception handlers are kept."""
+
+    def __init__(self):
+        self.custom_exceptions: Tuple[type, ...] = ()
+        self.custom_exc_handler = None
+
+    def run_line_magic(self, *args, **kwargs) -> None:
+        return None
+
+    def set_custom_exc(self, exc_tuple: Tuple[type, ...], handler) -> None:
+        self.custom_exceptions = exc_tuple
+        self.custom_exc_handler = handler
+
+    def showtraceback(self, exc_tuple=None, tb_offset=None) -> None:
+        return None  # run_notebook_cells re-raises the exception
+
+
+def run_notebook_cells(
+    cells: Iterable[int],
+    spark: Optional[LocalSparkSession] = None,
+    overrides: Optional[Dict[str, Any]] = None,
+    notebook_path: str = DEFAULT_NOTEBOOK_PATH,
+    namespace: Optional[Dict[str, Any]] = None,
+    profile_memory: bool = False
+) -> Dict[str, Any]:
+    """
+    Execute notebook cells locally (replay modules must be installed first).
+
+    The parameter block and Cell 0 always run first; configuration overrides are
+    applied after the parameter block, like pipeline parameters in Fabric.
+
+    Args:
+        cells: Cell numbers to run after Cell 0 (e.g. [1, 2, 3, 4])
+        spark: LocalSparkSession to expose as `spark` (default: a new one)
+        overrides: Notebook configuration values to override
+        notebook_path: Path to GovernanceNotebook.py
+        namespace: Existing globals to run in (default: a new namespace)
+        profile_memory: Track peak Python heap per cell with tracemalloc (slows execution)
+
+    Returns:
+        Dictionary with the namespace, the spark stand-in, per-cell wall seconds
+        and (when profiling) per-cell peak memory in MB
+    """
+    with open(notebook_path, encoding="utf-8") as f:
+        notebook_cells = split_notebook_cells(f.read())
+
+    spark = spark or LocalSparkSession()
+    install_local_spark()
+    namespace = namespace if namespace is not None else {"__name__": "__governance_notebook__"}
+    namespace.setdefault("spark", spark)
+    shell = LocalShell()
+    namespace.setdefault("get_ipython", lambda: shell)
+
+    if profile_memory:
+        tracemalloc.start()
+
+    timings = {}
+    peak_memory_mb = {}
+    try:
+        for cell in ["parameters", "0"] + [str(c) for c in cells]:
+            if cell not in notebook_cells:
+                raise ValueError(f"Notebook has no cell {cell}")
+            if profile_memory:
+                tracemalloc.reset_peak()
+            t0 = time.perf_counter()
+            try:
+                exec(compile(notebook_cells[cell], f"{notebook_path}#cell{cell}", "exec"), namespace)
+            except BaseException as e:
+                # Like IPython: the handler a cell registered sees exceptions of later cells
+                shell = namespace["get_ipython"]()
+                if isinstance(shell, LocalShell) and isinstance(e, shell.custom_exceptions):
+                    shell.custom_exc_handler(shell, type(e), e, e.__traceback__)
+                raise
+            timings[cell] = time.perf_counter() - t0
+            if profile_memory:
+                peak_memory_mb[cell] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            if cell == "parameters":
+                namespace.update(overrides or {})
+    finally:
+        if profile_memory:
+            tracemalloc.stop()
+
+    return {"namespace": namespace, "spark": spark, "timings": timings, "peak_memory_mb": peak_memory_mb}
+
+
+MANIFEST_FILE = "manifest.json"
+
+
+def load_manifest(path: str) -> Dict[str, Any]:
+    """Read the optional manifest.json written next to generated fixtures (spark conf, item counts)."""
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def parse_param_overrides(params: List[str]) -> Dict[str, Any]:
+    """Parse NAME=VALUE arguments into notebook overrides (JSON values, else strings)."""
+    overrides = {}
+    for param in params:
+        name, sep, value = param.partition("=")
+        if not sep or not name.strip():
+            raise ValueError(f"Invalid --param '{param}' (expected NAME=VALUE)")
+        try:
+            overrides[name.strip()] = json.loads(value)
+        except ValueError:
+            overrides[name.strip()] = value
+    return overrides
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay recorded Fabric fixtures through GovernanceNotebook cells.")
+    parser.add_argument("--fixtures", required=True, help="Folder containing rest/sempy/tom .jsonl.gz fixtures")
+    parser.add_argument("--cells", type=int, nargs="+", default=[1, 2, 3, 4], help="Cells to run after Cell 0")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Simulated latency per call")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Random extra latency per call")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Probability of injecting a 429 per REST call")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with injected 429s")
+    parser.add_argument("--workers", type=int, default=5, help="MAX_PARALLEL_WORKERS for the run")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for latency/throttling")
+    parser.add_argument("--profile-memory", action="store_true", help="Report peak Python heap per cell (tracemalloc)")
+    parser.add_argument("--summary-json", default="", help="Also write the summary to this JSON file")
+    parser.add_argument("--notebook", default=DEFAULT_NOTEBOOK_PATH, help="Path to GovernanceNotebook.py")
+    parser.add_argument("--state-path", default="", help="RUN_STATE_PATH for the run (default: a temporary folder)")
+    parser.add_argument("--param", action="append", default=[], metavar="NAME=VALUE",
+                        help="Override a notebook parameter (VALUE is parsed as JSON, else taken as a string)")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    store = FixtureStore.load(args.fixtures)
+    load_seconds = time.perf_counter() - t0
+    manifest = load_manifest(args.fixtures)
+    simulator = install_replay(store, ServiceSimulator(args.latency_ms, args.jitter_ms, args.throttle_rate,
+                                                       args.retry_after, args.seed))
+
+    with tempfile.TemporaryDirectory() as temp_state_path:
+        overrides = {"MAX_PARALLEL_WORKERS": args.workers, "RUN_STATE_PATH": args.state_path or temp_state_path}
+        overrides.update(parse_param_overrides(args.param))
+        result = run_notebook_cells(
+            args.cells,
+            spark=LocalSparkSession(conf=manifest.get("spark_conf")),
+            overrides=overrides,
+            notebook_path=args.notebook,
+            profile_memory=args.profile_memory
+        )
+
+    summary = {
+        "fixtures": args.fixtures,
+        "fixture_load_seconds": load_seconds,
+        "cells": {
+            cell: {"wall_seconds": seconds, "peak_memory_mb": result["peak_memory_mb"].get(cell)}
+            for cell, seconds in result["timings"].items()
+        },
+        "calls_served": simulator.calls,
+        "throttled": simulator.throttled,
+        "tables": {name: len(pdf) for name, pdf in sorted(result["spark"].tables.items())}
+    }
+
+    print("\n" + "=" * 80)
+    print("REPLAY SUMMARY")
+    print("=" * 80)
+    print(f"  Fixtures loaded in {load_seconds:.2f} sec")
+    for cell, stats in summary["cells"].items():
+        memory = f"  peak {stats['peak_memory_mb']:8.1f} MB" if stats["peak_memory_mb"] is not None else ""
+        print(f"  Cell {cell:<10} {stats['wall_seconds']:8.2f} sec{memory}")
+    print(f"  Calls served: {simulator.calls} (429 injected: {simulator.throttled})")
+    for name, rows in summary["tables"].items():
+        print(f"  {name}: {rows} rows")
+
+    if args.summary_json:
+        with open(args.summary_json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
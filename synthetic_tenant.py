@@ -0,0 +1,660 @@
+"""
+Synthetic tenant generator and scale benchmark for GovernanceNotebook.
+
+Generates a fake Power BI / Fabric tenant (workspaces, datasets with TOM-like
+tables/columns/measures/dependencies, reports with pages/visuals/filters,
+Gen1/Gen2 dataflows with M documents, apps and refresh histories) and writes it
+in the fixture format served by fabric_replay.py. Item counts are drawn from
+tunable, heavy-tailed size distributions so a handful of workspaces and models
+are much larger than the rest, as in real tenants.
+
+The benchmark replays each generated tenant through the notebook cells and reports
+wall time and peak memory per cell at every scale point.
+
+Example:
+    python synthetic_tenant.py generate --workspaces 1000 --output ./tenants/1000
+    python synthetic_tenant.py benchmark --scales 100 1000 10000 --work-dir ./bench
+"""
+
+import argparse
+import base64
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from fabric_replay import MANIFEST_FILE, FixtureWriter
+
+
+DEFAULT_SCALES = [100, 1000, 10000]
+
+# Mean item counts per parent; actual counts are drawn from a lognormal with the
+# given spread (0 = every parent gets exactly the mean)
+DEFAULT_PROFILE = {
+    "datasets_per_workspace": 3.0,
+    "reports_per_workspace": 4.0,
+    "gen1_dataflows_per_workspace": 0.5,
+    "gen2_dataflows_per_workspace": 0.5,
+    "other_items_per_workspace": 2.0,
+    "tables_per_model": 8.0,
+    "columns_per_table": 10.0,
+    "measures_per_model": 20.0,
+    "calculated_columns_per_model": 4.0,
+    "calculation_groups_per_model": 0.2,
+    "calculation_items_per_group": 3.0,
+    "hierarchies_per_model": 1.0,
+    "dependencies_per_calculation": 2.0,
+    "pages_per_report": 5.0,
+    "visuals_per_page": 8.0,
+    "objects_per_visual": 3.0,
+    "filters_per_visual": 0.5,
+    "report_level_measures_per_report": 1.0,
+    "bookmarks_per_report": 1.0,
+    "refreshes_per_dataset": 20.0,
+    "refreshes_per_dataflow": 10.0,
+    "queries_per_dataflow": 5.0,
+    "reports_per_app": 3.0,
+    "spread": 0.8,
+    # Fractions / probabilities
+    "app_workspace_ratio": 0.1,
+    "gen2_lro_rate": 0.05,
+    "model_error_rate": 0.01,
+    "report_error_rate": 0.01,
+    "broken_reference_rate": 0.02
+}
+
+HOME_LAKEHOUSE_NAME = "ImpactIQ"
+VISUAL_TYPES = ["tableEx", "pivotTable", "clusteredColumnChart", "lineChart", "card", "slicer", "barChart", "map"]
+DATASOURCE_TYPES = ["Sql", "AnalysisServices", "SharePointList", "Web", "File", "Lakehouse"]
+OTHER_ITEM_TYPES = ["Lakehouse", "Warehouse", "Notebook", "DataPipeline", "Eventhouse", "Environment"]
+
+
+def draw_count(rng: random.Random, mean: float, spread: float, minimum: int = 0) -> int:
+    """
+    Draw an item count from a mean-preserving lognormal distribution.
+
+    Args:
+        rng: Random generator
+        mean: Mean count
+        spread: Lognormal sigma (0 = always the mean)
+        minimum: Lower bound
+
+    Returns:
+        Non-negative integer count
+    """
+    if mean <= 0:
+        return minimum
+    if spread <= 0:
+        value = mean
+    else:
+        value = rng.lognormvariate(math.log(mean) - spread ** 2 / 2, spread)
+    # Fractional means (e.g. 0.5 dataflows per workspace) round stochastically
+    count = int(value) + (1 if rng.random() < value - int(value) else 0)
+    return max(minimum, count)
+
+
+class SyntheticTenantGenerator:
+    """Generate a synthetic tenant into replay fixtures."""
+
+    def __init__(self, workspaces: int, seed: int = 0, profile: Optional[Dict[str, float]] = None,
+                 report_date: Optional[datetime] = None):
+        """
+        Args:
+            workspaces: Number of workspaces to generate
+            seed: Random seed (same seed + profile = same tenant)
+            profile: Overrides for DEFAULT_PROFILE
+            report_date: Date refresh histories end on (default: today)
+        """
+        self.workspaces = workspaces
+        self.rng = random.Random(seed)
+        self.profile = {**DEFAULT_PROFILE, **(profile or {})}
+        self.report_date = report_date or datetime.now()
+        self.counts = {}
+        self.model_fields = {}
+
+    def count(self, key: str, minimum: int = 0) -> int:
+        return draw_count(self.rng, self.profile[key], self.profile["spread"], minimum)
+
+    def chance(self, key: str) -> bool:
+        return self.rng.random() < self.profile[key]
+
+    def new_id(self) -> str:
+        return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+
+    def tally(self, key: str, amount: int = 1) -> None:
+        self.counts[key] = self.counts.get(key, 0) + amount
+
+    def generate(self, path: str) -> Dict[str, Any]:
+        """
+        Write the tenant to path as rest/sempy/tom fixtures plus manifest.json.
+
+        Returns:
+            The manifest (spark conf for the replay and generated item counts)
+        """
+        writer = FixtureWriter(path)
+        try:
+            workspaces = [{"Id": self.new_id(), "Name": f"Workspace {i:05d}", "Type": "Workspace",
+                           "Capacity Id": self.new_id()} for i in range(self.workspaces)]
+            writer.call("fabric.list_workspaces", pd.DataFrame(workspaces))
+            self.tally("workspaces", len(workspaces))
+
+            apps = []
+            for ws in workspaces:
+                report_ids = self.generate_workspace(writer, ws)
+                if report_ids and self.chance("app_workspace_ratio"):
+                    apps.append(self.generate_app(writer, ws, report_ids))
+            writer.rest("GET", "v1.0/myorg/apps", {"value": apps})
+
+            home = workspaces[0] if workspaces else {"Id": self.new_id()}
+            self.generate_sql_endpoints(writer, home["Id"])
+        finally:
+            writer.close()
+
+        manifest = {
+            "generated_at": datetime.now().isoformat(),
+            "profile": self.profile,
+            "counts": self.counts,
+            "spark_conf": {
+                "trident.workspace.id": home["Id"],
+                "trident.lakehouse.name": HOME_LAKEHOUSE_NAME,
+                "trident.tenant.id": "00000000-0000-0000-0000-000000000000"
+            }
+        }
+        with open(os.path.join(path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        return manifest
+
+    # -------------------- Workspaces --------------------
+
+    def generate_workspace(self, writer: FixtureWriter, ws: Dict[str, str]) -> List[Dict[str, str]]:
+        ws_id, ws_name = ws["Id"], ws["Name"]
+        # Reports only bind to models in their own workspace
+        self.model_fields = {}
+
+        datasets = []
+        for i in range(self.count("datasets_per_workspace")):
+            dataset = {"Dataset ID": self.new_id(), "Dataset Name": f"Model {i:03d} ({ws_name})"}
+            datasets.append(dataset)
+            self.generate_dataset(writer, ws_id, ws_name, dataset)
+        writer.call("fabric.list_datasets", pd.DataFrame([{
+            **d,
+            "Description": "",
+            "Web URL": f"https://app.powerbi.com/groups/{ws_id}/datasets/{d['Dataset ID']}",
+            "Configured By": "owner@contoso.com",
+            "Is Refreshable": True,
+            "Target Storage Mode": "Abf",
+            "Created Date": self.timestamp(days_ago=self.rng.randint(30, 900))
+        } for d in datasets]), kwargs={"workspace": ws_name})
+
+        reports = []
+        for i in range(self.count("reports_per_workspace")):
+            dataset = self.rng.choice(datasets) if datasets else None
+            report = {"Id": self.new_id(), "Name": f"Report {i:03d} ({ws_name})",
+                      "Dataset Id": dataset["Dataset ID"] if dataset else self.new_id()}
+            reports.append(report)
+            self.generate_report(writer, ws_id, ws_name, report, dataset)
+        writer.call("fabric.list_reports", pd.DataFrame([{
+            **r,
+            "Description": "",
+            "Web URL": f"https://app.powerbi.com/groups/{ws_id}/reports/{r['Id']}",
+            "Embed URL": f"https://app.powerbi.com/reportEmbed?reportId={r['Id']}",
+            "Report Type": "PowerBIReport"
+        } for r in reports]), kwargs={"workspace": ws_name})
+
+        gen1 = [self.generate_gen1_dataflow(writer, ws_id, i) for i in range(self.count("gen1_dataflows_per_workspace"))]
+        writer.rest("GET", f"v1.0/myorg/groups/{ws_id}/dataflows", {"value": gen1})
+        writer.rest("GET", f"v1.0/myorg/groups/{ws_id}/dataflows/upstreamDataflows", {"value": [
+            {"dataflowObjectId": df["objectId"], "datasetObjectId": self.rng.choice(datasets)["Dataset ID"]}
+            for df in gen1 if datasets
+        ]})
+
+        items = [{"id": d["Dataset ID"], "type": "SemanticModel", "displayName": d["Dataset Name"]} for d in datasets]
+        items += [{"id": r["Id"], "type": "Report", "displayName": r["Name"]} for r in reports]
+        items += [self.generate_gen2_dataflow(writer, ws_id, i) for i in range(self.count("gen2_dataflows_per_workspace"))]
+        items += [{"id": self.new_id(), "type": self.rng.choice(OTHER_ITEM_TYPES), "displayName": f"Item {i:03d}",
+                   "description": ""} for i in range(self.count("other_items_per_workspace"))]
+        writer.rest("GET", f"v1/workspaces/{ws_id}/items", {"value": items})
+
+        return reports
+
+    def generate_app(self, writer: FixtureWriter, ws: Dict[str, str], reports: List[Dict[str, str]]) -> Dict[str, Any]:
+        app_id = self.new_id()
+        selected = self.rng.sample(reports, min(len(reports), self.count("reports_per_app", minimum=1)))
+        writer.rest("GET", f"v1.0/myorg/apps/{app_id}/reports", {"value": [{
+            "id": self.new_id(),
+            "reportType": "PowerBIReport",
+            "name": r["Name"],
+            "webUrl": "",
+            "embedUrl": "",
+            "isOwnedByMe": False,
+            "datasetId": r["Dataset Id"],
+            "originalReportObjectId": r["Id"]
+        } for r in selected]})
+        self.tally("apps")
+        return {"id": app_id, "name": f"App ({ws['Name']})", "lastUpdate": self.timestamp(days_ago=7),
+                "description": "", "publishedBy": "owner@contoso.com", "workspaceId": ws["Id"]}
+
+    def generate_sql_endpoints(self, writer: FixtureWriter, ws_id: str) -> None:
+        endpoint_id = self.new_id()
+        writer.rest("GET", f"v1/workspaces/{ws_id}/sqlEndpoints",
+                    {"value": [{"id": endpoint_id, "displayName": HOME_LAKEHOUSE_NAME}]})
+        writer.rest("POST", f"v1/workspaces/{ws_id}/sqlEndpoints/{endpoint_id}/refreshMetadata",
+                    {"value": [{"tableName": "Workspaces", "status": "Success"}]}, body={})
+
+    # -------------------- Datasets / models --------------------
+
+    def generate_dataset(self, writer: FixtureWriter, ws_id: str, ws_name: str, dataset: Dict[str, str]) -> None:
+        ds_id, ds_name = dataset["Dataset ID"], dataset["Dataset Name"]
+        base = f"v1.0/myorg/groups/{ws_id}/datasets/{ds_id}"
+        self.tally("datasets")
+
+        writer.rest("GET", f"{base}/datasources", {"value": [{
+            "datasourceType": self.rng.choice(DATASOURCE_TYPES),
+            "datasourceId": self.new_id(),
+            "gatewayId": self.new_id(),
+            "connectionDetails": {"server": "server.database.windows.net", "database": "Sales"}
+        }]})
+        writer.rest("GET", f"{base}/refreshes", {"value": self.refresh_history("refreshes_per_dataset")})
+        writer.rest("GET", f"{base}/refreshSchedule", {
+            "enabled": True,
+            "localTimeZoneId": "UTC",
+            "notifyOption": "MailOnFailure",
+            "days": ["Monday", "Wednesday", "Friday"],
+            "times": ["06:00"]
+        })
+
+        if self.chance("model_error_rate"):
+            writer.call("TOMWrapper", RuntimeError(f"The user does not have permission to call the Discover method on {ds_name}"),
+                        kwargs={"dataset": ds_name, "workspace": ws_name, "readonly": True})
+            return
+
+        model, calculations = self.generate_model(ds_id)
+        writer.model(ds_name, ws_name, model)
+        writer.call("get_model_calc_dependencies", pd.DataFrame([{
+            "Object Name": key, "Referenced Object": dep["Name"], "Referenced Object Type": dep["ObjectType"]
+        } for key, deps in calculations.items() for dep in deps]), kwargs={"dataset": ds_name, "workspace": ws_name})
+        for object_key, deps in calculations.items():
+            writer.depends_on(ds_name, ws_name, object_key, deps)
+
+    def generate_model(self, dataset_id: str):
+        """Build a TOM snapshot (see TOM_SNAPSHOT_FIELDS in the notebook) and its dependencies."""
+        model = {name: [] for name in ("tables", "calculation_groups", "calculation_items", "columns",
+                                       "calculated_columns", "measures", "hierarchies", "levels",
+                                       "partitions", "relationships")}
+        calculations = {}
+        self.fields = self.model_fields[dataset_id] = []
+
+        table_count = self.count("tables_per_model", minimum=1)
+        tables = [f"Table{t:02d}" for t in range(table_count)]
+        for table in tables:
+            model["tables"].append({"Name": table, "IsHidden": False})
+            model["partitions"].append({"Table.Name": table, "Name": table, "Description": "",
+                                        "Mode": self.rng.choice(["Import", "Import", "DirectQuery"]),
+                                        "Source.Expression": f'let Source = Sql.Database("server", "db"), T = Source{{[Name="{table}"]}}[Data] in T'})
+            for c in range(self.count("columns_per_table", minimum=1)):
+                column = f"Column{c:02d}"
+                model["columns"].append({"Table.Name": table, "Name": column, "FormatString": "",
+                                         "DisplayFolder": "", "Description": "", "IsHidden": False})
+                self.fields.append(("Column", table, column))
+        self.tally("tables", table_count)
+        self.tally("columns", len(model["columns"]))
+
+        for i in range(self.count("calculated_columns_per_model")):
+            table, name = self.rng.choice(tables), f"Calc Column {i:02d}"
+            model["calculated_columns"].append({"Table.Name": table, "Name": name, "FormatString": "",
+                                                "DisplayFolder": "", "Description": "", "IsHidden": False,
+                                                "Expression": f"[{self.rng.choice(self.fields)[2]}] * 2"})
+            model["columns"].append({"Table.Name": table, "Name": name, "FormatString": "",
+                                     "DisplayFolder": "", "Description": "", "IsHidden": False})
+            calculations[f"Column|{table}|{name}"] = self.dependencies()
+            self.fields.append(("Column", table, name))
+
+        for i in range(self.count("measures_per_model")):
+            table, name = self.rng.choice(tables), f"Measure {i:03d}"
+            ref = self.rng.choice(self.fields)
+            model["measures"].append({"Table.Name": table, "Name": name, "FormatString": "#,0",
+                                      "DisplayFolder": "", "Description": "", "IsHidden": False,
+                                      "Expression": f"SUM('{ref[1]}'[{ref[2]}])"})
+            calculations[f"Measure|{table}|{name}"] = self.dependencies()
+            self.fields.append(("Measure", table, name))
+        self.tally("measures", len(model["measures"]))
+
+        for g in range(self.count("calculation_groups_per_model")):
+            group = f"Calculation Group {g}"
+            model["calculation_groups"].append({"Name": group, "Description": "", "IsHidden": False})
+            model["tables"].append({"Name": group, "IsHidden": False})
+            for i in range(self.count("calculation_items_per_group", minimum=1)):
+                name = f"Item {i}"
+                model["calculation_items"].append({"Name": name, "Description": "", "Parent.Name": group,
+                                                   "Expression": "SELECTEDMEASURE()"})
+                calculations[f"CalculationItem||{name}"] = self.dependencies()
+
+        for h in range(self.count("hierarchies_per_model")):
+            table = self.rng.choice(tables)
+            model["hierarchies"].append({"Table.Name": table, "Name": f"Hierarchy {h}", "DisplayFolder": "",
+                                         "Description": "", "IsHidden": False})
+            for level in range(3):
+                model["levels"].append({"Hierarchy.Table.Name": table, "Hierarchy.Name": f"Hierarchy {h}",
+                                        "Name": f"Level {level}", "Description": ""})
+
+        for t in range(1, table_count):
+            model["relationships"].append({
+                "Name": self.new_id(), "FromTable.Name": tables[t], "FromColumn.Name": "Column00",
+                "ToTable.Name": tables[0], "ToColumn.Name": "Column00", "IsActive": True,
+                "FromCardinality": "Many", "ToCardinality": "One", "CrossFilteringBehavior": "OneDirection"
+            })
+
+        return model, calculations
+
+    def dependencies(self) -> List[Dict[str, str]]:
+        picked = self.rng.sample(self.fields, min(len(self.fields), self.count("dependencies_per_calculation")))
+        return [{"ObjectType": kind, "Name": name, "Parent.Name": table} for kind, table, name in picked]
+
+    # -------------------- Reports --------------------
+
+    def generate_report(self, writer: FixtureWriter, ws_id: str, ws_name: str,
+                        report: Dict[str, str], dataset: Optional[Dict[str, str]]) -> None:
+        rpt_id, rpt_name = report["Id"], report["Name"]
+        context = {"report": rpt_name, "workspace": ws_name}
+        self.tally("reports")
+
+        # Cell 3 resolves the dataset through semantic-link-labs (list_reports has no DatasetId attribute)
+        writer.call("resolve_dataset_from_report", [report["Dataset Id"], dataset["Dataset Name"] if dataset else "",
+                                                    ws_id, ws_name], kwargs={"report": rpt_id, "workspace": ws_name})
+
+        if self.chance("report_error_rate"):
+            writer.call("ReportWrapper", RuntimeError(f"Report '{rpt_name}' is not in the PBIR format"),
+                        kwargs={"report": rpt_name, "workspace": ws_name})
+            writer.rest("GET", f"v1.0/myorg/groups/{ws_id}/reports/{rpt_id}/pages", {"value": []})
+            return
+        writer.call("ReportWrapper", None, kwargs={"report": rpt_name, "workspace": ws_name})
+
+        # Fields a visual can reference: the model's fields (when generated) plus the odd broken reference
+        fields = self.model_fields.get(report["Dataset Id"]) or [("Column", "Table00", "Column00")]
+
+        pages, visuals, objects, filters, interactions = [], [], [], [], []
+        for p in range(self.count("pages_per_report", minimum=1)):
+            page_name, page_display = self.new_id()[:20], f"Page {p + 1}"
+            page_visuals = []
+            for v in range(self.count("visuals_per_page")):
+                visual_name = self.new_id()[:20]
+                page_visuals.append(visual_name)
+                object_count = self.count("objects_per_visual")
+                filter_count = self.count("filters_per_visual")
+                visuals.append({
+                    "Page Display Name": page_display, "Page Name": page_name, "Visual Name": visual_name,
+                    "Type": self.rng.choice(VISUAL_TYPES), "Display Type": "", "Title": f"Visual {v}",
+                    "Sub Title": "", "Alt Text": "", "Tab Order": v, "Custom Visual": False, "Hidden": False,
+                    "X": 20.0 * v, "Y": 10.0 * v, "Z": v, "Width": 300.0, "Height": 200.0,
+                    "Visual Object Count": object_count, "Visual Filter Count": filter_count, "Data Limit": 0,
+                    "Divider": False, "Row Sub Totals": False, "Column Sub Totals": False, "Data Visual": True,
+                    "Has Sparkline": False
+                })
+                for _ in range(object_count):
+                    kind, table, name = self.field_reference(fields)
+                    objects.append({
+                        "Page Display Name": page_display, "Page Name": page_name, "Visual Name": visual_name,
+                        "Table Name": table, "Object Name": name, "Object Type": kind, "Object Display Name": name,
+                        "Implicit Measure": False, "Sparkline": False, "Visual Calc": False, "Format": ""
+                    })
+                for f in range(filter_count):
+                    kind, table, name = self.field_reference(fields)
+                    filters.append({
+                        "Page Display Name": page_display, "Page Name": page_name, "Visual Name": visual_name,
+                        "Table Name": table, "Object Name": name, "Object Type": kind, "Type": "Categorical",
+                        "Hidden": False, "Locked": False, "Filter Name": f"Filter{f}", "How Created": "Auto",
+                        "Used": True
+                    })
+            for source, target in zip(page_visuals, page_visuals[1:]):
+                interactions.append({"Page Display Name": page_display, "Page Name": page_name,
+                                     "Source Visual Name": source, "Target Visual Name": target, "Type": "NoFilter"})
+            pages.append({
+                "Page Name": page_name, "Page Display Name": page_display, "Width": 1280, "Height": 720,
+                "Hidden": False, "Visual Count": len(page_visuals), "Display Option": "FitToPage",
+                "Data Visual Count": len(page_visuals), "Visible Visual Count": len(page_visuals),
+                "Page Filter Count": 0
+            })
+        self.tally("pages", len(pages))
+        self.tally("visuals", len(visuals))
+
+        report_measures = [{
+            "Table Name": fields[0][1], "Measure Name": f"Report Measure {m}",
+            "Expression": f"COUNTROWS('{fields[0][1]}')", "Format String": "", "Data Type": "Int64",
+            "Data Category": ""
+        } for m in range(self.count("report_level_measures_per_report"))]
+        bookmarks = [{
+            "Bookmark Display Name": f"Bookmark {b}", "Bookmark Name": self.new_id()[:20],
+            "Page Display Name": pages[0]["Page Display Name"], "Page Name": pages[0]["Page Name"],
+            "Visual Name": "", "Visual Hidden": False, "Suppress Data": False, "Current Page Selected": True,
+            "Apply Visual Display State": True, "Apply To All Visuals": True
+        } for b in range(self.count("bookmarks_per_report"))]
+
+        results = {
+            "list_pages": pages,
+            "list_visuals": visuals,
+            "list_bookmarks": bookmarks,
+            "list_custom_visuals": [],
+            "list_report_filters": [],
+            "list_page_filters": [],
+            "list_visual_filters": filters,
+            "list_visual_objects": objects,
+            "list_report_level_measures": report_measures,
+            "list_visual_interactions": interactions
+        }
+        for method, rows in results.items():
+            writer.call(f"ReportWrapper.{method}", pd.DataFrame(rows), context=context)
+
+        writer.rest("GET", f"v1.0/myorg/groups/{ws_id}/reports/{rpt_id}/pages", {"value": [
+            {"name": p["Page Name"], "displayName": p["Page Display Name"], "order": i} for i, p in enumerate(pages)
+        ]})
+
+    def field_reference(self, fields):
+        kind, table, name = self.rng.choice(fields)
+        if self.chance("broken_reference_rate"):
+            name = f"{name} (deleted)"
+        return kind, table, name
+
+    # -------------------- Dataflows --------------------
+
+    def m_document(self) -> str:
+        queries = []
+        for q in range(self.count("queries_per_dataflow", minimum=1)):
+            queries.append(f'shared #"Query {q}" = let\r\n    Source = Sql.Database("server", "db"),\r\n'
+                           f'    Data = Source{{[Schema="dbo", Item="Table{q}"]}}[Data]\r\nin\r\n    Data;')
+        self.tally("dataflow_queries", len(queries))
+        return "section Section1;\r\n" + "\r\n".join(queries)
+
+    def generate_gen1_dataflow(self, writer: FixtureWriter, ws_id: str, index: int) -> Dict[str, Any]:
+        df_id = self.new_id()
+        base = f"v1.0/myorg/groups/{ws_id}/dataflows/{df_id}"
+        dataflow = {"objectId": df_id, "name": f"Dataflow Gen1 {index:03d}", "description": "",
+                    "configuredBy": "owner@contoso.com", "modifiedBy": "owner@contoso.com",
+                    "modifiedDateTime": self.timestamp(days_ago=3), "modelUrl": "", "generation": 1}
+        writer.rest("GET", base, {"name": dataflow["name"], "pbi:mashup": {"document": self.m_document()}})
+        writer.rest("GET", f"{base}/datasources", {"value": [{
+            "datasourceType": self.rng.choice(DATASOURCE_TYPES), "datasourceId": self.new_id(),
+            "gatewayId": self.new_id(), "connectionDetails": {"url": "https://contoso.sharepoint.com"}
+        }]})
+        writer.rest("GET", f"{base}/transactions", {"value": self.refresh_history("refreshes_per_dataflow")})
+        self.tally("gen1_dataflows")
+        return dataflow
+
+    def generate_gen2_dataflow(self, writer: FixtureWriter, ws_id: str, index: int) -> Dict[str, Any]:
+        df_id = self.new_id()
+        definition = {"definition": {"parts": [{
+            "path": "mashup.pq",
+            "payloadType": "InlineBase64",
+            "payload": base64.b64encode(self.m_document().encode("utf-8")).decode("ascii")
+        }]}}
+        endpoint = f"v1/workspaces/{ws_id}/dataflows/{df_id}/getDefinition"
+        if self.chance("gen2_lro_rate"):
+            # Large definitions answer 202 and are fetched via the operations API
+            operation_id = self.new_id()
+            writer.rest("POST", endpoint, "", status=202, body={},
+                        headers={"x-ms-operation-id": operation_id, "Retry-After": "1"})
+            writer.rest("GET", f"v1/operations/{operation_id}", {"status": "Succeeded"})
+            writer.rest("GET", f"v1/operations/{operation_id}/result", definition)
+        else:
+            writer.rest("POST", endpoint, definition, body={})
+        self.tally("gen2_dataflows")
+        return {"id": df_id, "type": "Dataflow", "displayName": f"Dataflow Gen2 {index:03d}", "description": ""}
+
+    # -------------------- Refresh history --------------------
+
+    def refresh_history(self, key: str) -> List[Dict[str, Any]]:
+        history = []
+        for i in range(self.count(key)):
+            start = self.report_date - timedelta(hours=12 * i + self.rng.random())
+            history.append({
+                "requestId": self.new_id(),
+                "id": i + 1,
+                "refreshType": "Scheduled",
+                "startTime": start.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+                "endTime": (start + timedelta(minutes=self.rng.randint(1, 45))).strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+                "status": "Failed" if self.rng.random() < 0.05 else "Completed"
+            })
+        self.tally("refreshes", len(history))
+        return history
+
+    def timestamp(self, days_ago: int = 0) -> str:
+        return (self.report_date - timedelta(days=days_ago)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def generate_tenant(path: str, workspaces: int, seed: int = 0,
+                    profile: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    """
+    Generate a synthetic tenant into path (replayable with fabric_replay.py).
+
+    Args:
+        path: Output folder
+        workspaces: Number of workspaces
+        seed: Random seed
+        profile: Overrides for DEFAULT_PROFILE size distributions
+
+    Returns:
+        The manifest written alongside the fixtures
+    """
+    return SyntheticTenantGenerator(workspaces, seed, profile).generate(path)
+
+
+# ==============================================================
+# BENCHMARK
+# ==============================================================
+
+def run_benchmark(
+    scales: List[int],
+    work_dir: str,
+    cells: Optional[List[int]] = None,
+    seed: int = 0,
+    profile: Optional[Dict[str, float]] = None,
+    replay_args: Optional[List[str]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Generate a tenant per scale point and replay it through the notebook cells.
+
+    Each replay runs in its own process so peak memory is measured independently.
+    Notebook output is written to {work_dir}/{scale}/replay.log.
+
+    Args:
+        scales: Workspace counts to benchmark
+        work_dir: Folder for generated tenants, logs and summaries
+        cells: Cells to run after Cell 0 (default: 1-5)
+        seed: Random seed for the generated tenants
+        profile: Overrides for DEFAULT_PROFILE
+        replay_args: Extra fabric_replay.py arguments (e.g. ["--latency-ms", "40"])
+
+    Returns:
+        One result dictionary per scale point
+    """
+    cells = cells or [1, 2, 3, 4, 5]
+    results = []
+    for scale in scales:
+        scale_dir = os.path.join(work_dir, str(scale))
+        fixtures = os.path.join(scale_dir, "fixtures")
+        if not os.path.exists(os.path.join(fixtures, MANIFEST_FILE)):
+            print(f"Generating tenant with {scale} workspaces...", flush=True)
+            generate_tenant(fixtures, scale, seed, profile)
+        with open(os.path.join(fixtures, MANIFEST_FILE), encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        summary_path = os.path.join(scale_dir, "summary.json")
+        command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "fabric_replay.py"),
+                   "--fixtures", fixtures, "--cells", *[str(c) for c in cells],
+                   "--profile-memory", "--summary-json", summary_path, *(replay_args or [])]
+        print(f"Replaying {scale} workspaces through cells {cells}...", flush=True)
+        with open(os.path.join(scale_dir, "replay.log"), "w", encoding="utf-8") as log_file:
+            completed = subprocess.run(command, stdout=log_file, stderr=subprocess.STDOUT)
+        if completed.returncode != 0:
+            print(f"  Replay failed (exit {completed.returncode}), see {scale_dir}/replay.log", flush=True)
+            results.append({"workspaces": scale, "counts": manifest["counts"], "error": completed.returncode})
+            continue
+
+        with open(summary_path, encoding="utf-8") as f:
+            summary = json.load(f)
+        results.append({"workspaces": scale, "counts": manifest["counts"], **summary})
+
+    print_benchmark(results)
+    with open(os.path.join(work_dir, "benchmark.json"), "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    return results
+
+
+def print_benchmark(results: List[Dict[str, Any]]) -> None:
+    print("\n" + "=" * 80)
+    print("BENCHMARK RESULTS (wall seconds / peak MB per cell)")
+    print("=" * 80)
+    for result in results:
+        counts = result["counts"]
+        print(f"\n{result['workspaces']} workspaces: {counts.get('datasets', 0)} datasets, "
+              f"{counts.get('reports', 0)} reports, {counts.get('visuals', 0)} visuals, "
+              f"{counts.get('gen1_dataflows', 0) + counts.get('gen2_dataflows', 0)} dataflows")
+        if "error" in result:
+            print(f"  FAILED (exit {result['error']})")
+            continue
+        for cell, stats in result["cells"].items():
+            print(f"  Cell {cell:<10} {stats['wall_seconds']:10.2f} sec  {stats['peak_memory_mb'] or 0:10.1f} MB")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate synthetic tenants and benchmark GovernanceNotebook at scale.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate = subparsers.add_parser("generate", help="Generate one synthetic tenant")
+    generate.add_argument("--workspaces", type=int, required=True)
+    generate.add_argument("--output", required=True)
+
+    benchmark = subparsers.add_parser("benchmark", help="Benchmark cells across scale points")
+    benchmark.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES)
+    benchmark.add_argument("--work-dir", required=True)
+    benchmark.add_argument("--cells", type=int, nargs="+", default=[1, 2, 3, 4, 5])
+    benchmark.add_argument("--latency-ms", type=float, default=0.0)
+    benchmark.add_argument("--workers", type=int, default=5)
+
+    for sub in (generate, benchmark):
+        sub.add_argument("--seed", type=int, default=0)
+        sub.add_argument("--profile", default="", help="JSON object overriding DEFAULT_PROFILE entries")
+
+    args = parser.parse_args(argv)
+    profile = json.loads(args.profile) if args.profile else None
+    unknown = set(profile or {}) - set(DEFAULT_PROFILE)
+    if unknown:
+        parser.error(f"Unknown profile entries: {sorted(unknown)}")
+
+    if args.command == "generate":
+        manifest = generate_tenant(args.output, args.workspaces, args.seed, profile)
+        print(json.dumps(manifest["counts"], indent=2))
+    else:
+        run_benchmark(args.scales, args.work_dir, args.cells, args.seed, profile,
+                      ["--latency-ms", str(args.latency_ms), "--workers", str(args.workers)])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+"""Tests for the run registry, trigger coalescing, registry lock and result cache of workload_integration."""
+
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+import workload_integration
+from workload_integration import (FabricNotebookLauncher, JobRegistry, NotebookLauncher, RegistryLock,
+                                  ResultCache, WorkloadIntegration)
+
+
+class FakeLauncher(NotebookLauncher):
+    """Launcher whose runs stay running until finish() is called"""
+
+    name = "fake"
+
+    def __init__(self):
+        self.launched = []
+        self.outcomes = {}
+
+    def launch(self, run_id, parameters):
+        self.launched.append(run_id)
+        return {"fake": True}
+
+    def poll(self, run_id, handle):
+        return self.outcomes.get(run_id)
+
+
+def trigger_in_process(state_path):
+    integration = WorkloadIntegration("ws", "lh", state_path=state_path, launcher=FakeLauncher())
+    return integration.trigger_governance_analysis(["Sales", "Finance"])["status"]
+
+
+class ResultCacheTests(unittest.TestCase):
+
+    def test_hit_miss_and_version_change(self):
+        cache = ResultCache(max_entries=4, ttl_seconds=60)
+        self.assertEqual(cache.get(("a",), "v1"), (False, None))
+        cache.put(("a",), {"x": 1}, "v1")
+        self.assertEqual(cache.get(("a",), "v1"), (True, {"x": 1}))
+        # A new data version drops everything cached for the old one
+        self.assertEqual(cache.get(("a",), "v2"), (False, None))
+        cache.put(("b",), 2, "v1")
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_ttl_and_lru_eviction(self):
+        cache = ResultCache(max_entries=2, ttl_seconds=60)
+        cache.get(("a",), "v")
+        for key in ("a", "b"):
+            cache.put((key,), key, "v")
+        cache.get(("a",), "v")
+        cache.put(("c",), "c", "v")
+        self.assertEqual(cache.get(("b",), "v"), (False, None))
+        self.assertEqual(cache.get(("a",), "v"), (True, "a"))
+        with mock.patch("workload_integration.time.monotonic", return_value=time.monotonic() + 61):
+            self.assertEqual(cache.get(("c",), "v"), (False, None))
+
+
+class JobRegistryTests(unittest.TestCase):
+
+    def test_workspace_key(self):
+        self.assertEqual(JobRegistry.workspace_key(["B", " a", "b"], "DBO"), 'dbo|["a", "b"]')
+        self.assertEqual(JobRegistry.workspace_key(["Sales", "All"], "dbo"), 'dbo|["all"]')
+
+    def test_save_trims_oldest_finished_runs(self):
+        with tempfile.TemporaryDirectory() as state_path:
+            registry = JobRegistry(state_path)
+            runs = {f"r{i:03d}": {"run_id": f"r{i:03d}", "status": "completed", "submitted_at": f"2026-01-01T00:{i // 60:02d}:{i % 60:02d}"}
+                    for i in range(workload_integration.JOB_REGISTRY_MAX_RUNS + 5)}
+            runs["r000"]["status"] = "running"
+            registry.save(runs)
+            saved = registry.load()
+            self.assertEqual(len(saved), workload_integration.JOB_REGISTRY_MAX_RUNS)
+            self.assertIn("r000", saved)
+            self.assertNotIn("r001", saved)
+            self.assertIn("r006", saved)
+
+
+class RegistryLockTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "jobs", "registry.json.lock")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_reentrant_and_removed_on_release(self):
+        lock = RegistryLock(self.path)
+        with lock:
+            with lock:
+                self.assertTrue(os.path.exists(self.path))
+            self.assertTrue(os.path.exists(self.path))
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_excludes_other_holders(self):
+        # A second RegistryLock stands in for another process: only the file is shared
+        first, second = RegistryLock(self.path), RegistryLock(self.path, poll_seconds=0.01)
+        acquired = threading.Event()
+
+        def take_second():
+            with second:
+                acquired.set()
+
+        with first:
+            thread = threading.Thread(target=take_second)
+            thread.start()
+            self.assertFalse(acquired.wait(0.2))
+        self.assertTrue(acquired.wait(2))
+        thread.join()
+
+    def test_stale_lock_file_is_broken(self):
+        os.makedirs(os.path.dirname(self.path))
+        open(self.path, "w").close()
+        old = time.time() - workload_integration.JOB_REGISTRY_LOCK_STALE_SECONDS - 1
+        os.utime(self.path, (old, old))
+        with RegistryLock(self.path):
+            self.assertGreater(os.path.getmtime(self.path), old)
+
+    def test_held_lock_file_is_kept_fresh(self):
+        with mock.patch("workload_integration.JOB_REGISTRY_LOCK_STALE_SECONDS", 0.3):
+            with RegistryLock(self.path):
+                old = time.time() - 10
+                os.utime(self.path, (old, old))
+                time.sleep(0.25)
+                self.assertGreater(os.path.getmtime(self.path), old + 5)
+
+
+class TriggerCoalescingTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.state_path = self.directory.name
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def integration(self, launcher=None):
+        return WorkloadIntegration("ws", "lh", state_path=self.state_path, launcher=launcher or FakeLauncher(), cache_max_entries=0)
+
+    def write_progress(self, run_id, status, updated_at, error=None):
+        path = os.path.join(self.state_path, "runs", run_id, "progress.json")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"run_id": run_id, "status": status, "error": error, "current_phase": "Models",
+                       "percent_complete": 40.0, "updated_at": updated_at.isoformat()}, f)
+
+    def test_same_workspaces_coalesce_until_finished(self):
+        launcher = FakeLauncher()
+        integration = self.integration(launcher)
+        first = integration.trigger_governance_analysis(["Sales", "Finance"])
+        self.assertEqual(first["status"], "initiated")
+        second = integration.trigger_governance_analysis(["finance", "sales"])
+        self.assertEqual((second["status"], second["run_id"]), ("already_running", first["run_id"]))
+        self.assertEqual(integration.trigger_governance_analysis(["HR"])["status"], "initiated")
+        self.assertEqual(len(launcher.launched), 2)
+
+        launcher.outcomes[first["run_id"]] = ("completed", "done")
+        self.assertEqual(integration.trigger_governance_analysis(["Sales", "Finance"])["status"], "initiated")
+        runs = {run["run_id"]: run for run in integration.list_runs()}
+        self.assertEqual(runs[first["run_id"]]["status"], "completed")
+        self.assertEqual(runs[first["run_id"]]["trigger_count"], 2)
+
+    def test_failed_launch_is_not_coalesced(self):
+        launcher = FakeLauncher()
+        launcher.launch = mock.Mock(side_effect=RuntimeError("no session"))
+        integration = self.integration(launcher)
+        result = integration.trigger_governance_analysis(["Sales"])
+        self.assertEqual(result["status"], "error")
+        self.assertIn("no session", result["message"])
+        self.assertEqual(integration.list_runs()[0]["status"], "failed")
+
+    def test_runs_of_other_processes_follow_progress(self):
+        started = self.integration().trigger_governance_analysis(["Sales"])["run_id"]
+        self.write_progress(started, "running", datetime.now())
+
+        # A server restarted (or a second one) knows nothing of the run's thread
+        other = self.integration(FabricNotebookLauncher())
+        other.launcher.name = "fake"
+        self.assertEqual(other.trigger_governance_analysis(["Sales"])["status"], "already_running")
+
+        self.write_progress(started, "running", datetime.now() - timedelta(seconds=workload_integration.PROGRESS_STALE_SECONDS + 60))
+        run = other.list_runs()[0]
+        self.assertEqual(run["status"], "failed")
+        self.assertIn("No progress reported", run["message"])
+
+    def test_finished_progress_settles_foreign_run(self):
+        started = self.integration().trigger_governance_analysis(["Sales"])["run_id"]
+        self.write_progress(started, "partial", datetime.now())
+        other = self.integration(FabricNotebookLauncher())
+        self.assertEqual(other.list_runs()[0]["status"], "partial")
+
+    def test_failed_cell_fails_run(self):
+        launcher = FakeLauncher()
+        started = self.integration(launcher).trigger_governance_analysis(["Sales"])["run_id"]
+        # The notebook's exception hook wrote the error while the session itself is still alive
+        self.write_progress(started, "failed", datetime.now(), "RuntimeError: boom")
+        launcher.outcomes[started] = ("completed", "Notebook session ended")
+        run = self.integration(launcher).list_runs()[0]
+        self.assertEqual((run["status"], run["message"]), ("failed", "RuntimeError: boom"))
+
+    def test_concurrent_processes_start_one_run(self):
+        with multiprocessing.Pool(4) as pool:
+            statuses = pool.map(trigger_in_process, [self.state_path] * 8)
+        self.assertEqual(sorted(statuses), ["already_running"] * 7 + ["initiated"])
+        runs = self.integration().list_runs()
+        self.assertEqual(len(runs), 1)
+        self.assertEqual(runs[0]["trigger_count"], 8)
+
+
+class LauncherTests(unittest.TestCase):
+
+    def test_launcher_is_abstract(self):
+        with self.assertRaises(TypeError):
+            NotebookLauncher()
+
+    def test_fabric_launcher_does_not_fail_foreign_runs(self):
+        self.assertEqual(FabricNotebookLauncher().poll("elsewhere", {})[0], "unknown")
+
+
+if __name__ == "__main__":
+    unittest.main()
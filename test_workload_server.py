@@ -0,0 +1,37 @@
+"""Tests for the camelCase mapping of workload_server responses."""
+
+import unittest
+
+from workload_server import camelize, to_camel_case
+
+
+class CamelCaseTests(unittest.TestCase):
+
+    def test_snake_and_pascal_keys(self):
+        self.assertEqual(to_camel_case("total_reports"), "totalReports")
+        self.assertEqual(to_camel_case("TotalReports"), "totalReports")
+        self.assertEqual(to_camel_case("run_id"), "runId")
+
+    def test_upper_case_snake_keys(self):
+        self.assertEqual(to_camel_case("LAKEHOUSE_SCHEMA"), "lakehouseSchema")
+        self.assertEqual(to_camel_case("WORKSPACE_NAMES"), "workspaceNames")
+        self.assertEqual(to_camel_case("MAX_PARALLEL_WORKERS"), "maxParallelWorkers")
+        self.assertEqual(to_camel_case("RUN_ID"), "runId")
+
+    def test_camelize_nested(self):
+        payload = {
+            "status": "success",
+            "job": {"config": {"LAKEHOUSE_SCHEMA": "dbo", "WORKSPACE_NAMES": ["All"]}},
+            "progress": {"phases": {"Models": {"items_done": 3}}},
+            "runs": [{"run_id": "r1"}]
+        }
+        self.assertEqual(camelize(payload), {
+            "status": "success",
+            "job": {"config": {"lakehouseSchema": "dbo", "workspaceNames": ["All"]}},
+            "progress": {"phases": {"Models": {"itemsDone": 3}}},
+            "runs": [{"runId": "r1"}]
+        })
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,8 +5,332 @@ This module provides integration between the Fabric Workload UI and the Governan
 It allows the workload to trigger governance analysis and retrieve results.
 """
 
+import gzip
 import json
-from typing import Dict, List, Optional, Any
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Any, Tuple
+
+
+# Default RUN_STATE_PATH of GovernanceNotebook (Files area of the attached Lakehouse)
+DEFAULT_STATE_PATH = "/lakehouse/default/Files/ImpactIQ"
+
+# Written by the notebook when a run finishes; a new run ID invalidates cached results
+LATEST_RUN_FILE = "latest_run.json"
+
+# Summary keys returned by get_governance_results -> GovernanceSummary columns
+SUMMARY_METRICS = {
+    "total_reports": "TotalReports",
+    "total_models": "TotalModels",
+    "total_dataflows": "TotalDataflows",
+    "unused_objects": "UnusedObjects",
+    "broken_visuals": "BrokenVisuals"
+}
+
+# Field names of the compact entries in the ImpactIndex JSON lists (the
+# notebook's IMPACT_INDEX_FIELDS order); report names are stored once per row
+IMPACT_INDEX_FIELDS = {
+    "ImpactedVisuals": ["ReportID", "PageName", "VisualId", "VisualName", "Via"],
+    "ImpactedFilters": ["Level", "ReportID", "PageName", "VisualId", "Via"],
+    "ImpactedMeasures": ["Type", "TableName", "Name", "ReportID", "Via"],
+    "ImpactedReports": ["ReportID", "ReportName", "WorkspaceName"]
+}
+
+
+# Run registry of analyses started through trigger_governance_analysis
+JOB_REGISTRY_FILE = os.path.join("jobs", "registry.json")
+JOB_REGISTRY_MAX_RUNS = 200
+ACTIVE_JOB_STATUSES = ("queued", "running")
+# A registry lock file older than this is left by a process that died holding it
+# (holders touch it every third of this interval)
+JOB_REGISTRY_LOCK_STALE_SECONDS = 60
+# A run whose progress.json has not been updated for this long is reported failed
+# (the notebook's heartbeat rewrites it every PROGRESS_INTERVAL_SECONDS)
+PROGRESS_STALE_SECONDS = 15 * 60
+
+# File suffixes of the compressed NDJSON exports
+EXPORT_COMPRESSION_SUFFIXES = {None: "", "gzip": ".gz", "zstd": ".zst"}
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache with a per-entry time to live.
+    
+    Entries are tagged with the data version (latest run ID) they were computed
+    from; a lookup with a different version clears the cache.
+    """
+    
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Tuple, version: Optional[str]) -> Tuple[bool, Any]:
+        """Return (found, value) for a key computed from the given data version"""
+        with self._lock:
+            if version != self.version:
+                self._entries.clear()
+                self.version = version
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+    
+    def put(self, key: Tuple, value: Any, version: Optional[str]) -> None:
+        with self._lock:
+            if version != self.version:
+                return
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "version": self.version}
+
+
+def write_json_atomic(path: str, data: Any) -> None:
+    """Write JSON via a temporary file so readers never see a partial document"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2, default=str)
+    os.replace(tmp_path, path)
+
+
+def new_run_id() -> str:
+    """Run ID in the format the GovernanceNotebook generates"""
+    return f"{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+
+class NotebookLauncher(ABC):
+    """
+    Starts GovernanceNotebook runs. Subclasses implement launch and poll.
+    
+    launch returns a JSON-serializable handle that is stored in the run registry;
+    poll returns None while the run is going, else (outcome, message) with
+    outcome "completed", "failed" or "unknown". "unknown" (e.g. a run started by
+    another process) leaves the outcome to the notebook's progress.json.
+    """
+    
+    name = "base"
+    
+    @abstractmethod
+    def launch(self, run_id: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        ...
+    
+    @abstractmethod
+    def poll(self, run_id: str, handle: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+        ...
+
+
+class FabricNotebookLauncher(NotebookLauncher):
+    """Runs the notebook in the Fabric session with notebookutils, on a background thread"""
+    
+    name = "fabric"
+    
+    def __init__(self, notebook_name: str = "GovernanceNotebook", timeout_seconds: int = 12 * 3600):
+        self.notebook_name = notebook_name
+        self.timeout_seconds = timeout_seconds
+        self._runs = {}
+    
+    def launch(self, run_id: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        from notebookutils import mssparkutils
+        
+        # notebook.run only passes strings, numbers and booleans
+        arguments = {k: json.dumps(v) if isinstance(v, (list, dict)) else v for k, v in parameters.items()}
+        state = {"done": False, "error": None}
+        
+        def run():
+            try:
+                mssparkutils.notebook.run(self.notebook_name, self.timeout_seconds, arguments)
+            except Exception as e:
+                state["error"] = str(e)
+            state["done"] = True
+        
+        thread = threading.Thread(target=run, name=f"governance-{run_id}", daemon=True)
+        self._runs[run_id] = state
+        thread.start()
+        return {"notebook": self.notebook_name}
+    
+    def poll(self, run_id: str, handle: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+        state = self._runs.get(run_id)
+        if state is None:
+            return "unknown", "Run was started by another session"
+        if not state["done"]:
+            return None
+        return ("failed", state["error"]) if state["error"] else ("completed", "Notebook run finished")
+
+
+class LocalSubprocessLauncher(NotebookLauncher):
+    """
+    Runs the notebook as a local process, for testing the job flow off-tenant.
+    
+    Each parameter is appended to the command as --param NAME=<json>; the
+    default command replays recorded fixtures with fabric_replay.py.
+    """
+    
+    name = "local"
+    
+    def __init__(self, command: Optional[List[str]] = None, fixtures_path: str = "", log_dir: Optional[str] = None):
+        if command is None:
+            replay_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fabric_replay.py")
+            command = [sys.executable, replay_script, "--fixtures", fixtures_path, "--cells", "1", "2", "3", "4", "5"]
+        self.command = command
+        self.log_dir = log_dir
+        self._processes = {}
+    
+    def launch(self, run_id: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        command = list(self.command)
+        for name, value in parameters.items():
+            command += ["--param", f"{name}={json.dumps(value)}"]
+        
+        log_dir = self.log_dir or os.path.join(parameters.get("RUN_STATE_PATH", "."), "jobs", "logs")
+        os.makedirs(log_dir, exist_ok=True)
+        log_path = os.path.join(log_dir, f"{run_id}.log")
+        with open(log_path, "w") as log_file:
+            process = subprocess.Popen(command, stdout=log_file, stderr=subprocess.STDOUT)
+        self._processes[run_id] = process
+        return {"pid": process.pid, "log_path": log_path}
+    
+    def poll(self, run_id: str, handle: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+        process = self._processes.get(run_id)
+        if process is None:
+            # Started by an earlier instance: all we can tell is whether the PID still exists
+            try:
+                os.kill(handle.get("pid", 0), 0)
+                return None
+            except (OSError, TypeError):
+                return "failed", "Process is no longer running"
+        returncode = process.poll()
+        if returncode is None:
+            return None
+        if returncode == 0:
+            return "completed", "Process finished"
+        return "failed", f"Process exited with code {returncode} (log: {handle.get('log_path')})"
+
+
+class RegistryLock:
+    """
+    Reentrant lock shared by the threads of this process and, through an
+    O_EXCL lock file, by every process using the same state path.
+    """
+    
+    def __init__(self, path: str, poll_seconds: float = 0.05):
+        self.path = path
+        self.poll_seconds = poll_seconds
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._released = None
+    
+    def __enter__(self) -> "RegistryLock":
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                self._acquire_file()
+            except BaseException:
+                self._thread_lock.release()
+                raise
+            # Keep the lock file fresh so a long hold is not taken for a dead holder
+            self._released = threading.Event()
+            threading.Thread(target=self._touch_until_released, args=(self._released,),
+                             name="registry-lock", daemon=True).start()
+        self._depth += 1
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self._depth -= 1
+        if self._depth == 0:
+            self._released.set()
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+        self._thread_lock.release()
+    
+    def _acquire_file(self) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.path) > JOB_REGISTRY_LOCK_STALE_SECONDS:
+                        os.remove(self.path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                time.sleep(self.poll_seconds)
+                continue
+            with os.fdopen(fd, "w") as f:
+                f.write(str(os.getpid()))
+            return
+    
+    def _touch_until_released(self, released: threading.Event) -> None:
+        while not released.wait(JOB_REGISTRY_LOCK_STALE_SECONDS / 3):
+            try:
+                os.utime(self.path)
+            except OSError:
+                return
+
+
+class JobRegistry:
+    """
+    Persisted registry of analysis runs ({state_path}/jobs/registry.json).
+    
+    Each entry keeps the run's workspace set, launcher handle, status, last
+    known phase and progress, and submitted/started/finished timestamps.
+    Callers hold `lock` around each load/modify/save, so triggers from several
+    server processes sharing the state path are de-duplicated too.
+    """
+    
+    def __init__(self, state_path: str):
+        self.path = os.path.join(state_path, JOB_REGISTRY_FILE)
+        self.lock = RegistryLock(f"{self.path}.lock")
+    
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def save(self, runs: Dict[str, Dict[str, Any]]) -> None:
+        if len(runs) > JOB_REGISTRY_MAX_RUNS:
+            finished = sorted((r for r in runs.values() if r["status"] not in ACTIVE_JOB_STATUSES),
+                              key=lambda r: r["submitted_at"])
+            for run in finished[:len(runs) - JOB_REGISTRY_MAX_RUNS]:
+                del runs[run["run_id"]]
+        write_json_atomic(self.path, runs)
+    
+    @staticmethod
+    def workspace_key(workspace_names: List[str], lakehouse_schema: str) -> str:
+        """Identity of a workspace set: triggers with the same key share one run"""
+        names = sorted({name.strip().lower() for name in workspace_names})
+        if "all" in names:
+            names = ["all"]
+        return f"{lakehouse_schema.lower()}|{json.dumps(names)}"
 
 
 class WorkloadIntegration:
@@ -14,7 +338,17 @@ class WorkloadIntegration:
     Integration class to connect Fabric Workload with GovernanceNotebook functionality.
     """
     
-    def __init__(self, workspace_id: str, lakehouse_name: str, lakehouse_schema: str = "dbo"):
+    def __init__(
+        self,
+        workspace_id: str,
+        lakehouse_name: str,
+        lakehouse_schema: str = "dbo",
+        state_path: str = DEFAULT_STATE_PATH,
+        cache_max_entries: int = 256,
+        cache_ttl_seconds: float = 300,
+        version_check_seconds: float = 5,
+        launcher: Optional[NotebookLauncher] = None
+    ):
         """
         Initialize the workload integration.
         
@@ -22,10 +356,72 @@ class WorkloadIntegration:
             workspace_id: The Fabric workspace ID
             lakehouse_name: Name of the Lakehouse for metadata storage
             lakehouse_schema: Schema name in the Lakehouse (default: "dbo")
+            state_path: Folder where the notebook keeps run state (its RUN_STATE_PATH)
+            cache_max_entries: Results kept in the in-process cache (0 disables it)
+            cache_ttl_seconds: How long a cached result is served
+            version_check_seconds: How often to check for a newly finished run
+            launcher: Starts notebook runs (default: FabricNotebookLauncher)
         """
         self.workspace_id = workspace_id
         self.lakehouse_name = lakehouse_name
         self.lakehouse_schema = lakehouse_schema
+        self.state_path = state_path
+        self.cache = ResultCache(cache_max_entries, cache_ttl_seconds) if cache_max_entries > 0 else None
+        self.version_check_seconds = version_check_seconds
+        self._data_version = None
+        self._version_checked_at = float("-inf")
+        self.launcher = launcher or FabricNotebookLauncher()
+        self.jobs = JobRegistry(state_path)
+    
+    def _get_spark(self):
+        """Spark session of the notebook this integration runs in"""
+        from pyspark.sql import SparkSession
+        return SparkSession.builder.getOrCreate()
+    
+    def _table_name(self, table: str) -> str:
+        """Fully qualified name of a table written by the GovernanceNotebook"""
+        return f"{self.lakehouse_name}.{self.lakehouse_schema}.{table}"
+    
+    def get_data_version(self) -> Optional[str]:
+        """
+        ID of the latest finished extraction run (from latest_run.json), re-read
+        at most every version_check_seconds.
+        """
+        now = time.monotonic()
+        if now - self._version_checked_at >= self.version_check_seconds:
+            try:
+                with open(os.path.join(self.state_path, LATEST_RUN_FILE)) as f:
+                    latest = json.load(f)
+                self._data_version = f"{latest.get('run_id')}|{latest.get('shard')}|{latest.get('completed_at')}"
+            except (OSError, ValueError):
+                self._data_version = None
+            self._version_checked_at = now
+        return self._data_version
+    
+    def _cached(self, method: str, args: Tuple, compute: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Serve a result from the cache or compute and cache it (error results are not cached).
+        
+        Cached dictionaries are shared between callers and must not be modified.
+        """
+        if self.cache is None:
+            return compute()
+        
+        key = (method,) + args
+        version = self.get_data_version()
+        found, value = self.cache.get(key, version)
+        if found:
+            return value
+        value = compute()
+        if value.get("status") != "error":
+            self.cache.put(key, value, version)
+        return value
+    
+    def clear_cache(self) -> None:
+        """Drop all cached results (e.g. after writing tables outside the notebook)"""
+        if self.cache is not None:
+            self.cache.clear()
+        self._version_checked_at = float("-inf")
     
     def trigger_governance_analysis(
         self,
@@ -35,12 +431,13 @@ class WorkloadIntegration:
         """
         Trigger a governance analysis run.
         
-        This method would be called from the Fabric Workload UI to start an analysis.
-        It can be implemented to trigger the GovernanceNotebook execution via Fabric APIs.
+        Starts the GovernanceNotebook through the configured launcher and records
+        the run in the run registry. If a run for the same workspace set is still
+        queued or running, no new run is started and that run is returned instead.
         
         Args:
             workspace_names: List of workspace names to analyze, or None for all
-            max_parallel_workers: Number of parallel API workers (1-10)
+            max_parallel_workers: Starting number of parallel API calls (adapted at run time)
         
         Returns:
             Dictionary with execution status and run ID
@@ -54,117 +451,454 @@ class WorkloadIntegration:
             "WORKSPACE_NAMES": workspace_names,
             "MAX_PARALLEL_WORKERS": max_parallel_workers
         }
+        workspace_key = JobRegistry.workspace_key(workspace_names, self.lakehouse_schema)
         
-        # TODO: Implement actual notebook execution via Fabric APIs
-        # Example:
-        # from notebookutils import mssparkutils
-        # result = mssparkutils.notebook.run(
-        #     "GovernanceNotebook",
-        #     timeoutPerCellInSeconds=3600,
-        #     parameters=config
-        # )
+        with self.jobs.lock:
+            runs = self.jobs.load()
+            for run in runs.values():
+                if run["status"] in ACTIVE_JOB_STATUSES:
+                    self._refresh_run(run)
+            
+            in_flight = next((r for r in runs.values()
+                              if r["workspace_key"] == workspace_key and r["status"] in ACTIVE_JOB_STATUSES), None)
+            if in_flight:
+                in_flight["trigger_count"] = in_flight.get("trigger_count", 1) + 1
+                self.jobs.save(runs)
+                return {
+                    "status": "already_running",
+                    "run_id": in_flight["run_id"],
+                    "config": in_flight["config"],
+                    "coalesced": True,
+                    "message": f"An analysis of the same workspaces is already {in_flight['status']} (run {in_flight['run_id']})"
+                }
+            
+            run_id = new_run_id()
+            run = {
+                "run_id": run_id,
+                "workspace_key": workspace_key,
+                "config": config,
+                "launcher": self.launcher.name,
+                "handle": {},
+                "status": "queued",
+                "phase": None,
+                "progress": 0.0,
+                "trigger_count": 1,
+                "submitted_at": datetime.now().isoformat(),
+                "started_at": None,
+                "finished_at": None,
+                "duration_seconds": None,
+                "message": None
+            }
+            runs[run_id] = run
+            self.jobs.save(runs)
+            
+            try:
+                run["handle"] = self.launcher.launch(run_id, dict(config, RUN_ID=run_id, RUN_STATE_PATH=self.state_path))
+                run["status"] = "running"
+                run["started_at"] = datetime.now().isoformat()
+            except Exception as e:
+                run["status"] = "failed"
+                run["finished_at"] = datetime.now().isoformat()
+                run["message"] = f"Launch failed: {str(e)}"
+            self.jobs.save(runs)
         
+        if run["status"] == "failed":
+            return {"status": "error", "run_id": run_id, "config": config, "message": run["message"]}
         return {
             "status": "initiated",
+            "run_id": run_id,
             "config": config,
-            "message": "Governance analysis initiated. Integration with Fabric APIs pending."
+            "coalesced": False,
+            "message": f"Governance analysis started (run {run_id})"
         }
     
+    def _read_progress(self, run_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(self.state_path, "runs", run_id, "progress.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def _refresh_run(self, run: Dict[str, Any]) -> None:
+        """Update an active registry entry from the notebook's progress and the launcher"""
+        snapshot = self._read_progress(run["run_id"])
+        if snapshot:
+            run["phase"] = snapshot.get("current_phase")
+            run["progress"] = snapshot.get("percent_complete", run["progress"])
+        
+        if run["launcher"] != self.launcher.name:
+            outcome = "unknown", f"Run was started by the {run['launcher']} launcher"
+        else:
+            outcome = self.launcher.poll(run["run_id"], run["handle"])
+        if outcome is None:
+            return
+        
+        status, message = outcome
+        if status == "unknown":
+            # Another process (or an earlier server) launched it: go by the notebook's progress
+            if snapshot and snapshot.get("status") not in (None, "running"):
+                status, message = snapshot["status"], snapshot.get("error") or "Notebook run finished"
+            else:
+                last_seen = (snapshot or {}).get("updated_at") or run["started_at"] or run["submitted_at"]
+                idle = (datetime.now() - datetime.fromisoformat(last_seen)).total_seconds()
+                if idle <= PROGRESS_STALE_SECONDS:
+                    return
+                status, message = "failed", f"No progress reported for {int(idle // 60)} min ({message})"
+        # The notebook's own final status (e.g. "partial") wins over the launcher's
+        if snapshot and snapshot.get("status") not in (None, "running"):
+            status = snapshot["status"]
+            message = snapshot.get("error") or message
+        run["status"] = status
+        run["message"] = message
+        run["finished_at"] = datetime.now().isoformat()
+        if run["started_at"]:
+            run["duration_seconds"] = round(
+                (datetime.fromisoformat(run["finished_at"]) - datetime.fromisoformat(run["started_at"])).total_seconds(), 1)
+    
+    def list_runs(self) -> List[Dict[str, Any]]:
+        """Runs in the registry, newest first, with active runs refreshed"""
+        with self.jobs.lock:
+            runs = self.jobs.load()
+            active = [r for r in runs.values() if r["status"] in ACTIVE_JOB_STATUSES]
+            for run in active:
+                self._refresh_run(run)
+            if active:
+                self.jobs.save(runs)
+        return sorted(runs.values(), key=lambda r: r["submitted_at"], reverse=True)
+    
     def get_analysis_status(self, run_id: str) -> Dict[str, Any]:
         """
         Get the status of a running or completed analysis.
         
+        Reads the progress snapshot the notebook's ProgressTracker keeps at
+        {state_path}/runs/{run_id}/progress.json.
+        
         Args:
             run_id: The analysis run ID
         
         Returns:
             Dictionary with run status and progress
         """
-        # TODO: Implement status checking via Fabric APIs
+        with self.jobs.lock:
+            runs = self.jobs.load()
+            run = runs.get(run_id)
+            if run and run["status"] in ACTIVE_JOB_STATUSES:
+                self._refresh_run(run)
+                self.jobs.save(runs)
+        job = {k: run[k] for k in ("status", "submitted_at", "started_at", "finished_at",
+                                   "duration_seconds", "trigger_count", "config")} if run else None
+        
+        progress_path = os.path.join(self.state_path, "runs", run_id, "progress.json")
+        
+        try:
+            with open(progress_path) as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return {
+                "run_id": run_id,
+                "status": run["status"] if run else "unknown",
+                "progress": 0.0,
+                "job": job,
+                "message": (run.get("message") or f"Run {run['status']}") if run else f"No progress recorded for run {run_id}"
+            }
+        except (OSError, ValueError) as e:
+            return {
+                "run_id": run_id,
+                "status": "unknown",
+                "progress": 0.0,
+                "message": f"Could not read progress: {str(e)}"
+            }
+        
+        current_phase = snapshot.get("current_phase")
+        phase_state = snapshot.get("phases", {}).get(current_phase, {}) if current_phase else {}
+        
+        status = snapshot.get("status", "unknown")
+        if run and status == "running" and run["status"] not in ACTIVE_JOB_STATUSES:
+            # The notebook stopped without completing its progress snapshot
+            status = run["status"]
+        
+        if status == "running" and current_phase:
+            message = f"{current_phase}: {phase_state.get('percent_complete') or 0:.0f}% complete"
+            if phase_state.get("eta_minutes") is not None:
+                message += f", ETA {phase_state['eta_minutes']:.0f} min"
+        else:
+            message = f"Analysis {status}"
+        
         return {
             "run_id": run_id,
-            "status": "running",
-            "progress": "In progress",
-            "message": "Status checking implementation pending"
+            "status": status,
+            "progress": snapshot.get("percent_complete", 0.0),
+            "current_phase": current_phase,
+            "eta_minutes": phase_state.get("eta_minutes"),
+            "elapsed_minutes": snapshot.get("elapsed_minutes"),
+            "updated_at": snapshot.get("updated_at"),
+            "phases": snapshot.get("phases", {}),
+            "job": job,
+            "message": message
         }
     
     def get_governance_results(self, workspace_filter: Optional[str] = None) -> Dict[str, Any]:
         """
         Retrieve governance analysis results from the Lakehouse.
         
+        Reads one row of the GovernanceSummary table the notebook maintains at
+        write time (the "Overall" row, or the row of the requested workspace).
+        Results are cached until their TTL expires or a new run finishes.
+        
         Args:
             workspace_filter: Optional workspace name to filter results
         
         Returns:
             Dictionary containing governance results summary
         """
-        # TODO: Implement result retrieval from Lakehouse
-        # Example:
-        # spark_session = spark
-        # df = spark_session.sql(f"""
-        #     SELECT COUNT(*) as total_reports
-        #     FROM {self.lakehouse_schema}.Reports
-        #     WHERE workspace_name = '{workspace_filter}' OR '{workspace_filter}' IS NULL
-        # """)
+        return self._cached("get_governance_results", (workspace_filter,),
+                            lambda: self._read_governance_results(workspace_filter))
+    
+    def _read_governance_results(self, workspace_filter: Optional[str]) -> Dict[str, Any]:
+        empty_summary = {key: 0 for key in SUMMARY_METRICS}
+        summary_table = self._table_name("GovernanceSummary")
         
+        try:
+            from pyspark.sql import functions as F
+            df = self._get_spark().table(summary_table)
+            if workspace_filter:
+                df = df.filter((F.col("Scope") == "Workspace") & (F.col("WorkspaceName") == workspace_filter))
+            else:
+                df = df.filter(F.col("Scope") == "Overall")
+            rows = df.limit(1).collect()
+        except Exception as e:
+            return {
+                "status": "error",
+                "summary": empty_summary,
+                "message": f"Could not read {summary_table}: {str(e)}"
+            }
+        
+        if not rows:
+            return {
+                "status": "not_found",
+                "summary": empty_summary,
+                "message": f"No results for workspace {workspace_filter}" if workspace_filter else "No results yet; run the GovernanceNotebook first"
+            }
+        
+        row = rows[0].asDict()
         return {
             "status": "success",
-            "summary": {
-                "total_reports": 0,
-                "total_models": 0,
-                "total_dataflows": 0,
-                "unused_objects": 0,
-                "broken_visuals": 0
-            },
-            "message": "Results retrieval implementation pending"
+            "workspace": workspace_filter,
+            "run_id": row.get("RunId"),
+            "updated_at": row.get("UpdatedAt"),
+            "summary": {key: int(row.get(column) or 0) for key, column in SUMMARY_METRICS.items()},
+            "message": f"Results as of {row.get('UpdatedAt')}"
         }
     
     def get_impact_analysis(self, object_name: str, object_type: str = "column") -> Dict[str, Any]:
         """
         Get impact analysis for a specific object.
         
+        Looks the object up in the ImpactIndex table the notebook builds after
+        extracting reports. Matches across all models (and tables, unless the
+        name is qualified) are combined. Results are cached until their TTL
+        expires or a new run finishes.
+        
         Args:
-            object_name: Name of the object (column, measure, table)
+            object_name: Name of the object: "Amount", "'Sales'[Amount]" or "Sales[Amount]"
+                (a table name for tables)
             object_type: Type of object (column, measure, table)
         
         Returns:
             Dictionary with impact analysis results
         """
-        # TODO: Implement impact analysis query from Lakehouse
-        return {
+        return self._cached("get_impact_analysis", (object_name, object_type.lower()),
+                            lambda: self._read_impact_analysis(object_name, object_type))
+    
+    def _read_impact_analysis(self, object_name: str, object_type: str) -> Dict[str, Any]:
+        result = {
+            "status": "success",
             "object_name": object_name,
             "object_type": object_type,
             "impacted_visuals": [],
+            "impacted_filters": [],
             "impacted_measures": [],
             "impacted_reports": [],
-            "message": "Impact analysis implementation pending"
+            "models": []
         }
+        
+        table_name, name = parse_object_name(object_name)
+        index_table = self._table_name("ImpactIndex")
+        
+        try:
+            from pyspark.sql import functions as F
+            df = self._get_spark().table(index_table).filter(F.col("IndexKey") == f"{object_type.lower()}|{name.lower()}")
+            if table_name and object_type.lower() != "table":
+                df = df.filter(F.lower(F.col("TableName")) == table_name.lower())
+            rows = [row.asDict() for row in df.collect()]
+        except Exception as e:
+            result["status"] = "error"
+            result["message"] = f"Could not read {index_table}: {str(e)}"
+            return result
+        
+        reports = {}
+        for row in rows:
+            entries = {column: [dict(zip(fields, item)) for item in json.loads(row[column] or "[]")]
+                       for column, fields in IMPACT_INDEX_FIELDS.items()}
+            row_reports = {report["ReportID"]: report for report in entries["ImpactedReports"]}
+            reports.update(row_reports)
+            for visual in entries["ImpactedVisuals"]:
+                result["impacted_visuals"].append({**row_reports.get(visual["ReportID"], {}), **visual})
+            for use in entries["ImpactedFilters"]:
+                result["impacted_filters"].append({**row_reports.get(use["ReportID"], {}), **use})
+            for measure in entries["ImpactedMeasures"]:
+                report_id = measure.pop("ReportID")
+                if report_id:
+                    measure.update(row_reports.get(report_id, {"ReportID": report_id}))
+                else:
+                    measure.update(ModelName=row["ModelName"], WorkspaceName=row["WorkspaceName"])
+                result["impacted_measures"].append(measure)
+            result["models"].append({
+                "model_id": row["ModelID"],
+                "model_name": row["ModelName"],
+                "workspace_name": row["WorkspaceName"],
+                "table_name": row["TableName"]
+            })
+        result["impacted_reports"] = list(reports.values())
+        
+        if rows:
+            result["message"] = (f"{len(result['impacted_visuals'])} visual(s), {len(result['impacted_filters'])} filter(s), "
+                                 f"{len(result['impacted_measures'])} measure(s) in {len(reports)} report(s)")
+        else:
+            result["message"] = f"No uses found for {object_type} {object_name}"
+        return result
     
-    def export_results_to_json(self, output_path: str) -> Dict[str, str]:
+    def export_results_to_json(
+        self,
+        output_path: str,
+        tables: Optional[List[str]] = None,
+        output_format: str = "json",
+        compression: Optional[str] = None,
+        batch_size: int = 10000
+    ) -> Dict[str, Any]:
         """
-        Export governance results to JSON format.
+        Export governance results to JSON, NDJSON or Parquet.
+        
+        Without tables, the governance summary is written to output_path as one
+        JSON document. With tables, each table is streamed from the Lakehouse one
+        partition at a time into output_path/<Table>.ndjson or <Table>.parquet,
+        written in batches of batch_size rows, so memory use does not grow with
+        the table size.
         
         Args:
-            output_path: Path where JSON file should be saved
+            output_path: JSON file (summary) or folder (tables) to write to
+            tables: Lakehouse tables to export (e.g. ["VisualObjects", "ModelDetail"])
+            output_format: "json" (summary only), "ndjson" or "parquet"
+            compression: None, "gzip" or "zstd" (NDJSON file compression or Parquet codec)
+            batch_size: Rows per write batch (Parquet row group)
         
         Returns:
-            Dictionary with export status
+            Dictionary with export status, rows and bytes written
         """
-        results = self.get_governance_results()
-        
         try:
-            with open(output_path, 'w') as f:
-                json.dump(results, f, indent=2)
+            if output_format not in ("json", "ndjson", "parquet"):
+                raise ValueError(f"Unsupported output_format '{output_format}'")
+            if compression not in EXPORT_COMPRESSION_SUFFIXES:
+                raise ValueError(f"Unsupported compression '{compression}'")
+            
+            if output_format == "json":
+                if tables:
+                    raise ValueError("Tables can only be exported as ndjson or parquet")
+                results = self.get_governance_results()
+                with self._open_export_file(output_path, compression) as f:
+                    f.write(json.dumps(results, indent=2, default=str).encode("utf-8"))
+                files = [{"table": None, "path": output_path, "rows": 1, "bytes": os.path.getsize(output_path)}]
+            else:
+                os.makedirs(output_path, exist_ok=True)
+                files = []
+                for table in tables or ["GovernanceSummary"]:
+                    if output_format == "ndjson":
+                        path = os.path.join(output_path, f"{table}.ndjson{EXPORT_COMPRESSION_SUFFIXES[compression]}")
+                        rows = self._export_table_ndjson(table, path, compression, batch_size)
+                    else:
+                        path = os.path.join(output_path, f"{table}.parquet")
+                        rows = self._export_table_parquet(table, path, compression, batch_size)
+                    files.append({"table": table, "path": path, "rows": rows, "bytes": os.path.getsize(path)})
+            
+            total_rows = sum(f["rows"] for f in files)
+            total_bytes = sum(f["bytes"] for f in files)
             return {
                 "status": "success",
                 "path": output_path,
-                "message": f"Results exported to {output_path}"
+                "format": output_format,
+                "files": files,
+                "rows": total_rows,
+                "bytes": total_bytes,
+                "message": f"Exported {total_rows:,} rows ({total_bytes:,} bytes) to {output_path}"
             }
         except Exception as e:
             return {
                 "status": "error",
                 "message": f"Export failed: {str(e)}"
             }
+    
+    @staticmethod
+    def _open_export_file(path: str, compression: Optional[str]):
+        """Binary file handle for path, compressed as requested"""
+        if compression == "gzip":
+            return gzip.open(path, "wb", compresslevel=6)
+        if compression == "zstd":
+            try:
+                import zstandard
+            except ImportError:
+                raise ValueError("zstd compression requires the zstandard package")
+            return zstandard.ZstdCompressor(level=3).stream_writer(open(path, "wb"), closefd=True)
+        return open(path, "wb")
+    
+    def _iter_table_batches(self, table: str, batch_size: int):
+        """Yield lists of row dictionaries, pulling one partition at a time to the driver"""
+        df = self._get_spark().table(self._table_name(table))
+        batch = []
+        for row in df.toLocalIterator():
+            batch.append(row.asDict(recursive=True))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    
+    def _export_table_ndjson(self, table: str, path: str, compression: Optional[str], batch_size: int) -> int:
+        rows = 0
+        with self._open_export_file(path, compression) as f:
+            for batch in self._iter_table_batches(table, batch_size):
+                f.write("".join(json.dumps(record, default=str) + "\n" for record in batch).encode("utf-8"))
+                rows += len(batch)
+        return rows
+    
+    def _export_table_parquet(self, table: str, path: str, compression: Optional[str], batch_size: int) -> int:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        from pyspark.sql.pandas.types import to_arrow_schema
+        
+        schema = to_arrow_schema(self._get_spark().table(self._table_name(table)).schema)
+        rows = 0
+        with pq.ParquetWriter(path, schema, compression=compression or "snappy") as writer:
+            for batch in self._iter_table_batches(table, batch_size):
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema), row_group_size=batch_size)
+                rows += len(batch)
+        return rows
+
+
+def parse_object_name(object_name: str):
+    """
+    Split a DAX object reference into table and object name.
+    
+    Args:
+        object_name: "'Table'[Object]", "Table[Object]" or a bare name
+    
+    Returns:
+        Tuple of (table name or None, object name)
+    """
+    match = re.match(r"^\s*(?:'((?:[^']|'')*)'|([^'\[\]]*?))\s*\[(.+)\]\s*$", object_name)
+    if not match:
+        return None, object_name.strip().strip("'").replace("''", "'")
+    table = (match.group(1) or "").replace("''", "'") or match.group(2) or None
+    return table, match.group(3)
 
 
 def create_workload_integration(workspace_id: str, lakehouse_name: str) -> WorkloadIntegration:
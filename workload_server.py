@@ -0,0 +1,324 @@
+"""
+Local HTTP API for the ImpactIQ Fabric Workload.
+
+Serves WorkloadIntegration to the workload UI (Workload/app/clients/GovernanceClient.ts):
+
+    POST /governance/analyze            start an analysis (duplicate triggers join the running one)
+    GET  /governance/status/{run_id}    run status and progress
+    GET  /governance/results            governance summary (?workspace=<name>)
+    GET  /governance/impact             impact analysis (?name=<object>&type=column|measure|table)
+    GET  /governance/runs               run registry
+
+Paths may carry the client's "/api" prefix. Responses are JSON with camelCase keys,
+gzip-compressed when the client accepts it. Results and impact responses carry an
+ETag derived from the latest finished run, so a request with a matching
+If-None-Match is answered with 304 without querying the Lakehouse. Requests are
+handled on one thread each.
+
+Browsers may only call the API from the origin passed with --allow-origin (e.g.
+the workload dev server, http://localhost:60006); without it no CORS headers are
+sent and requests carrying any other Origin are refused. POST bodies must be
+application/json, so pages cannot start analyses with a simple form post.
+
+Example:
+    python workload_server.py --lakehouse PowerBIGovernance --port 8765 --allow-origin http://localhost:60006 \
+        --launcher local --fixtures ./fixtures/<RUN_ID>
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import re
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from workload_integration import FabricNotebookLauncher, LocalSubprocessLauncher, WorkloadIntegration, DEFAULT_STATE_PATH
+
+
+API_PREFIX = "/api"
+
+# Smaller bodies are sent uncompressed
+GZIP_MIN_BYTES = 1024
+
+# HTTP status per WorkloadIntegration result status
+RESULT_HTTP_STATUS = {
+    "success": 200,
+    "initiated": 202,
+    "already_running": 200,
+    "not_found": 200,
+    "error": 500
+}
+
+# Keys whose dictionary values are keyed by data (e.g. phase names) rather than field names
+DATA_KEYED_FIELDS = {"phases"}
+
+
+def to_camel_case(key: str) -> str:
+    """total_reports / TotalReports / TOTAL_REPORTS -> totalReports"""
+    if key.isupper():
+        key = key.lower()
+    head, *rest = key.split("_")
+    return head[:1].lower() + head[1:] + "".join(part[:1].upper() + part[1:] for part in rest)
+
+
+def camelize(value: Any, keep_keys: bool = False) -> Any:
+    """Convert dictionary keys to camelCase for the TypeScript client"""
+    if isinstance(value, dict):
+        return {
+            (key if keep_keys else to_camel_case(key)): camelize(item, keep_keys=(not keep_keys and key in DATA_KEYED_FIELDS))
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [camelize(item) for item in value]
+    return value
+
+
+class GovernanceRequestHandler(BaseHTTPRequestHandler):
+    """Routes /governance requests to the server's WorkloadIntegration"""
+
+    server_version = "ImpactIQ/1.0"
+    protocol_version = "HTTP/1.1"
+
+    ROUTES = [
+        ("POST", re.compile(r"^/governance/analyze$"), "handle_analyze"),
+        ("GET", re.compile(r"^/governance/status/(?P<run_id>[\w.-]+)$"), "handle_status"),
+        ("GET", re.compile(r"^/governance/results$"), "handle_results"),
+        ("GET", re.compile(r"^/governance/impact$"), "handle_impact"),
+        ("GET", re.compile(r"^/governance/runs$"), "handle_runs")
+    ]
+
+    @property
+    def integration(self) -> WorkloadIntegration:
+        return self.server.integration
+
+    # ----- dispatch -----
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def do_OPTIONS(self):
+        if not self.server.allow_origin or not self.origin_allowed():
+            self.send_json(403, {"status": "error", "message": "Cross-origin requests are not allowed"})
+            return
+        self.send_response(204)
+        self.send_cors_headers()
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def dispatch(self, method: str):
+        if not self.origin_allowed():
+            self.send_json(403, {"status": "error", "message": "Cross-origin requests are not allowed"})
+            return
+
+        url = urlsplit(self.path)
+        path = url.path[len(API_PREFIX):] if url.path.startswith(API_PREFIX + "/") else url.path
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+        for route_method, pattern, handler_name in self.ROUTES:
+            match = pattern.match(path.rstrip("/"))
+            if match and route_method == method:
+                try:
+                    getattr(self, handler_name)(query, **match.groupdict())
+                except Exception as e:
+                    self.send_json(500, {"status": "error", "message": f"Request failed: {str(e)}"})
+                return
+            if match:
+                self.send_json(405, {"status": "error", "message": f"{method} is not supported on {path}"})
+                return
+        self.send_json(404, {"status": "error", "message": f"Unknown endpoint {path}"})
+
+    # ----- handlers -----
+
+    def handle_analyze(self, query: Dict[str, str]):
+        if self.headers.get_content_type() != "application/json":
+            self.send_json(415, {"status": "error", "message": "Content-Type must be application/json"})
+            return
+        body = self.read_json_body()
+        config = body.get("config") or {}
+        workspace_names = body.get("workspaceNames") or config.get("workspaceNames")
+        max_parallel_workers = body.get("maxParallelWorkers") or config.get("maxParallelWorkers") or 5
+        result = self.integration.trigger_governance_analysis(workspace_names, int(max_parallel_workers))
+        self.send_json(RESULT_HTTP_STATUS.get(result["status"], 200), result)
+
+    def handle_status(self, query: Dict[str, str], run_id: str):
+        result = self.integration.get_analysis_status(run_id)
+        self.send_json(200 if result["status"] != "unknown" else 404, result, etag=self.content_etag(result))
+
+    def handle_results(self, query: Dict[str, str]):
+        workspace = query.get("workspace") or None
+        self.send_versioned(("results", workspace), lambda: self.integration.get_governance_results(workspace))
+
+    def handle_impact(self, query: Dict[str, str]):
+        name = query.get("name")
+        if not name:
+            self.send_json(400, {"status": "error", "message": "Query parameter 'name' is required"})
+            return
+        object_type = query.get("type", "column").lower()
+        if object_type not in ("column", "measure", "table"):
+            self.send_json(400, {"status": "error", "message": "Query parameter 'type' must be column, measure or table"})
+            return
+        self.send_versioned(("impact", name, object_type),
+                            lambda: self.integration.get_impact_analysis(name, object_type))
+
+    def handle_runs(self, query: Dict[str, str]):
+        runs = self.integration.list_runs()
+        self.send_json(200, {"status": "success", "runs": runs}, etag=self.content_etag(runs))
+
+    # ----- responses -----
+
+    def send_versioned(self, key: Tuple, compute):
+        """
+        Answer a results request, short-circuiting with 304 when the client already
+        holds the response for the latest finished run.
+        """
+        version = self.integration.get_data_version()
+        etag = None
+        if version:
+            etag = '"' + hashlib.sha1(json.dumps([version, *key]).encode("utf-8")).hexdigest()[:32] + '"'
+            if self.etag_matches(etag):
+                self.send_not_modified(etag)
+                return
+
+        result = compute()
+        status = RESULT_HTTP_STATUS.get(result.get("status"), 200)
+        if status >= 500:
+            etag = None
+        elif etag is None:
+            etag = self.content_etag(result)
+        self.send_json(status, result, etag=etag)
+
+    @staticmethod
+    def content_etag(value: Any) -> str:
+        return 'W/"' + hashlib.sha1(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:32] + '"'
+
+    def etag_matches(self, etag: str) -> bool:
+        header = self.headers.get("If-None-Match")
+        if not header:
+            return False
+        candidates = {tag.strip() for tag in header.split(",")}
+        return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+    def send_not_modified(self, etag: str):
+        self.send_response(304)
+        self.send_cors_headers()
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def send_json(self, status: int, payload: Any, etag: Optional[str] = None):
+        if etag and status == 200 and self.etag_matches(etag):
+            self.send_not_modified(etag)
+            return
+
+        body = json.dumps(camelize(payload), default=str).encode("utf-8")
+        gzipped = len(body) >= GZIP_MIN_BYTES and "gzip" in self.headers.get("Accept-Encoding", "")
+        if gzipped:
+            body = gzip.compress(body, compresslevel=6)
+
+        self.send_response(status)
+        self.send_cors_headers()
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Vary", "Accept-Encoding")
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def origin_allowed(self) -> bool:
+        """Requests without an Origin (non-browser clients) or from the allowed origin"""
+        origin = self.headers.get("Origin")
+        return not origin or self.server.allow_origin in ("*", origin)
+
+    def send_cors_headers(self):
+        if not self.server.allow_origin:
+            return
+        self.send_header("Access-Control-Allow-Origin", self.server.allow_origin)
+        self.send_header("Vary", "Origin")
+        self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
+        self.send_header("Access-Control-Allow-Headers", "Content-Type, Authorization, If-None-Match")
+        self.send_header("Access-Control-Expose-Headers", "ETag")
+
+    def read_json_body(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        body = json.loads(self.rfile.read(length).decode("utf-8"))
+        if not isinstance(body, dict):
+            raise ValueError("Request body must be a JSON object")
+        return body
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+def create_server(
+    integration: WorkloadIntegration,
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    allow_origin: Optional[str] = None,
+    quiet: bool = False
+) -> ThreadingHTTPServer:
+    """
+    Build (but do not start) the API server; call serve_forever() on the result.
+
+    Args:
+        integration: WorkloadIntegration serving the requests
+        host: Interface to listen on
+        port: Port to listen on (0 = any free port)
+        allow_origin: Origin of the UI allowed to call the API (None = same-origin and non-browser clients only)
+        quiet: Do not log requests
+
+    Returns:
+        ThreadingHTTPServer handling each request on its own thread
+    """
+    server = ThreadingHTTPServer((host, port), GovernanceRequestHandler)
+    server.daemon_threads = True
+    server.integration = integration
+    server.allow_origin = allow_origin
+    server.quiet = quiet
+    return server
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Serve the ImpactIQ governance API over HTTP.")
+    parser.add_argument("--workspace-id", default="", help="Fabric workspace ID")
+    parser.add_argument("--lakehouse", required=True, help="Lakehouse holding the GovernanceNotebook tables")
+    parser.add_argument("--schema", default="dbo", help="Lakehouse schema")
+    parser.add_argument("--state-path", default=DEFAULT_STATE_PATH, help="RUN_STATE_PATH of the notebook")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on")
+    parser.add_argument("--allow-origin", default=None,
+                        help="Origin of the workload UI allowed to call the API, e.g. http://localhost:60006 (default: none)")
+    parser.add_argument("--launcher", choices=["fabric", "local"], default="fabric", help="How analyses are started")
+    parser.add_argument("--fixtures", default="", help="Fixtures replayed by the local launcher")
+    parser.add_argument("--quiet", action="store_true", help="Do not log requests")
+    args = parser.parse_args(argv)
+
+    launcher = LocalSubprocessLauncher(fixtures_path=args.fixtures) if args.launcher == "local" else FabricNotebookLauncher()
+    integration = WorkloadIntegration(args.workspace_id, args.lakehouse, args.schema, args.state_path, launcher=launcher)
+    server = create_server(integration, args.host, args.port, args.allow_origin, args.quiet)
+
+    print(f"ImpactIQ governance API listening on http://{args.host}:{server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())